@@ -0,0 +1,55 @@
+"""Bytes on the wire for the main payloads, identity vs gzip vs brotli.
+
+Uses the synthetic payloads from bench_json.py and pushes each one through
+the real app middleware (CompressionMiddleware) with different
+Accept-Encoding headers, so the numbers include the threshold and
+negotiation logic, not just the raw codec.
+
+Usage:
+    python bench_compression.py [--shops 4] [--custom 6] [--orders 10000]
+"""
+import argparse
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from bench_json import combined_payload, orders_payload
+from compression import CompressionMiddleware
+from fastjson import ORJSONResponse
+
+
+def build_app(payloads: dict) -> FastAPI:
+    app = FastAPI()
+    for name, payload in payloads.items():
+        app.add_api_route(f"/api/{name}", lambda payload=payload: ORJSONResponse(payload))
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return app
+
+
+def measure(client: TestClient, path: str, encoding: str) -> tuple:
+    t0 = time.perf_counter()
+    resp = client.get(path, headers={"Accept-Encoding": encoding})
+    ms = (time.perf_counter() - t0) * 1000
+    # content-length is the compressed size; the test client decodes the body itself
+    wire = int(resp.headers.get("content-length", len(resp.content)))
+    return wire, resp.headers.get("content-encoding", "identity"), ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response compression savings")
+    parser.add_argument("--shops", type=int, default=4)
+    parser.add_argument("--custom", type=int, default=6)
+    parser.add_argument("--orders", type=int, default=10000)
+    args = parser.parse_args()
+    payloads = {
+        "combined-monthly-stats": combined_payload(args.shops, args.custom),
+        "orders": orders_payload(args.orders),
+    }
+    client = TestClient(build_app(payloads))
+    for name in payloads:
+        raw, _, _ = measure(client, f"/api/{name}", "identity")
+        print(f"/api/{name}: {raw / 1024:.0f} KiB uncompressed")
+        for encoding in ["gzip", "br"]:
+            wire, used, ms = measure(client, f"/api/{name}", encoding)
+            print(f"  {used:8s} {wire / 1024:8.1f} KiB  -{(1 - wire / raw) * 100:4.1f}%  {ms:7.1f} ms")
@@ -0,0 +1,79 @@
+"""Endpoint latency with independent reads awaited in turn vs fanned out.
+
+Drives the real app in-process (httpx ASGITransport, no network hop to
+the API) against the database in MONGO_URL, once with server.fanout
+replaced by a sequential version (every read awaited after the previous
+one) and once with the real asyncio.gather, and prints p50/p95 per
+endpoint. The stats
+cache is cleared before every request so each call runs its queries;
+reference data (shops, settings, columns) stays warm as in production.
+
+Usage:
+    python bench_fanout.py [--year 2025] [--month 1] [--repeat 50]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import server
+from stats_cache import stats_cache
+
+
+def endpoints(year: int, month: int) -> list:
+    ym = {"year": year, "month": month}
+    return [
+        ("POST", "/api/auth/login", {"json": {"pin": next(iter(server.USERS))}}),
+        ("GET", "/api/monthly-stats", {"params": {**ym, "shop_id": 1}}),
+        ("GET", "/api/combined-monthly-stats", {"params": ym}),
+        ("GET", "/api/range-stats", {"params": {"from": f"{year}-01-01", "to": f"{year}-12-31"}}),
+        ("GET", "/api/weekly-stats", {}),
+        ("GET", "/api/export/excel", {"params": ym}),
+        ("GET", "/api/sales-records/pdf/monthly", {"params": ym}),
+    ]
+
+
+async def measure(client: httpx.AsyncClient, method: str, path: str, kwargs: dict, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        stats_cache.touch_all()
+        t0 = time.perf_counter()
+        resp = await client.request(method, path, **kwargs)
+        times.append((time.perf_counter() - t0) * 1000)
+        resp.raise_for_status()
+    return times
+
+
+async def sequential(*aws):
+    return [await aw for aw in aws]
+
+
+def pct(times: list, q: int) -> float:
+    return statistics.quantiles(times, n=100)[q - 1]
+
+
+async def main(args):
+    concurrent = server.fanout
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for method, path, kwargs in endpoints(args.year, args.month):
+            await measure(client, method, path, kwargs, 3)  # warm ref cache and connection pool
+            row = []
+            for fanout in (sequential, concurrent):
+                server.fanout = fanout  # handlers look fanout up in the module on every call
+                times = await measure(client, method, path, kwargs, args.repeat)
+                row.append((pct(times, 50), pct(times, 95)))
+            server.fanout = concurrent
+            (b50, b95), (a50, a95) = row
+            print(f"{method:4s} {path:32s} sequential p50 {b50:7.1f} p95 {b95:7.1f} ms | "
+                  f"fan-out p50 {a50:7.1f} p95 {a95:7.1f} ms | p50 {(a50 / b50 - 1) * 100:+5.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent handler reads")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--month", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Microbenchmark: response serialization before/after the orjson path.
+
+Builds a /combined-monthly-stats payload (31 days x shops x custom columns,
+via stats_engine) and an /orders payload (10k rows) and times
+  before: jsonable_encoder + starlette JSONResponse (stdlib json)
+  after:  ORJSONResponse returned directly by the endpoint
+
+Usage:
+    python bench_json.py [--shops 4] [--custom 6] [--orders 10000] [--repeat 30]
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+import stats_engine
+from fastjson import ORJSONResponse
+
+
+def combined_payload(n_shops: int, n_custom: int) -> dict:
+    rng = random.Random(1)
+    year, month = 2025, 1
+    shop_ids = list(range(1, n_shops + 1))
+    custom_columns = [{"id": str(uuid.uuid4()), "name": f"Kolumna {i}", "column_type": "expense" if i % 2 else "income"} for i in range(n_custom)]
+    categories = ["tiktok", "meta", "google", "zwroty"] + [cc["name"] for cc in custom_columns]
+    rows = []
+    for day in range(1, 32):
+        ds = f"{year}-{month:02d}-{day:02d}"
+        for sid in shop_ids:
+            rows.append({"ledger": "incomes", "shop_id": sid, "date": ds, "category": "income", "amount": round(rng.uniform(100, 3000), 2)})
+            for cat in categories:
+                rows.append({"ledger": "costs", "shop_id": sid, "date": ds, "category": cat, "amount": round(rng.uniform(0, 300), 2)})
+    cube = stats_engine.MonthCube(year, month, shop_ids, custom_columns, rows)
+    now = datetime(2025, 1, 31, 12, tzinfo=timezone.utc)
+    return {
+        "year": year, "month": month, **cube.totals(2), "target": 250000, "progress": 12.5,
+        **cube.kpis(2, now), "custom_columns": custom_columns,
+        "days": cube.day_rows(2, per_shop=True), "settings": {"profit_split": 2},
+    }
+
+
+def orders_payload(n: int) -> list:
+    rng = random.Random(2)
+    return [{
+        "id": str(uuid.uuid4()), "order_number": f"#{1000 + i}", "customer_name": f"Klient {i}",
+        "customer_email": f"klient{i}@example.com", "customer_phone": "+48 600 000 000",
+        "shipping_address": "ul. Przykładowa 1, 00-001 Warszawa", "total": round(rng.uniform(20, 900), 2),
+        "extra_payment": 0.0, "status": "new", "items": "Produkt A x1, Produkt B x2",
+        "date": f"2025-01-{1 + i % 31:02d}", "shop_id": 1 + i % 4, "created_at": "2025-01-01T10:00:00+00:00",
+    } for i in range(n)]
+
+
+def _time(fn, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, len(body)
+
+
+def run(name: str, payload, repeat: int):
+    before_ms, before_bytes = _time(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    after_ms, after_bytes = _time(lambda: ORJSONResponse(payload).body, repeat)
+    print(f"{name}: {before_bytes / 1024:.0f} KiB")
+    print(f"  before (jsonable_encoder + json): {before_ms:8.2f} ms")
+    print(f"  after  (orjson, no encoder pass): {after_ms:8.2f} ms   x{before_ms / after_ms:.1f}"
+          + ("" if before_bytes == after_bytes else f"   ({after_bytes / 1024:.0f} KiB)"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON response serialization microbenchmark")
+    parser.add_argument("--shops", type=int, default=4)
+    parser.add_argument("--custom", type=int, default=6)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+    run(f"/combined-monthly-stats ({args.shops} shops, {args.custom} custom columns)", combined_payload(args.shops, args.custom), args.repeat)
+    run(f"/orders ({args.orders} rows)", orders_payload(args.orders), args.repeat)
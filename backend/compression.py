@@ -0,0 +1,161 @@
+"""Negotiated response compression for /api (brotli, gzip).
+
+Picks ``br`` when the client accepts it, else ``gzip``, else sends the body
+as is. Bodies under ``minimum_size`` and already-compressed content types
+(PDF, XLSX, images, SSE) are never touched. Streaming responses (NDJSON
+exports) are compressed chunk by chunk with a flush after each chunk, so
+rows still reach the client as they are produced.
+
+The responder is written here against plain ASGI messages rather than by
+subclassing starlette's gzip responders, whose constructor and method
+signatures change between Starlette releases.
+"""
+import zlib
+
+import anyio.to_thread
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+# never compressed: already compressed formats, and SSE, whose events must not wait in a compressor
+EXCLUDED_CONTENT_TYPES = (
+    "application/gzip", "application/x-gzip", "application/zip", "application/pdf",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "audio/*", "video/*", "image/avif", "image/gif", "image/jpeg", "image/png", "image/webp",
+    "font/woff", "font/woff2", "text/event-stream",
+)
+
+# chunks above this size are compressed in a worker thread, as starlette does for gzip
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+
+def accepted_encodings(header: str) -> set:
+    """Codings listed in Accept-Encoding, minus those refused with q=0."""
+    codings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            codings.add(name.strip().lower())
+    return codings
+
+
+def negotiate(header: str) -> str:
+    """Coding this middleware will use for a given Accept-Encoding: br, gzip or identity."""
+    codings = accepted_encodings(header)
+    return "br" if "br" in codings else "gzip" if "gzip" in codings else "identity"
+
+
+def _excluded(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type in EXCLUDED_CONTENT_TYPES or media_type.partition("/")[0] + "/*" in EXCLUDED_CONTENT_TYPES
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def __call__(self, body: bytes, more_body: bool) -> bytes:
+        out = self._compressor.process(body)
+        return out + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def __call__(self, body: bytes, more_body: bool) -> bytes:
+        out = self._compressor.compress(body)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class Responder:
+    """Compresses one response. Holds back http.response.start until the first body
+    message shows whether (and how) the headers change. coding "identity": no compression,
+    large responses only get Vary."""
+
+    def __init__(self, app, minimum_size: int, coding: str, make_compressor=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.coding = coding
+        self.make_compressor = make_compressor  # () -> (body, more_body) -> bytes; None for identity
+        self.compressor = None
+        self.send = None
+        self.start = None
+        self.passthrough = False
+        self.started = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def compress(self, body: bytes, more_body: bool) -> bytes:
+        if self.compressor is None:
+            self.compressor = self.make_compressor()
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await anyio.to_thread.run_sync(self.compressor, body, more_body)
+        return self.compressor(body, more_body)
+
+    async def send_compressed(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start = message
+            self.passthrough = ("content-encoding" in headers or message["status"] == 206
+                                or _excluded(headers.get("content-type", "")))
+            if self.passthrough:
+                await self.send(message)
+        elif kind != "http.response.body" or self.passthrough:
+            if kind == "http.response.pathsend" and not self.passthrough:
+                await self.send(self.start)
+            await self.send(message)
+        elif not self.started:
+            self.started = True
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if len(body) < self.minimum_size and not more_body:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self.make_compressor is not None:
+                message["body"] = await self.compress(body, more_body)
+                headers["Content-Encoding"] = self.coding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.start)
+            await self.send(message)
+        else:
+            if self.make_compressor is not None:
+                message["body"] = await self.compress(message.get("body", b""), message.get("more_body", False))
+            await self.send(message)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, path_prefix: str = "/api", gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.path_prefix = path_prefix
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding == "br":
+            responder = Responder(self.app, self.minimum_size, "br", lambda: _Brotli(self.brotli_quality))
+        elif coding == "gzip":
+            responder = Responder(self.app, self.minimum_size, "gzip", lambda: _Gzip(self.gzip_level))
+        else:
+            # still marks large responses Vary: Accept-Encoding for shared caches
+            responder = Responder(self.app, self.minimum_size, "identity")
+        await responder(scope, receive, send)
@@ -0,0 +1,51 @@
+"""Date predicates and normalization for ledger / order documents.
+
+Dates are stored as zero-padded ``YYYY-MM-DD`` strings, so a month is the
+half-open string range [``YYYY-MM``, next ``YYYY-MM``) and any span of days
+or months is a plain ``$gte``/``$lt`` predicate the planner turns into an
+index range scan, unlike a ``$regex`` prefix match.
+"""
+from datetime import datetime, date as date_cls
+
+
+def next_month(year: int, month: int) -> tuple:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_range(year: int, month: int) -> dict:
+    ny, nm = next_month(year, month)
+    return {"$gte": f"{year}-{month:02d}", "$lt": f"{ny}-{nm:02d}"}
+
+
+def months_range(start_month: str = None, end_month: str = None) -> dict:
+    """[start_month, end_month] inclusive, both YYYY-MM; either side may be open."""
+    q = {}
+    if start_month:
+        q["$gte"] = start_month
+    if end_month:
+        ny, nm = next_month(int(end_month[:4]), int(end_month[5:7]))
+        q["$lt"] = f"{ny}-{nm:02d}"
+    return q
+
+
+def day_range(start: str, end: str) -> dict:
+    """[start, end] inclusive, both YYYY-MM-DD."""
+    return {"$gte": start, "$lte": end}
+
+
+def normalize(value):
+    """Canonical YYYY-MM-DD for a stored date value, or None if it cannot be read as a date."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date_cls):
+        return value.isoformat()
+    if not isinstance(value, str):
+        return None
+    head = value.strip()[:10].split("T")[0].split(" ")[0]
+    parts = head.split("-")
+    if len(parts) != 3:
+        return None
+    try:
+        return date_cls(int(parts[0]), int(parts[1]), int(parts[2])).isoformat()
+    except ValueError:
+        return None
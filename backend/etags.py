@@ -0,0 +1,173 @@
+"""Conditional GET for /api read endpoints (ETag / If-None-Match -> 304).
+
+Tags are not hashes of the body. They come from per-collection write
+counters kept in one Mongo document (``cache_versions``,
+``_id: "collections"``), which every mutating /api request bumps for the
+collections its route writes. A GET looks up its route's collections,
+reads the counters (one ``_id`` lookup) and answers 304 when the client's
+tag still matches, before the endpoint or its queries run.
+
+The stamp read for a request is also left in ``request_stamp`` for the
+endpoint, so caches of computed bodies (the stats cache) can key on the
+same counters as the tag and never serve a body older than its tag.
+
+Routes missing from READS are never tagged. Mutating routes missing from
+WRITES bump the global ``*`` counter, which every tag includes, so a new
+write path can only cause extra 200s, never a stale 304.
+"""
+import hashlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from compression import negotiate
+
+STAMP_ID = "collections"
+ALL = "*"
+
+STATS = ("incomes", "expenses", "costs", "daily_rollups", "shops", "app_settings", "custom_columns")
+
+# counters read for the current conditional GET (None outside one)
+request_stamp = ContextVar("request_stamp", default=None)
+
+# GET path (after /api) -> collections the response is built from
+READS = {
+    "/shops": ("shops",),
+    "/app-settings": ("app_settings",),
+    "/incomes": ("incomes",),
+    "/expenses": ("expenses",),
+    "/monthly-stats": STATS,
+    "/combined-monthly-stats": STATS,
+    "/range-stats": STATS,
+    "/weekly-stats": STATS,
+    "/export/excel": ("incomes", "expenses", "shops"),
+    "/tasks": ("tasks",),
+    "/ideas": ("ideas",),
+    "/shopify-configs": ("shopify_configs",),
+    "/tiktok-configs": ("tiktok_configs",),
+    "/reminders": ("reminders",),
+    "/orders": ("orders",),
+    "/returns": ("returns",),
+    "/fulfillment": ("fulfillment",),
+    "/fulfillment-notes": ("fulfillment_notes",),
+    "/costs": ("costs",),
+    "/custom-columns": ("custom_columns",),
+    "/products": ("products",),
+    "/company-settings": ("company_settings",),
+    "/notes": ("notes",),
+    "/sales-records": ("sales_records",),
+    "/spreadsheets": ("spreadsheets",),
+    "/credentials": ("credentials",),
+}
+
+# first path segment of a mutating request -> collections it may write
+WRITES = {
+    "auth": (),
+    "shops": ("shops",),
+    "app-settings": ("app_settings",),
+    "incomes": ("incomes", "daily_rollups"),
+    "expenses": ("expenses", "daily_rollups"),
+    "tasks": ("tasks",),
+    "ideas": ("ideas",),
+    "shopify-configs": ("shopify_configs",),
+    "tiktok-configs": ("tiktok_configs",),
+    "chat": ("chat_history",),
+    "chat-history": ("chat_history",),
+    "reminders": ("reminders",),
+    "orders": ("orders", "fulfillment", "returns", "sales_records"),
+    "returns": ("returns", "orders"),
+    "fulfillment": ("fulfillment", "orders"),
+    "fulfillment-notes": ("fulfillment_notes",),
+    "costs": ("costs", "daily_rollups"),
+    "custom-columns": ("custom_columns", "costs", "daily_rollups"),
+    "products": ("products",),
+    "company-settings": ("company_settings",),
+    "notes": ("notes",),
+    "sales-records": ("sales_records",),
+    "spreadsheets": ("spreadsheets",),
+    "credentials": ("credentials",),
+    "rollups": ("daily_rollups",),
+}
+
+
+class CollectionVersions:
+    def __init__(self, db):
+        self.db = db
+
+    async def read(self) -> dict:
+        return await self.db.cache_versions.find_one({"_id": STAMP_ID}) or {}
+
+    async def bump(self, names):
+        """Invalidate tags built from ``names`` (ALL: every tag)."""
+        if names:
+            await self.db.cache_versions.update_one({"_id": STAMP_ID}, {"$inc": {n: 1 for n in names}}, upsert=True)
+
+
+def make_etag(path: str, query: str, coding: str, collections: tuple, stamp: dict) -> str:
+    # the UTC day is part of every tag: stats KPIs and fulfillment reminders move with the calendar
+    today = datetime.now(timezone.utc).date().isoformat()
+    parts = (path, query, coding, today, stamp.get(ALL, 0), tuple(stamp.get(c, 0) for c in collections))
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def if_none_match(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class ETagMiddleware:
+    def __init__(self, app, versions: CollectionVersions, path_prefix: str = "/api"):
+        self.app = app
+        self.versions = versions
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"][len(self.path_prefix):]
+        if scope["method"] in ("GET", "HEAD"):
+            collections = READS.get(path.rstrip("/") or "/")
+            if collections is None:
+                await self.app(scope, receive, send)
+                return
+            await self._conditional(scope, receive, send, collections)
+        else:
+            segment = path.strip("/").split("/", 1)[0]
+            await self._tracked(scope, receive, send, WRITES.get(segment, (ALL,)))
+
+    async def _conditional(self, scope, receive, send, collections: tuple):
+        headers = Headers(scope=scope)
+        # stamp read before the endpoint runs: a write racing with it can only make the tag older than the body
+        stamp = await self.versions.read()
+        query = "&".join(sorted(scope.get("query_string", b"").decode("latin-1").split("&")))
+        etag = make_etag(scope["path"], query, negotiate(headers.get("accept-encoding", "")), collections, stamp)
+        if if_none_match(headers.get("if-none-match", ""), etag):
+            response = Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
+            await response(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message.setdefault("headers", [])
+                # no-cache: browsers keep the body but revalidate with If-None-Match on every fetch
+                message["headers"] = list(message["headers"]) + [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+            await send(message)
+
+        token = request_stamp.set(stamp)
+        try:
+            await self.app(scope, receive, send_with_etag)
+        finally:
+            request_stamp.reset(token)
+
+    async def _tracked(self, scope, receive, send, collections: tuple):
+        async def send_after_bump(message):
+            # bump before the response leaves, so the client's next GET already sees the new version
+            if message["type"] == "http.response.start" and not 400 <= message["status"] < 500:
+                await self.versions.bump(collections)
+            await send(message)
+
+        await self.app(scope, receive, send_after_bump)
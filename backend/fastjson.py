@@ -0,0 +1,23 @@
+"""orjson-backed JSON serialization for API responses and NDJSON streams.
+
+``ORJSONResponse`` is the app's default response class. Endpoints that
+already hold plain dicts/lists (Mongo documents with ``_id`` projected out,
+stats payloads) return it directly, which also skips FastAPI's
+``jsonable_encoder`` walk over the payload.
+"""
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content: Any) -> bytes:
+    # default=str covers stray ObjectId / Decimal values orjson has no encoding for
+    return orjson.dumps(content, default=str, option=OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
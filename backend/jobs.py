@@ -0,0 +1,261 @@
+"""Background sync jobs started over HTTP, with progress for polling and SSE.
+
+POST /sync/... creates a job and returns immediately. The sync runs as a
+task in this process, and the job document in ``sync_runs`` shows where
+it is:
+- overall status: queued, running, done;
+- per connector: state, pages fetched, orders seen, rows written,
+  duration and result.
+
+Progress is held in memory while the job runs and written to Mongo on
+every connector state change, and at most every ``flush_interval``
+seconds in between. Any process can therefore answer GET
+/sync/jobs/{id}; the process running the job answers with live numbers.
+A finished job keeps its document until ``expires_at`` (TTL index).
+
+A job created while an identical one (same ``dedupe_key``) is still
+running is not started again; the caller gets the running job instead.
+
+A job always ends as done: a failed or cancelled run (shutdown) records
+an error. A running job's document carries its ``owner`` process and a
+``heartbeat_at`` refreshed every BEAT seconds. If the process dies
+without finishing the job, the heartbeat stops, and after STALE seconds
+readers report the job as done with an error.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+KEEP = timedelta(days=7)
+HEARTBEAT = 15  # seconds between SSE keep-alive comments
+BEAT = 15        # seconds between heartbeats of a running job
+STALE = 4 * BEAT  # a job without a heartbeat for this long was abandoned by a dead process
+ABANDONED = "Zadanie przerwane"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def snapshot(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k not in ("_id", "dedupe_key", "expires_at")}
+
+
+def _abandon(job: dict, finished_at: str) -> dict:
+    """Mark a job and its unfinished connectors as ended with an error."""
+    for c in job["connectors"]:
+        if c["state"] in ("queued", "running"):
+            c.update(state="error", detail=ABANDONED)
+    job.update(status="done", finished_at=finished_at, result={"status": "error", "detail": ABANDONED})
+    return job
+
+
+class ConnectorProgress:
+    """Handed to one connector's sync: page() per fetched page, rows() once written."""
+
+    def __init__(self, tracker: "JobTracker", job: dict, entry: dict):
+        self.tracker = tracker
+        self.job = job
+        self.entry = entry
+
+    def page(self, items: int):
+        self.entry["pages"] += 1
+        self.entry["orders"] += items
+        self.tracker.changed(self.job)
+
+    def rows(self, n: int):
+        self.entry["rows"] = n
+        self.tracker.changed(self.job)
+
+
+class JobTracker:
+    def __init__(self, db, flush_interval: float = 1.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self._live = {}     # id -> job dict, jobs running in this process
+        self._by_key = {}   # dedupe_key -> id
+        self._wakeup = {}   # id -> asyncio.Event set on every change
+        self._flushed_at = {}
+        self._save_locks = {}  # id -> lock: saves of one job land in order
+        self._saves = {}       # id -> throttled progress saves still running
+        self._tasks = set()
+        self.created = 0
+        self.deduplicated = 0
+
+    async def create(self, kind: str, params: dict, connectors: list, dedupe_key: tuple = None) -> tuple:
+        """connectors: ["shopify:1", "tiktok:<id>", ...]. Returns (job, created)."""
+        running = self._live.get(self._by_key.get(dedupe_key)) if dedupe_key else None
+        if running is not None:
+            self.deduplicated += 1
+            return running, False
+        job = {
+            "id": str(uuid.uuid4()), "kind": kind, "params": params, "status": "queued", "version": 0,
+            "owner": self.owner, "heartbeat_at": _now(),
+            "created_at": _now(), "started_at": None, "finished_at": None, "result": None,
+            "connectors": [{"key": key, "state": "queued", "pages": 0, "orders": 0, "rows": 0, "duration_ms": None, "detail": None}
+                           for key in connectors],
+            "expires_at": datetime.now(timezone.utc) + KEEP,
+        }
+        await self.db.sync_runs.insert_one(dict(job))
+        self._live[job["id"]] = job
+        self._wakeup[job["id"]] = asyncio.Event()
+        self._save_locks[job["id"]] = asyncio.Lock()
+        if dedupe_key:
+            job["dedupe_key"] = dedupe_key
+            self._by_key[dedupe_key] = job["id"]
+        self.created += 1
+        return job, True
+
+    def start(self, job: dict, work):
+        """Run ``await work(job)`` in the background; its return value becomes job["result"]."""
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: dict, work):
+        job["status"], job["started_at"] = "running", _now()
+        beat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self.flush(job)
+            job["result"] = await work(job)
+            job["status"], job["finished_at"] = "done", _now()
+        except asyncio.CancelledError:
+            logger.warning("Sync job %s cancelled", job["id"])
+            _abandon(job, _now())
+            raise
+        except Exception as e:
+            logger.exception("Sync job %s failed", job["id"])
+            job["status"], job["finished_at"], job["result"] = "done", _now(), {"status": "error", "detail": str(e)}
+        finally:
+            beat.cancel()
+            try:
+                # progress saves still in flight must land before the final state, never after it
+                await asyncio.gather(beat, *self._saves.pop(job["id"], ()), return_exceptions=True)
+                await self.flush(job)
+            finally:
+                self._live.pop(job["id"], None)
+                self._wakeup.pop(job["id"], None)
+                self._flushed_at.pop(job["id"], None)
+                self._save_locks.pop(job["id"], None)
+                if self._by_key.get(job.get("dedupe_key")) == job["id"]:
+                    del self._by_key[job["dedupe_key"]]
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(BEAT)
+            await self._save(job)
+
+    def connector(self, job: dict, key: str) -> ConnectorProgress:
+        entry = next(c for c in job["connectors"] if c["key"] == key)
+        return ConnectorProgress(self, job, entry)
+
+    async def run_connector(self, job: dict, key: str, sync) -> dict:
+        """Await sync(progress) for one connector and record its state, duration and outcome."""
+        progress = self.connector(job, key)
+        progress.entry["state"] = "running"
+        await self.flush(job)
+        t0 = time.perf_counter()
+        try:
+            result = await sync(progress)
+        except Exception as e:
+            result = {"status": "error", "detail": getattr(e, "detail", None) or str(e)}
+        result = {**result, "duration_ms": round((time.perf_counter() - t0) * 1000)}
+        progress.entry.update(state="ok" if result.get("status") == "ok" else "error",
+                              duration_ms=result["duration_ms"], detail=result.get("detail"))
+        await self.flush(job)
+        return result
+
+    def _notify(self, job: dict):
+        job["version"] += 1
+        event = self._wakeup.get(job["id"])
+        if event is not None:
+            # wake the current listeners; later waits use a fresh event
+            self._wakeup[job["id"]] = asyncio.Event()
+            event.set()
+
+    def changed(self, job: dict):
+        """Progress counters moved: wake listeners now, persist at most every flush_interval."""
+        self._notify(job)
+        if time.monotonic() - self._flushed_at.get(job["id"], 0) >= self.flush_interval:
+            self._flushed_at[job["id"]] = time.monotonic()
+            task = asyncio.create_task(self._save(job))
+            saves = self._saves.setdefault(job["id"], set())
+            saves.add(task)
+            task.add_done_callback(saves.discard)
+
+    async def flush(self, job: dict):
+        """State changed: wake listeners and persist right away."""
+        self._notify(job)
+        self._flushed_at[job["id"]] = time.monotonic()
+        await self._save(job)
+
+    async def _save(self, job: dict):
+        # the snapshot is taken under the lock: whichever save lands last writes the newest state
+        lock = self._save_locks.get(job["id"]) or asyncio.Lock()
+        async with lock:
+            job["heartbeat_at"] = _now()
+            await self.db.sync_runs.update_one({"id": job["id"]}, {"$set": snapshot(job)})
+
+    async def get(self, job_id: str):
+        job = self._live.get(job_id)
+        if job is not None:
+            return snapshot(job)
+        job = await self.db.sync_runs.find_one({"id": job_id}, {"_id": 0, "dedupe_key": 0, "expires_at": 0})
+        if job is not None and job["status"] != "done" and self._stale(job.get("heartbeat_at") or job["created_at"]):
+            # its process is gone: record the outcome once, for every reader
+            _abandon(job, job["heartbeat_at"])
+            await self.db.sync_runs.update_one(
+                {"id": job_id, "status": {"$ne": "done"}},
+                {"$set": {"status": "done", "finished_at": job["finished_at"], "result": job["result"], "connectors": job["connectors"]}})
+        return job
+
+    async def running_with(self, key: str):
+        """The job still syncing connector ``key``, in this process or another; None if there is none."""
+        for job in self._live.values():
+            if any(c["key"] == key and c["state"] in ("queued", "running") for c in job["connectors"]):
+                return snapshot(job)
+        doc = await self.db.sync_runs.find_one(
+            {"status": {"$ne": "done"}, "connectors": {"$elemMatch": {"key": key, "state": {"$in": ["queued", "running"]}}}},
+            {"_id": 0, "id": 1}, sort=[("created_at", -1)])
+        job = await self.get(doc["id"]) if doc else None
+        return job if job and job["status"] != "done" else None
+
+    @staticmethod
+    def _stale(heartbeat_at: str) -> bool:
+        return datetime.fromisoformat(heartbeat_at) < datetime.now(timezone.utc) - timedelta(seconds=STALE)
+
+    async def events(self, job_id: str):
+        """Yield a snapshot on every change until the job is done; None now and then as a heartbeat."""
+        seen = None
+        while True:
+            event = self._wakeup.get(job_id)
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job["version"] != seen:
+                seen = job["version"]
+                yield job
+            if job["status"] == "done":
+                return
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), HEARTBEAT)
+                else:
+                    # running in another process: follow its flushes
+                    await asyncio.sleep(self.flush_interval)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {"running": len(self._live), "created": self.created, "deduplicated": self.deduplicated}
@@ -0,0 +1,102 @@
+"""One-shot data migrations, recorded in the ``migrations`` collection.
+
+``normalize_dates`` rewrites every ``date`` that is not a zero-padded
+``YYYY-MM-DD`` string (BSON datetimes, ISO timestamps, unpadded dates) so
+month and range filters can be plain ``$gte``/``$lt`` index scans. It walks
+each collection in ``_id`` order in batches and checkpoints the last ``_id``
+after every batch, so an interrupted run resumes where it stopped.
+
+CLI:
+    python migrations.py normalize_dates
+"""
+import argparse
+import asyncio
+import logging
+import re
+
+from pymongo import UpdateOne
+
+import dates
+import rollups
+
+logger = logging.getLogger(__name__)
+
+DATE_COLLECTIONS = ["incomes", "expenses", "costs", "orders", "returns", "sales_records", "notes"]
+CANONICAL_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+BATCH_SIZE = 500
+
+
+async def is_done(db, name: str) -> bool:
+    return bool(await db.migrations.find_one({"name": name, "done": True}, {"_id": 1}))
+
+
+async def normalize_dates(db, batch_size: int = BATCH_SIZE) -> dict:
+    """Rewrite non-canonical ``date`` values; returns {collection: fixed} plus unreadable dates left as they were."""
+    name = "normalize_dates"
+    state = await db.migrations.find_one({"name": name}) or {}
+    if state.get("done"):
+        return {"done": True, "fixed": state.get("fixed", {}), "unreadable": state.get("unreadable", 0)}
+    checkpoint = state.get("checkpoint", {})
+    fixed = state.get("fixed", {})
+    unreadable = state.get("unreadable", 0)
+    months = set(state.get("months", []))
+
+    for coll in DATE_COLLECTIONS:
+        last_id = checkpoint.get(coll)
+        while True:
+            q = {"date": {"$exists": True, "$not": CANONICAL_DATE}}
+            if last_id is not None:
+                q["_id"] = {"$gt": last_id}
+            batch = await db[coll].find(q, {"_id": 1, "date": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+            if not batch:
+                break
+            ops = []
+            for doc in batch:
+                value = dates.normalize(doc["date"])
+                if value is None:
+                    unreadable += 1
+                    logger.warning("%s %s: unreadable date %r left as is", coll, doc["_id"], doc["date"])
+                    continue
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"date": value}}))
+                if coll in rollups.LEDGERS:
+                    months.add(value[:7])
+            if ops:
+                await db[coll].bulk_write(ops, ordered=False)
+            last_id = batch[-1]["_id"]
+            fixed[coll] = fixed.get(coll, 0) + len(ops)
+            await db.migrations.update_one(
+                {"name": name},
+                {"$set": {f"checkpoint.{coll}": last_id, "fixed": fixed, "unreadable": unreadable, "months": sorted(months)}},
+                upsert=True,
+            )
+
+    # rollup buckets were keyed by the old raw values; drop those and recompute the months they moved into
+    if months:
+        await db.daily_rollups.delete_many({"date": {"$not": CANONICAL_DATE}})
+        await rollups.rebuild(db, min(months), max(months))
+    await db.migrations.update_one(
+        {"name": name},
+        {"$set": {"done": True, "fixed": fixed, "unreadable": unreadable}, "$unset": {"checkpoint": ""}},
+        upsert=True,
+    )
+    return {"done": True, "fixed": fixed, "unreadable": unreadable}
+
+
+MIGRATIONS = {"normalize_dates": normalize_dates}
+
+
+async def _main(args):
+    from server import db, collection_versions
+    from etags import ALL
+    report = await MIGRATIONS[args.name](db)
+    await collection_versions.bump([ALL])
+    for coll, n in report["fixed"].items():
+        print(f"{coll}: {n} dates normalized")
+    print(f"{report['unreadable']} unreadable dates left as is")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a one-shot data migration")
+    parser.add_argument("name", choices=list(MIGRATIONS))
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,133 @@
+"""Application-wide HTTP client for the outbound integrations (Shopify, TikTok).
+
+One pooled httpx.AsyncClient is opened at startup and closed at shutdown,
+so syncs reuse keep-alive connections instead of paying a TCP + TLS
+handshake per call. httpx only caps the pool as a whole; ``per_host``
+additionally limits concurrent requests to any single host, so a burst
+of syncs against one store cannot take every connection.
+
+Connection reuse is measured with httpcore's trace hook: every request is
+counted, and so is every TCP connect / TLS handshake it had to make.
+HTTP/2 is used when asked for and the ``h2`` package is installed.
+
+Requests also pass through the per-host token buckets and retry policy
+of ``ratelimit``: hosts listed in ``rate_limits`` start with a fixed
+bucket, and a host that answers with Shopify's call-limit header gets
+one sized from it (refilling at ``leak_rate``).
+"""
+import asyncio
+import importlib.util
+import logging
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+
+import ratelimit
+
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundClient:
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30,
+                 per_host: int = 10, http2: bool = False, timeout: float = 30,
+                 retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 8,
+                 rate_limits: dict = None, leak_rate: float = 2):
+        """rate_limits: {host: (capacity, requests per second)}."""
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.per_host = per_host
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.warning("OUTBOUND_HTTP2 set but the h2 package is missing, using HTTP/1.1")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.leak_rate = leak_rate
+        self.buckets = {host: ratelimit.TokenBucket(capacity, rate) for host, (capacity, rate) in (rate_limits or {}).items()}
+        self._client = None
+        self._host_slots = {}
+        self.requests = defaultdict(int)     # host -> requests sent
+        self.connections = defaultdict(int)  # host -> TCP connections opened
+        self.handshakes = defaultdict(int)   # host -> TLS handshakes
+        self.in_flight = defaultdict(int)
+        self.retried = defaultdict(int)      # host -> requests sent again after a 429 / 5xx
+        self.throttled = defaultdict(int)    # host -> 429 answers
+
+    def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._host_slots = {}
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send with rate limiting; 429 (and 5xx for idempotent methods) is retried up to ``retries`` times.
+
+        The last response is returned as is once retries run out.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            bucket = self.buckets.get(host)
+            if bucket is not None:
+                await bucket.acquire()
+            resp = await self._send(host, method, url, **kwargs)
+            limit = ratelimit.call_limit(resp.headers)
+            if limit is not None:
+                if bucket is None:
+                    # concurrent first requests to a new host all land here; they must share one bucket
+                    bucket = self.buckets.setdefault(host, ratelimit.TokenBucket(limit[1], self.leak_rate))
+                bucket.observe(*limit, pending=self.in_flight[host])
+            status = resp.status_code
+            if status == 429:
+                self.throttled[host] += 1
+            if attempt == self.retries or status not in ratelimit.RETRY_STATUSES or (status != 429 and method not in IDEMPOTENT):
+                return resp
+            wait = ratelimit.retry_after(resp.headers)
+            if wait is not None and bucket is not None:
+                bucket.pause(wait)  # everything queued for this host waits too
+            await resp.aclose()
+            self.retried[host] += 1
+            await asyncio.sleep(wait if wait is not None else ratelimit.backoff(attempt, self.backoff_base, self.backoff_max))
+
+    async def _send(self, host: str, method: str, url: str, **kwargs) -> httpx.Response:
+        self.start()  # scripts and tests that skip the app lifespan still get a client
+
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                self.connections[host] += 1
+            elif event == "connection.start_tls.complete":
+                self.handshakes[host] += 1
+
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slots:
+            self.requests[host] += 1
+            self.in_flight[host] += 1
+            try:
+                return await self._client.request(method, url, extensions={"trace": trace}, **kwargs)
+            finally:
+                self.in_flight[host] -= 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    def metrics(self) -> dict:
+        requests = sum(self.requests.values())
+        connections = sum(self.connections.values())
+        return {
+            "open": self._client is not None, "http2": self.http2,
+            "max_connections": self.limits.max_connections, "per_host": self.per_host,
+            "requests": requests, "connections_opened": connections, "tls_handshakes": sum(self.handshakes.values()),
+            "reuse_rate": round(1 - connections / requests, 4) if requests else 0,
+            "retried": sum(self.retried.values()), "throttled": sum(self.throttled.values()),
+            "by_host": {h: {"requests": n, "connections": self.connections[h], "in_flight": self.in_flight[h],
+                            "retried": self.retried[h], "throttled": self.throttled[h],
+                            **({"bucket": f"{b.capacity:g}@{b.rate:g}/s", "waited_s": round(b.waited, 3)} if (b := self.buckets.get(h)) else {})}
+                        for h, n in self.requests.items()},
+        }
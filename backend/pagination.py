@@ -0,0 +1,52 @@
+"""Keyset (cursor) pagination for the list endpoints.
+
+A page is a range scan on the endpoint's sort keys, which always end with
+the unique ``id`` as tie-breaker: the cursor carries the sort values of the
+last row served, and the next page asks for rows strictly after it. Memory
+per request is bounded by ``limit`` no matter how deep the client pages.
+Cursors are opaque to clients (urlsafe base64 of extended JSON).
+"""
+import base64
+
+from bson import json_util
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, n_keys: int) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != n_keys:
+        raise HTTPException(status_code=400, detail="Nieprawidlowy kursor")
+    return values
+
+
+def after(sort: list, values: list) -> dict:
+    """Filter for rows strictly after ``values`` in ``sort`` order ([(field, 1 | -1), ...])."""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+async def paginate(collection, query: dict, sort: list, limit: int = None, cursor: str = None) -> dict:
+    """One page of ``collection`` as {"items", "next_cursor"}; next_cursor is None on the last page."""
+    limit = min(limit or DEFAULT_LIMIT, MAX_LIMIT)
+    if cursor:
+        query = {"$and": [query, after(sort, decode_cursor(cursor, len(sort)))]}
+    items = await collection.find(query, {"_id": 0}).sort(sort).limit(limit + 1).to_list(None)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1].get(field) for field, _ in sort])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,94 @@
+"""Client-side rate limiting and retry policy for the outbound integrations.
+
+Each host gets a token bucket: a request takes a token, and tokens refill
+at ``rate`` per second up to ``capacity``. A Shopify store is its own host,
+so every store has its own bucket. Shopify reports how full its leaky
+bucket is on every response (``X-Shopify-Shop-Api-Call-Limit: 32/40``), and
+the bucket adopts that limit and never holds more tokens than the server
+says are left. Concurrent syncs against one store therefore slow down
+before Shopify starts refusing them.
+
+A 429 or 5xx is retried after a jittered exponential backoff ("full
+jitter": uniform over 0..min(cap, base * 2**attempt)). A Retry-After from
+the server takes precedence and also pauses the whole host's bucket, so
+requests queued behind the failing one wait as well instead of hitting
+the limit again.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+SHOPIFY_CALL_LIMIT = "x-shopify-shop-api-call-limit"
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waited = 0.0  # seconds callers spent waiting for a token
+        self._lock = asyncio.Lock()  # waiters are served in arrival order
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def observe(self, used: int, limit: int, pending: int = 0):
+        """The server's count: ``used`` of ``limit`` calls taken, not counting the ``pending`` requests
+        still in flight. It wins whenever it leaves less room than ours."""
+        self._refill(time.monotonic())
+        self.capacity = limit
+        self.tokens = min(self.tokens, limit - used - pending)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+
+def call_limit(headers) -> tuple:
+    """"32/40" -> (32, 40); None without the header."""
+    value = headers.get(SHOPIFY_CALL_LIMIT)
+    if not value or "/" not in value:
+        return None
+    used, limit = value.split("/", 1)
+    try:
+        return int(used), int(limit)
+    except ValueError:
+        return None
+
+
+def retry_after(headers) -> float:
+    """Retry-After in seconds (delta-seconds or HTTP date); None when missing or unreadable."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter delay before retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
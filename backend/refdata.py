@@ -0,0 +1,95 @@
+"""In-process cache for reference data (shops, app settings, custom columns).
+
+Each collection is loaded once and served from memory until its version
+changes. Versions live in a single Mongo document (``cache_versions``,
+``_id: "refdata"``) that the CRUD endpoints bump with ``$inc``; a process
+re-reads it at most once per ``check_interval`` seconds. Lookups between
+checks cost no round trip, and a change made through another worker is
+seen within one interval. Cached values are shared: treat them as read-only.
+
+Within a request the ETag middleware has already read the per-collection
+write counters its tag is built from (``current_stamp``). When those
+counters show a write to a reference collection this process has not
+seen yet, the versions are re-read at once instead of at the next
+interval: a body is never older than the tag it is sent with.
+"""
+import time
+
+from pymongo import ReturnDocument
+
+STAMP_ID = "refdata"
+
+
+class RefCache:
+    def __init__(self, db, check_interval: float = 2.0, on_change=None, current_stamp=None):
+        self.db = db
+        self.check_interval = check_interval
+        self.on_change = on_change  # called when any reference collection changed
+        self.current_stamp = current_stamp  # () -> collection write counters read for this request, or None
+        self._loaders = {}
+        self._values = {}    # name -> (version, value)
+        self._versions = {}  # name -> last version seen in Mongo
+        self._checked_at = None
+        self._written = {}   # name -> highest collection write counter seen in a request stamp
+        self.hits = 0
+        self.loads = 0
+        self.stamp_reads = 0
+
+    def register(self, name: str, loader):
+        """loader() is awaited to (re)load ``name`` after a version change."""
+        self._loaders[name] = loader
+
+    def _apply(self, stamp: dict) -> bool:
+        versions = {name: stamp.get(name, 0) for name in self._loaders}
+        changed = versions != self._versions
+        self._versions = versions
+        return changed
+
+    def _written_since(self) -> bool:
+        """The request's collection counters show a write not seen before."""
+        stamp = self.current_stamp() if self.current_stamp else None
+        if not stamp:
+            return False
+        newer = {name: stamp[name] for name in self._loaders if stamp.get(name, 0) > self._written.get(name, 0)}
+        self._written.update(newer)
+        return bool(newer)
+
+    async def _refresh(self):
+        now = time.monotonic()
+        written = self._written_since()
+        if not written and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        stamp = await self.db.cache_versions.find_one({"_id": STAMP_ID}) or {}
+        self.stamp_reads += 1
+        # the first read only seeds versions; later differences are writes from other processes
+        if self._apply(stamp) and self._checked_at is not None and self.on_change:
+            self.on_change()
+        self._checked_at = now
+
+    async def get(self, name: str):
+        await self._refresh()
+        version = self._versions.get(name, 0)
+        entry = self._values.get(name)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        # version read before loading: a bump racing with the load leaves this entry stale-stamped
+        value = await self._loaders[name]()
+        self.loads += 1
+        self._values[name] = (version, value)
+        return value
+
+    async def bump(self, name: str):
+        """Record a write to ``name`` for this and every other process."""
+        stamp = await self.db.cache_versions.find_one_and_update(
+            {"_id": STAMP_ID}, {"$inc": {name: 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        self._values.pop(name, None)
+        self._apply(stamp)
+        if self.on_change:
+            self.on_change()
+
+    def metrics(self) -> dict:
+        return {
+            "hits": self.hits, "loads": self.loads, "stamp_reads": self.stamp_reads,
+            "versions": dict(self._versions), "check_interval": self.check_interval,
+        }
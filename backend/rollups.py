@@ -0,0 +1,209 @@
+"""Materialized per-day ledger totals (``daily_rollups`` collection).
+
+One document per (shop_id, date, ledger, category) holding the summed
+``amount`` and the row ``count`` of the raw ledger documents behind it.
+Ledger writes keep it current with atomic ``$inc`` upserts; ``rebuild``
+recomputes it from raw data and reports any drift.
+
+CLI:
+    python rollups.py verify  --from 2025-01 --to 2025-12
+    python rollups.py rebuild --from 2025-01 --to 2025-12
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne, DeleteOne
+
+import dates
+
+# ledger collection -> how a raw document maps to a rollup category
+LEDGERS = {
+    "incomes": "income",
+    "expenses": "ads",
+    "costs": None,  # per-document category (tiktok, meta, google, zwroty, inne, custom column)
+}
+
+DRIFT_TOLERANCE = 0.01
+
+
+# A cost without a category (missing, null or "") is counted as "inne", and a ledger row without
+# a shop_id (missing or null) as shop 1. _key and rebuild's pipeline must follow the same rule,
+# or verify reports drift for every such row.
+DEFAULT_CATEGORY = "inne"
+DEFAULT_SHOP_ID = 1
+
+
+def _category(ledger: str, doc: dict) -> str:
+    fixed = LEDGERS[ledger]
+    if fixed is not None:
+        return fixed
+    return doc.get("category") or DEFAULT_CATEGORY
+
+
+def _key(ledger: str, doc: dict) -> dict:
+    shop_id = doc.get("shop_id")
+    return {"shop_id": DEFAULT_SHOP_ID if shop_id is None else shop_id, "date": doc["date"], "ledger": ledger,
+            "category": _category(ledger, doc)}
+
+
+async def apply_delta(db, ledger: str, doc: dict, amount: float, count: int):
+    """Atomically shift one rollup bucket by amount/count."""
+    key = _key(ledger, doc)
+    await db.daily_rollups.update_one(key, {"$inc": {"amount": amount, "count": count}}, upsert=True)
+    if count < 0:
+        await db.daily_rollups.delete_one({**key, "count": {"$lte": 0}})
+
+
+async def record_insert(db, ledger: str, doc: dict):
+    await apply_delta(db, ledger, doc, doc.get("amount", 0), 1)
+
+
+async def record_delete(db, ledger: str, doc: dict):
+    await apply_delta(db, ledger, doc, -doc.get("amount", 0), -1)
+
+
+async def record_many(db, ledger: str, docs: list, sign: int = 1):
+    """Fold a batch of inserted (sign=1) or deleted (sign=-1) ledger docs into the rollups."""
+    buckets = {}
+    for doc in docs:
+        k = _key(ledger, doc)
+        kt = (k["shop_id"], k["date"], k["category"])
+        amount, count = buckets.get(kt, (0, 0))
+        buckets[kt] = (amount + doc.get("amount", 0), count + 1)
+    ops = [
+        UpdateOne({"shop_id": sid, "date": ds, "ledger": ledger, "category": cat},
+                  {"$inc": {"amount": sign * amount, "count": sign * count}}, upsert=True)
+        for (sid, ds, cat), (amount, count) in buckets.items()
+    ]
+    if ops:
+        await db.daily_rollups.bulk_write(ops, ordered=False)
+    if sign < 0 and ops:
+        await db.daily_rollups.delete_many({"ledger": ledger, "count": {"$lte": 0}})
+
+
+async def record_replace(db, ledger: str, old_docs: list, new_docs: list, session=None):
+    """Fold ``old_docs`` being replaced by ``new_docs`` into the rollups as one net bulk write."""
+    buckets = {}
+    for sign, docs in ((-1, old_docs), (1, new_docs)):
+        for doc in docs:
+            k = _key(ledger, doc)
+            kt = (k["shop_id"], k["date"], k["category"])
+            amount, count = buckets.get(kt, (0, 0))
+            buckets[kt] = (amount + sign * doc.get("amount", 0), count + sign)
+    ops = [
+        UpdateOne({"shop_id": sid, "date": ds, "ledger": ledger, "category": cat},
+                  {"$inc": {"amount": amount, "count": count}}, upsert=True)
+        for (sid, ds, cat), (amount, count) in buckets.items() if amount or count
+    ]
+    if ops:
+        await db.daily_rollups.bulk_write(ops, ordered=False, session=session)
+        touched = sorted({ds for _, ds, _ in buckets})
+        await db.daily_rollups.delete_many({"ledger": ledger, "date": {"$in": touched}, "count": {"$lte": 0}}, session=session)
+
+
+async def drop_category(db, ledger: str, category: str):
+    await db.daily_rollups.delete_many({"ledger": ledger, "category": category})
+
+
+async def find(db, ledgers: list, date_query, shop_id=None) -> list:
+    """Rollup rows for the given ledgers and date filter, optionally for one shop."""
+    q = {"ledger": {"$in": ledgers}, "date": date_query}
+    if shop_id is not None:
+        q["shop_id"] = shop_id
+    return await db.daily_rollups.find(q, {"_id": 0}).to_list(None)
+
+
+# group_by -> period key expression over the rollup ``date`` string
+PERIODS = {
+    "day": "$date",
+    "week": {"$dateToString": {"format": "%G-W%V", "date": {"$dateFromString": {"dateString": "$date", "onError": None}}}},
+    "month": {"$substrBytes": ["$date", 0, 7]},
+}
+
+
+async def sum_by_period(db, ledgers: list, date_query, group_by: str, shop_id=None) -> list:
+    """Rollup amounts summed per (period, ledger, category) inside Mongo."""
+    q = {"ledger": {"$in": ledgers}, "date": date_query}
+    if shop_id is not None:
+        q["shop_id"] = shop_id
+    pipeline = [
+        {"$match": q},
+        {"$group": {
+            "_id": {"period": PERIODS[group_by], "ledger": "$ledger", "category": "$category"},
+            "amount": {"$sum": "$amount"},
+        }},
+    ]
+    return [{**row["_id"], "amount": row["amount"]} async for row in db.daily_rollups.aggregate(pipeline)]
+
+
+async def rebuild(db, start_month: str = None, end_month: str = None, apply: bool = True) -> dict:
+    """Recompute rollups from the raw ledgers for [start_month, end_month] (YYYY-MM, inclusive).
+
+    Returns the drift between stored and recomputed buckets; with apply=False nothing is written.
+    """
+    date_q = dates.months_range(start_month, end_month)
+    match = {"date": date_q} if date_q else {}
+
+    expected = {}
+    for ledger, fixed in LEDGERS.items():
+        category = fixed if fixed is not None else {
+            "$cond": [{"$in": [{"$ifNull": ["$category", None]}, [None, ""]]}, DEFAULT_CATEGORY, "$category"]}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"shop_id": {"$ifNull": ["$shop_id", DEFAULT_SHOP_ID]}, "date": "$date", "category": category},
+                "amount": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+            }},
+        ]
+        async for row in db[ledger].aggregate(pipeline):
+            k = (row["_id"]["shop_id"], row["_id"]["date"], ledger, row["_id"]["category"])
+            expected[k] = (round(row["amount"], 2), row["count"])
+
+    actual = {}
+    async for r in db.daily_rollups.find(match, {"_id": 0}):
+        actual[(r["shop_id"], r["date"], r["ledger"], r["category"])] = (r.get("amount", 0), r.get("count", 0))
+
+    drift = []
+    for k in sorted(set(expected) | set(actual), key=lambda k: (str(k[1]), str(k[0]), k[2], str(k[3]))):
+        exp_amount, exp_count = expected.get(k, (0, 0))
+        act_amount, act_count = actual.get(k, (0, 0))
+        if abs(exp_amount - act_amount) > DRIFT_TOLERANCE or exp_count != act_count:
+            drift.append({
+                "shop_id": k[0], "date": k[1], "ledger": k[2], "category": k[3],
+                "expected": exp_amount, "actual": round(act_amount, 2),
+                "expected_count": exp_count, "actual_count": act_count,
+            })
+
+    if apply:
+        ops = []
+        for (sid, ds, ledger, cat), (amount, count) in expected.items():
+            ops.append(UpdateOne({"shop_id": sid, "date": ds, "ledger": ledger, "category": cat},
+                                 {"$set": {"amount": amount, "count": count}}, upsert=True))
+        for (sid, ds, ledger, cat) in set(actual) - set(expected):
+            ops.append(DeleteOne({"shop_id": sid, "date": ds, "ledger": ledger, "category": cat}))
+        if ops:
+            await db.daily_rollups.bulk_write(ops, ordered=False)
+
+    return {"from": start_month, "to": end_month, "buckets": len(expected), "drift": drift, "applied": apply}
+
+
+async def _main(args):
+    from server import db, collection_versions
+    report = await rebuild(db, args.start, args.end, apply=args.command == "rebuild")
+    if report["applied"]:
+        await collection_versions.bump(["daily_rollups"])
+    for d in report["drift"]:
+        print(f"DRIFT shop={d['shop_id']} {d['date']} {d['ledger']}/{d['category']}: "
+              f"stored {d['actual']} ({d['actual_count']}) vs raw {d['expected']} ({d['expected_count']})")
+    action = "rebuilt" if report["applied"] else "verified"
+    print(f"{action} {report['buckets']} buckets, {len(report['drift'])} drifted")
+    return 1 if report["drift"] and not report["applied"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify the daily_rollups collection")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--from", dest="start", help="first month, YYYY-MM")
+    parser.add_argument("--to", dest="end", help="last month, YYYY-MM")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
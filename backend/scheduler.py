@@ -0,0 +1,156 @@
+"""In-process scheduler for the Shopify / TikTok syncs.
+
+Every active connector config has one document in ``sync_jobs`` (``id``
+"shopify:<shop_id>" / "tiktok:<config id>"). The document holds the
+connector's interval, ``next_run_at`` and the outcome of its recent runs.
+Every ``tick`` seconds the scheduler does three things:
+- brings the job list in line with the configs;
+- claims the jobs that are due;
+- starts each claimed job as a task, at most ``concurrency`` at a time.
+
+A claim is a lease (``locked_until``) taken with one conditional update.
+Several processes can therefore run the scheduler without syncing the
+same connector twice. If a process dies mid-run, its lease expires and
+another process picks the job up.
+
+A manual sync of a scheduled connector takes the same lease with
+``acquire`` (due or not), so it never runs alongside the scheduled one.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+HISTORY = 20  # runs kept per job
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+class SyncScheduler:
+    def __init__(self, db, list_jobs, run_job, tick: float = 30, lease: float = 900, concurrency: int = 4):
+        """list_jobs() -> [{"id", "kind", "ref", "interval_minutes"}]; run_job(kind, ref) -> result dict."""
+        self.db = db
+        self.list_jobs = list_jobs
+        self.run_job = run_job
+        self.tick = tick
+        self.lease = lease
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self._slots = asyncio.Semaphore(concurrency)
+        self._loop_task = None
+        self._running = set()
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        tasks = [t for t in [self._loop_task, *self._running] if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("Sync scheduler tick failed")
+            await asyncio.sleep(self.tick)
+
+    async def refresh_jobs(self, now: datetime):
+        """Create, retime and drop job documents to match the connector configs."""
+        wanted = {j["id"]: j for j in await self.list_jobs() if j["interval_minutes"] > 0}
+        existing = {j["id"]: j for j in await self.db.sync_jobs.find({}, {"_id": 0, "history": 0}).to_list(None)}
+        for job_id, spec in wanted.items():
+            job = existing.get(job_id)
+            if job is None:
+                # a new connector syncs on the first tick
+                await self.db.sync_jobs.update_one({"id": job_id}, {"$setOnInsert": {
+                    **spec, "next_run_at": _iso(now), "locked_until": None, "runs": 0, "failures": 0, "history": [],
+                }}, upsert=True)
+            elif job["interval_minutes"] != spec["interval_minutes"]:
+                last = datetime.fromisoformat(job["last_run_at"]) if job.get("last_run_at") else now
+                await self.db.sync_jobs.update_one({"id": job_id}, {"$set": {
+                    "interval_minutes": spec["interval_minutes"],
+                    "next_run_at": _iso(last + timedelta(minutes=spec["interval_minutes"])),
+                }})
+        gone = [job_id for job_id in existing if job_id not in wanted]
+        if gone:
+            await self.db.sync_jobs.delete_many({"id": {"$in": gone}})
+
+    async def _claim(self, job_id: str, now: datetime):
+        return await self.db.sync_jobs.find_one_and_update(
+            {"id": job_id, "next_run_at": {"$lte": _iso(now)},
+             "$or": [{"locked_until": None}, {"locked_until": {"$lt": _iso(now)}}]},
+            {"$set": {"locked_until": _iso(now + timedelta(seconds=self.lease)), "owner": self.owner}},
+            projection={"_id": 0, "history": 0})
+
+    async def acquire(self, job_id: str, owner: str):
+        """Take a job's lease for a run outside the schedule. True: taken; False: held by a running sync;
+        None: the connector is not scheduled, so there is no lease to take."""
+        now = datetime.now(timezone.utc)
+        job = await self.db.sync_jobs.find_one_and_update(
+            {"id": job_id, "$or": [{"locked_until": None}, {"locked_until": {"$lt": _iso(now)}}]},
+            {"$set": {"locked_until": _iso(now + timedelta(seconds=self.lease)), "owner": owner}},
+            projection={"_id": 0, "id": 1})
+        if job is not None:
+            return True
+        return False if await self.db.sync_jobs.find_one({"id": job_id}, {"_id": 1}) else None
+
+    async def release(self, job_id: str, owner: str):
+        # only our own lease: after it expired, another run may hold the job
+        await self.db.sync_jobs.update_one({"id": job_id, "owner": owner}, {"$set": {"locked_until": None}})
+
+    async def run_due(self) -> list:
+        """One tick: start every due job this process manages to claim. Returns the started tasks."""
+        now = datetime.now(timezone.utc)
+        await self.refresh_jobs(now)
+        due = await self.db.sync_jobs.find({"next_run_at": {"$lte": _iso(now)}}, {"_id": 0, "id": 1}).to_list(None)
+        started = []
+        for d in due:
+            job = await self._claim(d["id"], now)
+            if job is None:
+                continue  # running here or in another process
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            started.append(task)
+        return started
+
+    async def _run(self, job: dict):
+        async with self._slots:
+            released = False
+            try:
+                started = datetime.now(timezone.utc)
+                try:
+                    result = await self.run_job(job["kind"], job["ref"])
+                except Exception as e:
+                    result = {"status": "error", "detail": getattr(e, "detail", None) or str(e)}
+                finished = datetime.now(timezone.utc)
+                ok = result.get("status") == "ok"
+                run = {
+                    "started_at": _iso(started), "duration_ms": round((finished - started).total_seconds() * 1000),
+                    "status": result.get("status", "error"), "detail": result.get("detail"),
+                }
+                await self.db.sync_jobs.update_one({"id": job["id"]}, {
+                    "$set": {
+                        "last_run_at": run["started_at"], "last_duration_ms": run["duration_ms"],
+                        "last_status": run["status"], "last_result": result,
+                        "next_run_at": _iso(finished + timedelta(minutes=job["interval_minutes"])), "locked_until": None,
+                    },
+                    "$inc": {"runs": 1, "failures": 0 if ok else 1},
+                    "$push": {"history": {"$each": [run], "$slice": -HISTORY}},
+                })
+                released = True
+                if not ok:
+                    logger.warning("Scheduled sync %s failed: %s", job["id"], run["detail"])
+                return result
+            finally:
+                if not released:
+                    # cancelled (stop) or the bookkeeping failed: the job is due again at once, not after the lease
+                    await self.release(job["id"], self.owner)
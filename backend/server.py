@@ -2,18 +2,40 @@ from fastapi import FastAPI, APIRouter, HTTPException, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel
 from typing import List, Optional, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-import httpx
 import calendar
 import io
 from fastapi.responses import StreamingResponse
 
+import dates
+import fastjson
+import migrations
+import pagination
+import rollups
+import shopify_orders
+import shopify_sync
+import stats_engine
+import streaming
+import sync_writer
+from compression import CompressionMiddleware
+from etags import ALL, STATS, CollectionVersions, ETagMiddleware, request_stamp
+from fastjson import ORJSONResponse
+from jobs import JobTracker, snapshot
+from outbound import OutboundClient
+from refdata import RefCache
+from scheduler import SyncScheduler
+from singleflight import SingleFlight
+from stats_cache import stats_cache
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -25,7 +47,7 @@ if not mongo_url:
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ.get('DB_NAME', 'ecommify_db')]
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ===== CONSTANTS =====
@@ -52,19 +74,26 @@ DEFAULT_APP_SETTINGS = {
     "app_name": "Ecommify Campaign Calculator",
 }
 
+# Independent reads of one handler run concurrently
+async def fanout(*aws):
+    """Await independent reads together; results come back in argument order."""
+    return await asyncio.gather(*aws)
+
+# Reference data is served from ref_cache; mutate only through the CRUD endpoints, which bump its version
 async def get_shops_list():
-    shops = await db.shops.find({}, {"_id": 0}).sort("id", 1).to_list(100)
-    if not shops:
-        for s in DEFAULT_SHOPS:
-            await db.shops.insert_one({**s, "is_active": True, "created_at": datetime.now(timezone.utc).isoformat()})
-        shops = await db.shops.find({}, {"_id": 0}).sort("id", 1).to_list(100)
-    return shops
+    return await ref_cache.get("shops")
 
 async def get_shop_names():
     shops = await get_shops_list()
     return {s["id"]: s["name"] for s in shops}
 
 async def get_app_settings():
+    return await ref_cache.get("app_settings")
+
+async def get_custom_columns_list():
+    return await ref_cache.get("custom_columns")
+
+async def _load_app_settings():
     settings = await db.app_settings.find_one({"_key": "main"}, {"_id": 0})
     if not settings:
         settings = {**DEFAULT_APP_SETTINGS, "_key": "main"}
@@ -72,6 +101,32 @@ async def get_app_settings():
         settings.pop("_id", None)
     return settings
 
+collection_versions = CollectionVersions(db)
+ref_cache = RefCache(db, check_interval=float(os.environ.get("REFDATA_CHECK_INTERVAL", "2")), on_change=stats_cache.touch_all,
+                     current_stamp=request_stamp.get)
+ref_cache.register("shops", lambda: db.shops.find({}, {"_id": 0}).sort("id", 1).to_list(100))
+ref_cache.register("app_settings", _load_app_settings)
+ref_cache.register("custom_columns", lambda: db.custom_columns.find({}, {"_id": 0}).sort("created_at", 1).to_list(100))
+
+# One pooled client for Shopify / TikTok: opened at startup, closed at shutdown
+TIKTOK_QPS = float(os.environ.get("TIKTOK_QPS", "10"))
+outbound = OutboundClient(
+    max_connections=int(os.environ.get("OUTBOUND_MAX_CONNECTIONS", "100")),
+    max_keepalive=int(os.environ.get("OUTBOUND_MAX_KEEPALIVE", "20")),
+    per_host=int(os.environ.get("OUTBOUND_PER_HOST", "10")),
+    http2=os.environ.get("OUTBOUND_HTTP2") == "1",
+    # 429 / 5xx retried with jittered backoff; Shopify stores are paced by their call-limit header, TikTok by its QPS
+    retries=int(os.environ.get("OUTBOUND_RETRIES", "4")),
+    leak_rate=float(os.environ.get("SHOPIFY_LEAK_RATE", "2")),
+    rate_limits={"business-api.tiktok.com": (TIKTOK_QPS, TIKTOK_QPS)},
+)
+
+# Identical concurrent calls to the heavy endpoints share one computation
+inflight = SingleFlight()
+
+# Manual syncs run as background jobs; progress is kept in sync_runs
+sync_jobs = JobTracker(db, flush_interval=float(os.environ.get("SYNC_JOB_FLUSH_INTERVAL", "1")))
+
 # ===== MODELS =====
 class LoginRequest(BaseModel):
     pin: str
@@ -122,18 +177,21 @@ class ShopifyConfigCreate(BaseModel):
     shop_id: int
     store_url: str
     api_token: str
+    sync_interval_minutes: Optional[int] = None
 
 class TikTokConfigCreate(BaseModel):
     name: str
     advertiser_id: str
     access_token: str
     linked_shop_ids: List[int] = []
+    sync_interval_minutes: Optional[int] = None
 
 class TikTokConfigUpdate(BaseModel):
     name: Optional[str] = None
     advertiser_id: Optional[str] = None
     access_token: Optional[str] = None
     linked_shop_ids: Optional[List[int]] = None
+    sync_interval_minutes: Optional[int] = None
 
 class ChatMessage(BaseModel):
     shop_id: int
@@ -145,8 +203,7 @@ async def login(req: LoginRequest):
     user = USERS.get(req.pin)
     if not user:
         raise HTTPException(status_code=401, detail="Nieprawidlowy PIN")
-    shops = await get_shops_list()
-    settings = await get_app_settings()
+    shops, settings = await fanout(get_shops_list(), get_app_settings())
     return {"user": user, "shops": shops, "settings": settings}
 
 # ===== SHOPS CRUD =====
@@ -165,11 +222,19 @@ async def list_shops():
 
 @api_router.post("/shops")
 async def create_shop(shop: ShopCreate):
-    shops = await get_shops_list()
-    max_id = max((s["id"] for s in shops), default=0)
-    doc = {"id": max_id + 1, "name": shop.name, "color": shop.color, "is_active": True, "created_at": datetime.now(timezone.utc).isoformat()}
-    await db.shops.insert_one(doc)
+    # next id from the collection, not the cached list (another worker may have added a shop); the unique id index settles races
+    for _ in range(5):
+        last = await db.shops.find({}, {"_id": 0, "id": 1}).sort("id", DESCENDING).limit(1).to_list(1)
+        doc = {"id": (last[0]["id"] if last else 0) + 1, "name": shop.name, "color": shop.color, "is_active": True, "created_at": datetime.now(timezone.utc).isoformat()}
+        try:
+            await db.shops.insert_one(doc)
+            break
+        except DuplicateKeyError:
+            continue
+    else:
+        raise HTTPException(status_code=409, detail="Nie udalo sie nadac id sklepu, sprobuj ponownie")
     doc.pop("_id", None)
+    await ref_cache.bump("shops")
     return doc
 
 @api_router.put("/shops/{shop_id}")
@@ -177,6 +242,7 @@ async def update_shop(shop_id: int, update: ShopUpdate):
     upd = {k: v for k, v in update.dict().items() if v is not None}
     if upd:
         await db.shops.update_one({"id": shop_id}, {"$set": upd})
+        await ref_cache.bump("shops")
     shop = await db.shops.find_one({"id": shop_id}, {"_id": 0})
     if not shop:
         raise HTTPException(status_code=404, detail="Nie znaleziono sklepu")
@@ -185,6 +251,7 @@ async def update_shop(shop_id: int, update: ShopUpdate):
 @api_router.delete("/shops/{shop_id}")
 async def delete_shop(shop_id: int):
     await db.shops.delete_one({"id": shop_id})
+    await ref_cache.bump("shops")
     return {"status": "ok"}
 
 # ===== APP SETTINGS =====
@@ -197,6 +264,7 @@ async def update_settings(body: dict):
     body.pop("_key", None)
     body.pop("_id", None)
     await db.app_settings.update_one({"_key": "main"}, {"$set": body}, upsert=True)
+    await ref_cache.bump("app_settings")
     return await get_app_settings()
 
 # ===== INCOMES =====
@@ -212,6 +280,8 @@ async def create_income(income: IncomeCreate):
     }
     await db.incomes.insert_one(doc)
     doc.pop("_id", None)
+    await rollups.record_insert(db, "incomes", doc)
+    stats_cache.touch(doc["shop_id"], doc["date"])
     return doc
 
 @api_router.get("/incomes")
@@ -220,15 +290,16 @@ async def get_incomes(shop_id: int = Query(...), date: Optional[str] = None, yea
     if date:
         query["date"] = date
     elif year and month:
-        prefix = f"{year}-{month:02d}"
-        query["date"] = {"$regex": f"^{prefix}"}
-    return await db.incomes.find(query, {"_id": 0}).to_list(10000)
+        query["date"] = dates.month_range(year, month)
+    return ORJSONResponse(await db.incomes.find(query, {"_id": 0}).to_list(10000))
 
 @api_router.delete("/incomes/{income_id}")
 async def delete_income(income_id: str):
-    result = await db.incomes.delete_one({"id": income_id})
-    if result.deleted_count == 0:
+    doc = await db.incomes.find_one_and_delete({"id": income_id}, {"_id": 0})
+    if not doc:
         raise HTTPException(status_code=404, detail="Nie znaleziono")
+    await rollups.record_delete(db, "incomes", doc)
+    stats_cache.touch(doc.get("shop_id", 1), doc["date"])
     return {"status": "ok"}
 
 # ===== EXPENSES =====
@@ -244,6 +315,7 @@ async def create_expense(expense: ExpenseCreate):
     }
     await db.expenses.insert_one(doc)
     doc.pop("_id", None)
+    await rollups.record_insert(db, "expenses", doc)
     return doc
 
 @api_router.get("/expenses")
@@ -252,258 +324,126 @@ async def get_expenses(shop_id: int = Query(...), date: Optional[str] = None, ye
     if date:
         query["date"] = date
     elif year and month:
-        prefix = f"{year}-{month:02d}"
-        query["date"] = {"$regex": f"^{prefix}"}
-    return await db.expenses.find(query, {"_id": 0}).to_list(10000)
+        query["date"] = dates.month_range(year, month)
+    return ORJSONResponse(await db.expenses.find(query, {"_id": 0}).to_list(10000))
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: str):
-    result = await db.expenses.delete_one({"id": expense_id})
-    if result.deleted_count == 0:
+    doc = await db.expenses.find_one_and_delete({"id": expense_id}, {"_id": 0})
+    if not doc:
         raise HTTPException(status_code=404, detail="Nie znaleziono")
+    await rollups.record_delete(db, "expenses", doc)
     return {"status": "ok"}
 
 # ===== MONTHLY STATS =====
+async def _shared_stamp() -> tuple:
+    """Write counters of the stats collections shared by all processes: the ones this request's ETag was built from.
+    Every route using it is in etags.READS, so a request pays for one cache_versions read, made by the middleware."""
+    stamp = request_stamp.get()
+    if stamp is None:
+        # called outside a tagged request (scripts, direct calls): read the counters here
+        stamp = await collection_versions.read()
+    return tuple(stamp.get(c, 0) for c in (ALL, *STATS))
+
 @api_router.get("/monthly-stats")
-async def get_monthly_stats(shop_id: int = Query(...), year: int = Query(...), month: int = Query(...)):
-    prefix = f"{year}-{month:02d}"
-    incomes = await db.incomes.find({"shop_id": shop_id, "date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
-    costs = await db.costs.find({"shop_id": shop_id, "date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
-    custom_columns = await db.custom_columns.find({}, {"_id": 0}).to_list(100)
-    app_s = await get_app_settings()
+async def get_monthly_stats(shop_id: int = Query(...), year: int = Query(...), month: int = Query(...), shape: str = Query("rows", pattern="^(rows|columnar)$")):
+    return ORJSONResponse(await stats_cache.get_or_compute(
+        ("monthly", shop_id, year, month, shape), lambda: _monthly_stats(shop_id, year, month, shape), await _shared_stamp()))
+
+async def _monthly_stats(shop_id: int, year: int, month: int, shape: str = "rows"):
+    # Pre-bucketed per day / per category in daily_rollups - at most ~31 x categories rows
+    rows, custom_columns, app_s = await fanout(
+        rollups.find(db, ["incomes", "costs"], dates.month_range(year, month), shop_id=shop_id),
+        get_custom_columns_list(), get_app_settings())
     split = max(app_s.get("profit_split", 2), 1)
 
-    days_in_month = calendar.monthrange(year, month)[1]
-    days = {}
-    for d in range(1, days_in_month + 1):
-        ds = f"{year}-{month:02d}-{d:02d}"
-        days[ds] = {
-            "date": ds, "income": 0, "netto": 0, "profit": 0, "profit_pp": 0,
-            "tiktok_ads": 0, "meta_ads": 0, "google_ads": 0, "ads_total": 0,
-            "zwroty": 0, "custom_costs": {}
-        }
-        for cc in custom_columns:
-            days[ds]["custom_costs"][cc["name"]] = 0
-
-    for inc in incomes:
-        if inc["date"] in days:
-            days[inc["date"]]["income"] += inc["amount"]
-    
-    for cost in costs:
-        dt = cost["date"]
-        if dt in days:
-            cat = cost.get("category", "inne")
-            amt = cost.get("amount", 0)
-            if cat == "tiktok":
-                days[dt]["tiktok_ads"] += amt
-            elif cat == "meta":
-                days[dt]["meta_ads"] += amt
-            elif cat == "google":
-                days[dt]["google_ads"] += amt
-            elif cat == "zwroty":
-                days[dt]["zwroty"] += amt
-            else:
-                if cat in days[dt]["custom_costs"]:
-                    days[dt]["custom_costs"][cat] += amt
-
-    total_income = 0
-    total_tiktok = 0
-    total_meta = 0
-    total_google = 0
-    total_zwroty = 0
-    total_custom = {cc["name"]: 0 for cc in custom_columns}
-    
-    for day in days.values():
-        day["netto"] = round(day["income"] * 0.77, 2)
-        day["ads_total"] = round(day["tiktok_ads"] + day["meta_ads"] + day["google_ads"], 2)
-        total_day_costs = day["ads_total"] + day["zwroty"]
-        for cc in custom_columns:
-            if cc["column_type"] == "expense":
-                total_day_costs += day["custom_costs"].get(cc["name"], 0)
-        day["profit"] = round(day["netto"] - total_day_costs, 2)
-        day["profit_pp"] = round(day["profit"] / split, 2)
-        
-        total_income += day["income"]
-        total_tiktok += day["tiktok_ads"]
-        total_meta += day["meta_ads"]
-        total_google += day["google_ads"]
-        total_zwroty += day["zwroty"]
-        for cc in custom_columns:
-            total_custom[cc["name"]] = total_custom.get(cc["name"], 0) + day["custom_costs"].get(cc["name"], 0)
-
-    total_netto = round(total_income * 0.77, 2)
-    total_ads = round(total_tiktok + total_meta + total_google, 2)
-    total_all_costs = total_ads + total_zwroty
-    for cc in custom_columns:
-        if cc["column_type"] == "expense":
-            total_all_costs += total_custom.get(cc["name"], 0)
-    total_profit = round(total_netto - total_all_costs, 2)
-    roi = round((total_profit / total_all_costs * 100), 2) if total_all_costs > 0 else 0
-
+    cube = stats_engine.MonthCube(year, month, [shop_id], custom_columns, rows)
     return {
         "shop_id": shop_id, "year": year, "month": month,
-        "total_income": round(total_income, 2),
-        "total_ads": total_ads,
-        "total_tiktok": round(total_tiktok, 2),
-        "total_meta": round(total_meta, 2),
-        "total_google": round(total_google, 2),
-        "total_zwroty": round(total_zwroty, 2),
-        "total_custom": total_custom,
-        "total_netto": total_netto,
-        "total_profit": total_profit,
-        "profit_per_person": round(total_profit / split, 2),
-        "roi": roi,
+        **cube.totals(split),
         "custom_columns": custom_columns,
-        "days": sorted(days.values(), key=lambda x: x["date"])
+        "days": cube.day_columns(split) if shape == "columnar" else cube.day_rows(split),
     }
 
 # ===== COMBINED MONTHLY STATS =====
 @api_router.get("/combined-monthly-stats")
-async def get_combined_monthly_stats(year: int = Query(...), month: int = Query(...)):
-    prefix = f"{year}-{month:02d}"
-    incomes = await db.incomes.find({"date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
-    costs = await db.costs.find({"date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
-    custom_columns = await db.custom_columns.find({}, {"_id": 0}).to_list(100)
-    shops = await get_shops_list()
-    shop_ids = [s["id"] for s in shops]
-    app_s = await get_app_settings()
-
-    days_in_month = calendar.monthrange(year, month)[1]
-    days = {}
-    for d in range(1, days_in_month + 1):
-        ds = f"{year}-{month:02d}-{d:02d}"
-        days[ds] = {
-            "date": ds, "income": 0,
-            "tiktok_ads": 0, "meta_ads": 0, "google_ads": 0, "ads_total": 0,
-            "zwroty": 0, "custom_costs": {cc["name"]: 0 for cc in custom_columns},
-            "shops": [{
-                "shop_id": i, "income": 0,
-                "tiktok_ads": 0, "meta_ads": 0, "google_ads": 0, "ads_total": 0,
-                "zwroty": 0, "custom_costs": {cc["name"]: 0 for cc in custom_columns}
-            } for i in shop_ids]
-        }
-
-    for inc in incomes:
-        dt = inc["date"]
-        if dt in days:
-            days[dt]["income"] += inc["amount"]
-            sid = inc.get("shop_id", 1)
-            for s in days[dt]["shops"]:
-                if s["shop_id"] == sid:
-                    s["income"] += inc["amount"]
-
-    for cost in costs:
-        dt = cost["date"]
-        if dt in days:
-            cat = cost.get("category", "inne")
-            amt = cost.get("amount", 0)
-            sid = cost.get("shop_id", 1)
-            
-            if cat == "tiktok":
-                days[dt]["tiktok_ads"] += amt
-            elif cat == "meta":
-                days[dt]["meta_ads"] += amt
-            elif cat == "google":
-                days[dt]["google_ads"] += amt
-            elif cat == "zwroty":
-                days[dt]["zwroty"] += amt
-            elif cat in days[dt]["custom_costs"]:
-                days[dt]["custom_costs"][cat] += amt
-            
-            for s in days[dt]["shops"]:
-                if s["shop_id"] == sid:
-                    if cat == "tiktok":
-                        s["tiktok_ads"] += amt
-                    elif cat == "meta":
-                        s["meta_ads"] += amt
-                    elif cat == "google":
-                        s["google_ads"] += amt
-                    elif cat == "zwroty":
-                        s["zwroty"] += amt
-                    elif cat in s["custom_costs"]:
-                        s["custom_costs"][cat] += amt
-
-    total_income = 0
-    total_tiktok = 0
-    total_meta = 0
-    total_google = 0
-    total_zwroty = 0
-    total_custom = {cc["name"]: 0 for cc in custom_columns}
+async def get_combined_monthly_stats(year: int = Query(...), month: int = Query(...), shape: str = Query("rows", pattern="^(rows|columnar)$")):
+    now = datetime.now(timezone.utc)
+    # streak / forecast of the running month move with the calendar day
+    today = now.date().isoformat() if (year, month) == (now.year, now.month) else None
+    key = ("combined", None, year, month, today, shape)
+    shared = await _shared_stamp()
+    # the data stamp is part of the flight key: a request made after a write never joins a computation started before it
+    return ORJSONResponse(await inflight.do(
+        ("combined-monthly-stats", year, month, today, shape, stats_cache.stamp(None, year, month), shared),
+        lambda: stats_cache.get_or_compute(key, lambda: _combined_monthly_stats(year, month, now, shape), shared)))
+
+async def _combined_monthly_stats(year: int, month: int, now: datetime, shape: str = "rows"):
+    rows, custom_columns, shops, app_s = await fanout(
+        rollups.find(db, ["incomes", "costs"], dates.month_range(year, month)),
+        get_custom_columns_list(), get_shops_list(), get_app_settings())
     split = max(app_s.get("profit_split", 2), 1)
-    
-    for day in days.values():
-        day["netto"] = round(day["income"] * 0.77, 2)
-        day["ads_total"] = round(day["tiktok_ads"] + day["meta_ads"] + day["google_ads"], 2)
-        total_day_costs = day["ads_total"] + day["zwroty"]
-        for cc in custom_columns:
-            if cc["column_type"] == "expense":
-                total_day_costs += day["custom_costs"].get(cc["name"], 0)
-        day["profit"] = round(day["netto"] - total_day_costs, 2)
-        day["profit_pp"] = round(day["profit"] / split, 2)
-        
-        for s in day["shops"]:
-            s["netto"] = round(s["income"] * 0.77, 2)
-            s["ads_total"] = round(s["tiktok_ads"] + s["meta_ads"] + s["google_ads"], 2)
-            s_costs = s["ads_total"] + s["zwroty"]
-            for cc in custom_columns:
-                if cc["column_type"] == "expense":
-                    s_costs += s["custom_costs"].get(cc["name"], 0)
-            s["profit"] = round(s["netto"] - s_costs, 2)
-            s["profit_pp"] = round(s["profit"] / split, 2)
-        
-        total_income += day["income"]
-        total_tiktok += day["tiktok_ads"]
-        total_meta += day["meta_ads"]
-        total_google += day["google_ads"]
-        total_zwroty += day["zwroty"]
-        for cc in custom_columns:
-            total_custom[cc["name"]] = total_custom.get(cc["name"], 0) + day["custom_costs"].get(cc["name"], 0)
-
-    total_netto = round(total_income * 0.77, 2)
-    total_ads = round(total_tiktok + total_meta + total_google, 2)
-    total_all_costs = total_ads + total_zwroty
-    for cc in custom_columns:
-        if cc["column_type"] == "expense":
-            total_all_costs += total_custom.get(cc["name"], 0)
-    total_profit = round(total_netto - total_all_costs, 2)
-    roi = round((total_profit / total_all_costs * 100), 2) if total_all_costs > 0 else 0
-
-    now_utc = datetime.now(timezone.utc)
-    today_num = now_utc.day if (year == now_utc.year and month == now_utc.month) else days_in_month
-
-    streak = 0
-    for d in range(today_num, 0, -1):
-        ds = f"{year}-{month:02d}-{d:02d}"
-        if ds in days and days[ds]["profit"] > 0:
-            streak += 1
-        elif ds in days and (days[ds]["income"] > 0 or days[ds]["ads_total"] > 0):
-            break
-        else:
-            break
-
-    active = [d for d in days.values() if d["income"] > 0]
-    best = max(active, key=lambda x: x["profit"])["date"] if active else None
-    forecast = round((total_income / today_num) * days_in_month, 2) if total_income > 0 and today_num > 0 else 0
 
+    cube = stats_engine.MonthCube(year, month, [s["id"] for s in shops], custom_columns, rows)
+    total_income = cube.total_income
     target = app_s.get("target_revenue", 250000)
 
     return {
         "year": year, "month": month,
-        "total_income": round(total_income, 2), "total_ads": total_ads,
-        "total_tiktok": round(total_tiktok, 2),
-        "total_meta": round(total_meta, 2),
-        "total_google": round(total_google, 2),
-        "total_zwroty": round(total_zwroty, 2),
-        "total_custom": total_custom,
-        "total_netto": total_netto, "total_profit": total_profit,
-        "profit_per_person": round(total_profit / split, 2), "roi": roi,
+        **cube.totals(split),
         "target": target, "progress": round(min(total_income / max(target, 1) * 100, 100), 2) if total_income > 0 else 0,
-        "streak": streak, "best_day": best, "forecast": forecast,
+        **cube.kpis(split, now),
         "custom_columns": custom_columns,
-        "days": sorted(days.values(), key=lambda x: x["date"]),
+        "days": cube.day_columns(split, per_shop=True) if shape == "columnar" else cube.day_rows(split, per_shop=True),
         "settings": {"target_revenue": target, "profit_split": split, "vat_rate": app_s.get("vat_rate", 23)}
     }
 
+# ===== RANGE STATS =====
+# Longest range (in days) one request may ask for
+RANGE_STATS_MAX_DAYS = int(os.environ.get("RANGE_STATS_MAX_DAYS", "1830"))
+
+def _range_periods(start, end, group_by: str) -> list:
+    periods = []
+    d = start
+    while d <= end:
+        if group_by == "day":
+            key = d.isoformat()
+        elif group_by == "week":
+            iso = d.isocalendar()
+            key = f"{iso[0]}-W{iso[1]:02d}"
+        else:
+            key = d.strftime("%Y-%m")
+        if not periods or periods[-1] != key:
+            periods.append(key)
+        d += timedelta(days=1)
+    return periods
+
+@api_router.get("/range-stats")
+async def get_range_stats(from_date: str = Query(..., alias="from"), to_date: str = Query(..., alias="to"), group_by: str = "month", shop_id: Optional[int] = None):
+    if group_by not in rollups.PERIODS:
+        raise HTTPException(status_code=400, detail="group_by: day, week lub month")
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidlowa data (YYYY-MM-DD)")
+    if end < start:
+        raise HTTPException(status_code=400, detail="Data 'from' jest po dacie 'to'")
+    if (end - start).days + 1 > RANGE_STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Zakres dluzszy niz {RANGE_STATS_MAX_DAYS} dni")
+    # canonical dates: strptime also accepts "2025-1-5", which would not compare with the stored YYYY-MM-DD
+    from_date, to_date = start.isoformat(), end.isoformat()
+    sid = shop_id if shop_id and shop_id > 0 else None
+    rows, custom_columns, app_s = await fanout(
+        rollups.sum_by_period(db, ["incomes", "costs"], dates.day_range(from_date, to_date), group_by, shop_id=sid),
+        get_custom_columns_list(), get_app_settings())
+    split = max(app_s.get("profit_split", 2), 1)
+    return ORJSONResponse({
+        "from": from_date, "to": to_date, "group_by": group_by, "shop_id": sid,
+        "custom_columns": custom_columns,
+        **stats_engine.period_series(_range_periods(start, end, group_by), custom_columns, rows, split),
+    })
+
 # ===== TASKS =====
 @api_router.get("/tasks")
 async def get_tasks():
@@ -545,9 +485,14 @@ async def delete_task(task_id: str):
 
 # ===== IDEAS =====
 @api_router.get("/ideas")
-async def get_ideas():
-    ideas = await db.ideas.find({}, {"_id": 0}).sort("created_at", -1).to_list(500)
-    return ideas
+async def get_ideas(limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
+    sort = [("created_at", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.ideas, {}, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.ideas, {}, sort, limit, cursor))
+    ideas = await db.ideas.find({}, {"_id": 0}).sort(sort).to_list(500)
+    return ORJSONResponse(ideas)
 
 @api_router.post("/ideas")
 async def create_idea(idea: IdeaCreate):
@@ -591,10 +536,13 @@ async def get_shopify_configs():
 async def save_shopify_config(config: ShopifyConfigCreate):
     existing = await db.shopify_configs.find_one({"shop_id": config.shop_id})
     if existing:
-        await db.shopify_configs.update_one(
-            {"shop_id": config.shop_id},
-            {"$set": {"store_url": config.store_url, "api_token": config.api_token, "is_active": True}}
-        )
+        update = {"store_url": config.store_url, "api_token": config.api_token, "is_active": True}
+        if config.sync_interval_minutes is not None:
+            update["sync_interval_minutes"] = config.sync_interval_minutes
+        if existing.get("store_url") != config.store_url:
+            # another store: its months have to be reconciled from scratch
+            update.update({"sync_watermark": None, "synced_months": []})
+        await db.shopify_configs.update_one({"shop_id": config.shop_id}, {"$set": update})
         return await db.shopify_configs.find_one({"shop_id": config.shop_id}, {"_id": 0})
     doc = {
         "id": str(uuid.uuid4()),
@@ -602,6 +550,7 @@ async def save_shopify_config(config: ShopifyConfigCreate):
         "store_url": config.store_url,
         "api_token": config.api_token,
         "is_active": True,
+        "sync_interval_minutes": config.sync_interval_minutes if config.sync_interval_minutes is not None else SYNC_INTERVAL_MINUTES,
         "last_sync": None,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -614,6 +563,7 @@ async def delete_shopify_config(shop_id: int):
     result = await db.shopify_configs.delete_one({"shop_id": shop_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Nie znaleziono")
+    await db.shopify_order_totals.delete_many({"shop_id": shop_id})
     return {"status": "ok"}
 
 # ===== TIKTOK CONFIGS =====
@@ -630,6 +580,7 @@ async def create_tiktok_config(config: TikTokConfigCreate):
         "access_token": config.access_token,
         "linked_shop_ids": config.linked_shop_ids,
         "is_active": True,
+        "sync_interval_minutes": config.sync_interval_minutes if config.sync_interval_minutes is not None else SYNC_INTERVAL_MINUTES,
         "last_sync": None,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -653,103 +604,246 @@ async def delete_tiktok_config(config_id: str):
     return {"status": "ok"}
 
 # ===== SYNC HELPERS =====
-async def _sync_shopify(shop_id: int, year: int, month: int):
+# Remote fetch of one connector; the database writes that follow it are never cut off
+SYNC_CONNECTOR_TIMEOUT = float(os.environ.get("SYNC_CONNECTOR_TIMEOUT", "60"))
+# Connectors synced at the same time by sync/all
+SYNC_CONCURRENCY = int(os.environ.get("SYNC_CONCURRENCY", "4"))
+
+# Collections a connector's sync writes; syncs run outside the request (jobs, scheduler), so they bump these themselves
+SYNC_WRITES = {
+    "shopify": ("incomes", "daily_rollups", "shopify_configs"),
+    "tiktok": ("expenses", "daily_rollups", "tiktok_configs"),
+    "shopify_orders": ("orders", "fulfillment", "sales_records"),
+}
+
+async def _sync_shopify(shop_id: int, year: int, month: int, mode: str = "incremental", progress=None):
     config = await db.shopify_configs.find_one({"shop_id": shop_id, "is_active": True}, {"_id": 0})
     if not config:
         raise HTTPException(status_code=404, detail="Brak konfiguracji Shopify")
-    store_url = config["store_url"]
-    api_token = config["api_token"]
-    days_in_month = calendar.monthrange(year, month)[1]
-    start_date = f"{year}-{month:02d}-01T00:00:00Z"
-    end_date = f"{year}-{month:02d}-{days_in_month}T23:59:59Z"
+    # a month is reconciled in full once; afterwards only orders changed since the watermark are fetched
+    reconcile = mode == "full" or not config.get("sync_watermark") or f"{year}-{month:02d}" not in config.get("synced_months", [])
     try:
-        async with httpx.AsyncClient() as http:
-            resp = await http.get(
-                f"https://{store_url}/admin/api/2024-10/orders.json",
-                params={"status": "any", "created_at_min": start_date, "created_at_max": end_date, "limit": 250, "financial_status": "paid"},
-                headers={"X-Shopify-Access-Token": api_token},
-                timeout=30
-            )
-            if resp.status_code != 200:
-                return {"status": "error", "detail": f"Shopify HTTP {resp.status_code}"}
-            orders = resp.json().get("orders", [])
-            prefix = f"{year}-{month:02d}"
-            await db.incomes.delete_many({"shop_id": shop_id, "date": {"$regex": f"^{prefix}"}, "description": {"$regex": "\\[Shopify\\]"}})
-            daily = {}
-            for o in orders:
-                d = o["created_at"][:10]
-                daily[d] = daily.get(d, 0) + float(o.get("total_price", 0))
-            for ds, total in daily.items():
-                doc = {"id": str(uuid.uuid4()), "amount": round(total, 2), "date": ds, "description": "[Shopify] Auto-sync", "shop_id": shop_id, "created_at": datetime.now(timezone.utc).isoformat()}
-                await db.incomes.insert_one(doc)
-            await db.shopify_configs.update_one({"shop_id": shop_id}, {"$set": {"last_sync": datetime.now(timezone.utc).isoformat()}})
-            return {"status": "ok", "orders": len(orders), "days": len(daily)}
+        if reconcile:
+            r = await shopify_sync.full(db, outbound, config, year, month, SYNC_CONNECTOR_TIMEOUT, progress)
+        else:
+            r = await shopify_sync.incremental(db, outbound, config, SYNC_CONNECTOR_TIMEOUT, progress)
+        for ym in r["months"]:
+            stats_cache.touch(shop_id, ym)
+        return {"status": "ok", **r}
+    except asyncio.TimeoutError:
+        return {"status": "error", "detail": f"Shopify: brak odpowiedzi po {SYNC_CONNECTOR_TIMEOUT:g}s"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
-async def _sync_tiktok(config_id: str, year: int, month: int):
+async def _sync_tiktok(config_id: str, year: int, month: int, progress=None):
     config = await db.tiktok_configs.find_one({"id": config_id, "is_active": True}, {"_id": 0})
     if not config:
         raise HTTPException(status_code=404, detail="Brak konfiguracji TikTok")
     days_in_month = calendar.monthrange(year, month)[1]
     try:
-        async with httpx.AsyncClient() as http:
-            resp = await http.get(
-                "https://business-api.tiktok.com/open_api/v1.3/report/integrated/get/",
-                headers={"Access-Token": config["access_token"]},
-                params={
-                    "advertiser_id": config["advertiser_id"],
-                    "report_type": "BASIC", "data_level": "AUCTION_ADVERTISER",
-                    "dimensions": '["stat_time_day"]', "metrics": '["spend"]',
-                    "start_date": f"{year}-{month:02d}-01",
-                    "end_date": f"{year}-{month:02d}-{days_in_month:02d}",
-                    "page": 1, "page_size": 31
-                },
-                timeout=30
-            )
-            if resp.status_code != 200:
-                return {"status": "error", "detail": f"TikTok HTTP {resp.status_code}"}
-            data = resp.json()
-            if data.get("code") != 0:
-                return {"status": "error", "detail": data.get("message", "Unknown")}
-            rows = data.get("data", {}).get("list", [])
-            linked = config.get("linked_shop_ids", [])
-            prefix = f"{year}-{month:02d}"
-            for sid in linked:
-                await db.expenses.delete_many({"shop_id": sid, "date": {"$regex": f"^{prefix}"}, "campaign_name": {"$regex": f"\\[TikTok:{config['name']}\\]"}})
-            count = 0
-            for row in rows:
-                ds = row.get("dimensions", {}).get("stat_time_day", "")[:10]
-                spend = float(row.get("metrics", {}).get("spend", 0))
-                if spend > 0 and linked:
-                    per_shop = round(spend / len(linked), 2)
-                    for sid in linked:
-                        doc = {"id": str(uuid.uuid4()), "amount": per_shop, "date": ds, "campaign_name": f"[TikTok:{config['name']}] Auto-sync", "shop_id": sid, "created_at": datetime.now(timezone.utc).isoformat()}
-                        await db.expenses.insert_one(doc)
-                        count += 1
-            await db.tiktok_configs.update_one({"id": config_id}, {"$set": {"last_sync": datetime.now(timezone.utc).isoformat()}})
-            return {"status": "ok", "rows": len(rows), "entries": count}
+        resp = await asyncio.wait_for(outbound.get(
+            "https://business-api.tiktok.com/open_api/v1.3/report/integrated/get/",
+            headers={"Access-Token": config["access_token"]},
+            params={
+                "advertiser_id": config["advertiser_id"],
+                "report_type": "BASIC", "data_level": "AUCTION_ADVERTISER",
+                "dimensions": '["stat_time_day"]', "metrics": '["spend"]',
+                "start_date": f"{year}-{month:02d}-01",
+                "end_date": f"{year}-{month:02d}-{days_in_month:02d}",
+                "page": 1, "page_size": 31
+            },
+            timeout=30
+        ), SYNC_CONNECTOR_TIMEOUT)
+        if resp.status_code != 200:
+            return {"status": "error", "detail": f"TikTok HTTP {resp.status_code}"}
+        data = resp.json()
+        if data.get("code") != 0:
+            return {"status": "error", "detail": data.get("message", "Unknown")}
+        rows = data.get("data", {}).get("list", [])
+        if progress:
+            progress.page(len(rows))
+        linked = config.get("linked_shop_ids", [])
+        written = []
+        for row in rows:
+            ds = row.get("dimensions", {}).get("stat_time_day", "")[:10]
+            spend = float(row.get("metrics", {}).get("spend", 0))
+            if spend > 0 and linked:
+                per_shop = round(spend / len(linked), 2)
+                for sid in linked:
+                    written.append({"shop_id": sid, "date": ds, "amount": per_shop, "campaign_name": f"[TikTok:{config['name']}] Auto-sync"})
+        await sync_writer.replace_month(
+            db, "expenses", f"tiktok:{config_id}", dates.month_range(year, month), written,
+            legacy={"shop_id": {"$in": linked}, "campaign_name": {"$regex": f"\\[TikTok:{config['name']}\\]"}})
+        count = len(written)
+        if progress:
+            progress.rows(count)
+        await db.tiktok_configs.update_one({"id": config_id}, {"$set": {"last_sync": datetime.now(timezone.utc).isoformat()}})
+        return {"status": "ok", "rows": len(rows), "entries": count}
+    except asyncio.TimeoutError:
+        return {"status": "error", "detail": f"TikTok: brak odpowiedzi po {SYNC_CONNECTOR_TIMEOUT:g}s"}
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+
+async def _import_shopify_orders(shop_id: int, year: int, month: int, progress=None):
+    config = await db.shopify_configs.find_one({"shop_id": shop_id, "is_active": True}, {"_id": 0})
+    if not config:
+        raise HTTPException(status_code=404, detail="Brak konfiguracji Shopify")
+    try:
+        # the timeout bounds each page's fetch, not the month; pages written before a timeout stay and a re-run is idempotent
+        r = await shopify_orders.import_month(db, outbound, config, year, month, SYNC_CONNECTOR_TIMEOUT, progress)
+        return {"status": "ok", **r}
+    except asyncio.TimeoutError:
+        return {"status": "error", "detail": f"Shopify: brak odpowiedzi po {SYNC_CONNECTOR_TIMEOUT:g}s"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
-@api_router.post("/sync/shopify/{shop_id}")
-async def sync_shopify(shop_id: int, year: int = Query(...), month: int = Query(...)):
-    return await _sync_shopify(shop_id, year, month)
+SYNCS = {"shopify": _sync_shopify, "tiktok": _sync_tiktok, "shopify_orders": _import_shopify_orders}
+# Kinds the scheduler runs; a manual sync of one takes its lease (sync_jobs.locked_until)
+SCHEDULED = ("shopify", "tiktok")
 
-@api_router.post("/sync/tiktok/{config_id}")
+async def _run_connector(kind: str, ref, year: int, month: int, progress=None, **options):
+    """options: extra arguments of the connector's sync (mode, for Shopify)."""
+    sync = SYNCS[kind]
+    try:
+        return await sync(ref, year, month, progress=progress, **options)
+    finally:
+        await collection_versions.bump(SYNC_WRITES[kind])
+
+async def _start_sync_job(kind: str, params: dict, connectors: list):
+    """connectors: [(kind, ref)]. Returns the job at once; a double-clicked sync gets the job already running.
+
+    A scheduled connector syncs under the scheduler's lease. When a sync already holds it, a single-connector
+    request gets that sync's job, or 409 if the scheduler runs it; sync/all reports the connector as busy."""
+    keys = [f"{k}:{ref}" for k, ref in connectors]
+    owner = f"{sync_scheduler.owner}:{uuid.uuid4()}"
+    leased, busy = [], set()
+    for key in keys:
+        if key.split(":", 1)[0] in SCHEDULED:
+            taken = await sync_scheduler.acquire(key, owner)
+            if taken:
+                leased.append(key)
+            elif taken is False:
+                busy.add(key)
+    try:
+        if busy and len(keys) == 1:
+            running = await sync_jobs.running_with(keys[0])
+            if running is None:
+                raise HTTPException(status_code=409, detail="Synchronizacja w toku")
+            return ORJSONResponse(running, status_code=202)
+        job, created = await sync_jobs.create(kind, params, keys, dedupe_key=(kind, tuple(sorted(params.items())), tuple(keys)))
+    except BaseException:
+        await asyncio.gather(*(sync_scheduler.release(key, owner) for key in leased))
+        raise
+    if created:
+        sync_jobs.start(job, lambda job: _run_sync_job(job, connectors, busy, owner))
+    else:
+        await asyncio.gather(*(sync_scheduler.release(key, owner) for key in leased))
+    return ORJSONResponse(snapshot(job), status_code=202)
+
+async def _run_sync_job(job: dict, connectors: list, busy: set = frozenset(), owner: str = None):
+    p = job["params"]
+    sem = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def busy_sync(progress):
+        return {"status": "error", "detail": "Synchronizacja w toku"}
+
+    async def run(kind, ref):
+        # each connector reports its own failure; one store never fails or holds up the others
+        key = f"{kind}:{ref}"
+        if key in busy:
+            return await sync_jobs.run_connector(job, key, busy_sync)
+        options = {"mode": p["mode"]} if kind == "shopify" and "mode" in p else {}
+        try:
+            async with sem:
+                return await sync_jobs.run_connector(
+                    job, key, lambda progress: _run_connector(kind, ref, p["year"], p["month"], progress, **options))
+        finally:
+            if kind in SCHEDULED:
+                await sync_scheduler.release(key, owner)
+
+    done = await asyncio.gather(*(run(kind, ref) for kind, ref in connectors))
+    if job["kind"] != "all":
+        return done[0]
+    return {
+        "shopify": [{"shop_id": ref, **r} for (kind, ref), r in zip(connectors, done) if kind == "shopify"],
+        "tiktok": [{"config_id": ref, **r} for (kind, ref), r in zip(connectors, done) if kind == "tiktok"],
+    }
+
+@api_router.post("/sync/shopify/{shop_id}", status_code=202)
+async def sync_shopify(shop_id: int, year: int = Query(...), month: int = Query(...), mode: str = Query("incremental", pattern="^(incremental|full)$")):
+    if not await db.shopify_configs.find_one({"shop_id": shop_id, "is_active": True}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Brak konfiguracji Shopify")
+    return await _start_sync_job("shopify", {"year": year, "month": month, "mode": mode}, [("shopify", shop_id)])
+
+@api_router.post("/sync/shopify/{shop_id}/orders", status_code=202)
+async def import_shopify_orders(shop_id: int, year: int = Query(...), month: int = Query(...)):
+    if not await db.shopify_configs.find_one({"shop_id": shop_id, "is_active": True}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Brak konfiguracji Shopify")
+    return await _start_sync_job("shopify_orders", {"year": year, "month": month}, [("shopify_orders", shop_id)])
+
+@api_router.post("/sync/tiktok/{config_id}", status_code=202)
 async def sync_tiktok(config_id: str, year: int = Query(...), month: int = Query(...)):
-    return await _sync_tiktok(config_id, year, month)
+    if not await db.tiktok_configs.find_one({"id": config_id, "is_active": True}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Brak konfiguracji TikTok")
+    return await _start_sync_job("tiktok", {"year": year, "month": month}, [("tiktok", config_id)])
 
-@api_router.post("/sync/all")
+@api_router.post("/sync/all", status_code=202)
 async def sync_all(year: int = Query(...), month: int = Query(...)):
-    results = {"shopify": [], "tiktok": []}
-    for sc in await db.shopify_configs.find({"is_active": True}, {"_id": 0}).to_list(100):
-        r = await _sync_shopify(sc["shop_id"], year, month)
-        results["shopify"].append({"shop_id": sc["shop_id"], **r})
-    for tc in await db.tiktok_configs.find({"is_active": True}, {"_id": 0}).to_list(100):
-        r = await _sync_tiktok(tc["id"], year, month)
-        results["tiktok"].append({"config_id": tc["id"], **r})
-    return results
+    shopify_cfgs, tiktok_cfgs = await fanout(
+        db.shopify_configs.find({"is_active": True}, {"_id": 0, "shop_id": 1}).to_list(100),
+        db.tiktok_configs.find({"is_active": True}, {"_id": 0, "id": 1}).to_list(100))
+    connectors = [("shopify", c["shop_id"]) for c in shopify_cfgs] + [("tiktok", c["id"]) for c in tiktok_cfgs]
+    return await _start_sync_job("all", {"year": year, "month": month}, connectors)
+
+@api_router.get("/sync/jobs/{job_id}")
+async def get_sync_job(job_id: str):
+    job = await sync_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Nie znaleziono")
+    return job
+
+@api_router.get("/sync/jobs/{job_id}/events")
+async def sync_job_events(job_id: str):
+    if not await sync_jobs.get(job_id):
+        raise HTTPException(status_code=404, detail="Nie znaleziono")
+
+    async def stream():
+        async for job in sync_jobs.events(job_id):
+            if job is None:
+                yield b": ping\n\n"  # keeps proxies from closing an idle stream
+            else:
+                yield b"event: " + (b"done" if job["status"] == "done" else b"progress") + b"\ndata: " + fastjson.dumps(job) + b"\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ===== SYNC SCHEDULER =====
+# Minutes between background syncs of a connector without its own sync_interval_minutes (0: manual only)
+SYNC_INTERVAL_MINUTES = int(os.environ.get("SYNC_INTERVAL_MINUTES", "60"))
+
+async def _scheduled_jobs():
+    shopify_cfgs, tiktok_cfgs = await fanout(
+        db.shopify_configs.find({"is_active": True}, {"_id": 0, "shop_id": 1, "sync_interval_minutes": 1}).to_list(100),
+        db.tiktok_configs.find({"is_active": True}, {"_id": 0, "id": 1, "sync_interval_minutes": 1}).to_list(100))
+    return [
+        {"id": f"shopify:{c['shop_id']}", "kind": "shopify", "ref": c["shop_id"], "interval_minutes": c.get("sync_interval_minutes", SYNC_INTERVAL_MINUTES)}
+        for c in shopify_cfgs
+    ] + [
+        {"id": f"tiktok:{c['id']}", "kind": "tiktok", "ref": c["id"], "interval_minutes": c.get("sync_interval_minutes", SYNC_INTERVAL_MINUTES)}
+        for c in tiktok_cfgs
+    ]
+
+async def _run_scheduled_sync(kind: str, ref):
+    # the running month; Shopify's incremental run also keeps earlier reconciled months current
+    now = datetime.now(timezone.utc)
+    return await _run_connector(kind, ref, now.year, now.month)
+
+sync_scheduler = SyncScheduler(
+    db, _scheduled_jobs, _run_scheduled_sync,
+    tick=float(os.environ.get("SYNC_SCHEDULER_TICK", "30")), concurrency=SYNC_CONCURRENCY)
+
+@api_router.get("/sync/schedule")
+async def get_sync_schedule():
+    return await db.sync_jobs.find({}, {"_id": 0, "last_result": 0}).sort("id", 1).to_list(200)
 
 # ===== AI CHAT =====
 @api_router.post("/chat")
@@ -812,15 +906,16 @@ async def execute_action(action_str: str):
         
         elif action == "get_stats" and len(parts) >= 3:
             year, month = int(parts[1]), int(parts[2])
-            prefix = f"{year}-{month:02d}"
-            incomes = await db.incomes.find({"date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
-            expenses = await db.expenses.find({"date": {"$regex": f"^{prefix}"}}, {"_id": 0}).to_list(10000)
+            month_q = dates.month_range(year, month)
+            incomes, expenses = await fanout(
+                db.incomes.find({"date": month_q}, {"_id": 0}).to_list(10000),
+                db.expenses.find({"date": month_q}, {"_id": 0}).to_list(10000))
             ti = sum(i["amount"] for i in incomes)
             te = sum(e["amount"] for e in expenses)
             return {"action": "get_stats", "success": True, "data": {"income": ti, "expenses": te, "netto": round(ti * 0.77, 2), "profit": round(ti * 0.77 - te, 2)}, "message": f"Statystyki {month}/{year}"}
         
         elif action == "get_shops":
-            shops = await db.shops.find({}, {"_id": 0}).to_list(20)
+            shops = await get_shops_list()
             return {"action": "get_shops", "success": True, "data": shops, "message": f"Znaleziono {len(shops)} sklepow"}
         
         elif action == "get_reminders":
@@ -1004,11 +1099,16 @@ class OrderCreate(BaseModel):
     status: str = "new"
 
 @api_router.get("/orders")
-async def get_orders(shop_id: Optional[int] = None, year: Optional[int] = None, month: Optional[int] = None):
+async def get_orders(shop_id: Optional[int] = None, year: Optional[int] = None, month: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    if year and month: q["date"] = {"$regex": f"^{year}-{month:02d}"}
-    return await db.orders.find(q, {"_id": 0}).sort("date", -1).to_list(10000)
+    if year and month: q["date"] = dates.month_range(year, month)
+    sort = [("date", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.orders, q, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.orders, q, sort, limit, cursor))
+    return ORJSONResponse(await db.orders.find(q, {"_id": 0}).sort(sort).to_list(10000))
 
 @api_router.post("/orders")
 async def create_order(order: OrderCreate):
@@ -1115,11 +1215,16 @@ class ReturnCreate(BaseModel):
     refund_amount: Optional[float] = None
 
 @api_router.get("/returns")
-async def get_returns(year: Optional[int] = None, month: Optional[int] = None, shop_id: Optional[int] = None):
+async def get_returns(year: Optional[int] = None, month: Optional[int] = None, shop_id: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
-    if year and month: q["date"] = {"$regex": f"^{year}-{month:02d}"}
+    if year and month: q["date"] = dates.month_range(year, month)
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    return await db.returns.find(q, {"_id": 0}).sort("date", -1).to_list(10000)
+    sort = [("date", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.returns, q, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.returns, q, sort, limit, cursor))
+    return ORJSONResponse(await db.returns.find(q, {"_id": 0}).sort(sort).to_list(10000))
 
 @api_router.post("/returns")
 async def create_return(r: ReturnCreate):
@@ -1170,22 +1275,31 @@ class FulfillmentUpdate(BaseModel):
     tracking_number: Optional[str] = None
 
 @api_router.get("/fulfillment")
-async def get_fulfillment(source_month: Optional[str] = None, status: Optional[str] = None):
+async def get_fulfillment(source_month: Optional[str] = None, status: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
     if source_month: q["source_month"] = source_month
     if status: q["status"] = status
-    items = await db.fulfillment.find(q, {"_id": 0}).sort("created_at", -1).to_list(10000)
-    now = datetime.now(timezone.utc)
-    for item in items:
-        if item["status"] == "reminder_sent" and item.get("reminder_sent_at"):
-            sent_at = datetime.fromisoformat(item["reminder_sent_at"].replace("Z", "+00:00")) if isinstance(item["reminder_sent_at"], str) else item["reminder_sent_at"]
-            if (now - sent_at).days >= 7:
-                item["auto_check_ready"] = True
-            else:
-                days_left = 7 - (now - sent_at).days
-                item["auto_check_ready"] = False
-                item["days_until_check"] = max(days_left, 0)
-    return items
+    sort = [("created_at", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.fulfillment, q, sort, transform=_mark_check_ready)
+    if limit or cursor:
+        page = await pagination.paginate(db.fulfillment, q, sort, limit, cursor)
+        page["items"] = [_mark_check_ready(item) for item in page["items"]]
+        return ORJSONResponse(page)
+    items = await db.fulfillment.find(q, {"_id": 0}).sort(sort).to_list(10000)
+    return ORJSONResponse([_mark_check_ready(item) for item in items])
+
+def _mark_check_ready(item: dict) -> dict:
+    if item["status"] == "reminder_sent" and item.get("reminder_sent_at"):
+        now = datetime.now(timezone.utc)
+        sent_at = datetime.fromisoformat(item["reminder_sent_at"].replace("Z", "+00:00")) if isinstance(item["reminder_sent_at"], str) else item["reminder_sent_at"]
+        if (now - sent_at).days >= 7:
+            item["auto_check_ready"] = True
+        else:
+            days_left = 7 - (now - sent_at).days
+            item["auto_check_ready"] = False
+            item["days_until_check"] = max(days_left, 0)
+    return item
 
 @api_router.post("/fulfillment")
 async def create_fulfillment(f: FulfillmentCreate):
@@ -1338,13 +1452,18 @@ class CostUpdate(BaseModel):
     description: Optional[str] = None
 
 @api_router.get("/costs")
-async def get_costs(shop_id: Optional[int] = None, date: Optional[str] = None, year: Optional[int] = None, month: Optional[int] = None, category: Optional[str] = None):
+async def get_costs(shop_id: Optional[int] = None, date: Optional[str] = None, year: Optional[int] = None, month: Optional[int] = None, category: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
     if date: q["date"] = date
-    elif year and month: q["date"] = {"$regex": f"^{year}-{month:02d}"}
+    elif year and month: q["date"] = dates.month_range(year, month)
     if category: q["category"] = category
-    return await db.costs.find(q, {"_id": 0}).sort("date", -1).to_list(10000)
+    sort = [("date", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.costs, q, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.costs, q, sort, limit, cursor))
+    return ORJSONResponse(await db.costs.find(q, {"_id": 0}).sort(sort).to_list(10000))
 
 @api_router.post("/costs")
 async def create_cost(c: CostCreate):
@@ -1359,19 +1478,28 @@ async def create_cost(c: CostCreate):
     }
     await db.costs.insert_one(doc)
     doc.pop("_id", None)
+    await rollups.record_insert(db, "costs", doc)
+    stats_cache.touch(doc["shop_id"], doc["date"])
     return doc
 
 @api_router.put("/costs/{cost_id}")
 async def update_cost(cost_id: str, update: CostUpdate):
     upd = {k: v for k, v in update.dict().items() if v is not None}
-    if upd: await db.costs.update_one({"id": cost_id}, {"$set": upd})
+    if upd:
+        before = await db.costs.find_one_and_update({"id": cost_id}, {"$set": upd}, {"_id": 0})
+        if before and "amount" in upd:
+            await rollups.apply_delta(db, "costs", before, upd["amount"] - before.get("amount", 0), 0)
+            stats_cache.touch(before.get("shop_id", 1), before["date"])
     c = await db.costs.find_one({"id": cost_id}, {"_id": 0})
     if not c: raise HTTPException(status_code=404, detail="Nie znaleziono")
     return c
 
 @api_router.delete("/costs/{cost_id}")
 async def delete_cost(cost_id: str):
-    await db.costs.delete_one({"id": cost_id})
+    doc = await db.costs.find_one_and_delete({"id": cost_id}, {"_id": 0})
+    if doc:
+        await rollups.record_delete(db, "costs", doc)
+        stats_cache.touch(doc.get("shop_id", 1), doc["date"])
     return {"status": "ok"}
 
 # ===== CUSTOM COLUMNS =====
@@ -1387,7 +1515,7 @@ class CustomColumnUpdate(BaseModel):
 
 @api_router.get("/custom-columns")
 async def get_custom_columns():
-    return await db.custom_columns.find({}, {"_id": 0}).sort("created_at", 1).to_list(100)
+    return await get_custom_columns_list()
 
 @api_router.post("/custom-columns")
 async def create_custom_column(c: CustomColumnCreate):
@@ -1403,12 +1531,18 @@ async def create_custom_column(c: CustomColumnCreate):
     }
     await db.custom_columns.insert_one(doc)
     doc.pop("_id", None)
+    await ref_cache.bump("custom_columns")
     return doc
 
 @api_router.put("/custom-columns/{col_id}")
 async def update_custom_column(col_id: str, update: CustomColumnUpdate):
     upd = {k: v for k, v in update.dict().items() if v is not None}
-    if upd: await db.custom_columns.update_one({"id": col_id}, {"$set": upd})
+    if upd:
+        try:
+            await db.custom_columns.update_one({"id": col_id}, {"$set": upd})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Kolumna o tej nazwie juz istnieje")
+        await ref_cache.bump("custom_columns")
     c = await db.custom_columns.find_one({"id": col_id}, {"_id": 0})
     if not c: raise HTTPException(status_code=404, detail="Nie znaleziono")
     return c
@@ -1418,7 +1552,9 @@ async def delete_custom_column(col_id: str):
     col = await db.custom_columns.find_one({"id": col_id}, {"_id": 0})
     if col:
         await db.costs.delete_many({"category": col["name"]})
+        await rollups.drop_category(db, "costs", col["name"])
     await db.custom_columns.delete_one({"id": col_id})
+    await ref_cache.bump("custom_columns")
     return {"status": "ok"}
 
 # ===== PRODUCTS =====
@@ -1441,10 +1577,15 @@ class ProductUpdate(BaseModel):
     description: Optional[str] = None
 
 @api_router.get("/products")
-async def get_products(shop_id: Optional[int] = None):
+async def get_products(shop_id: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    return await db.products.find(q, {"_id": 0}).sort("name", 1).to_list(10000)
+    sort = [("name", 1), ("id", 1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.products, q, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.products, q, sort, limit, cursor))
+    return ORJSONResponse(await db.products.find(q, {"_id": 0}).sort(sort).to_list(10000))
 
 @api_router.post("/products")
 async def create_product(p: ProductCreate):
@@ -1511,7 +1652,7 @@ class NoteCreate(BaseModel):
 async def get_notes(date: Optional[str] = None, year: Optional[int] = None, month: Optional[int] = None, type: Optional[str] = None):
     q = {}
     if date: q["date"] = date
-    elif year and month: q["date"] = {"$regex": f"^{year}-{month:02d}"}
+    elif year and month: q["date"] = dates.month_range(year, month)
     if type: q["type"] = type
     return await db.notes.find(q, {"_id": 0}).to_list(1000)
 
@@ -1564,12 +1705,17 @@ class SalesRecordCreate(BaseModel):
     shop_id: int
 
 @api_router.get("/sales-records")
-async def get_sales_records(shop_id: Optional[int] = None, year: Optional[int] = None, month: Optional[int] = None, date: Optional[str] = None):
+async def get_sales_records(shop_id: Optional[int] = None, year: Optional[int] = None, month: Optional[int] = None, date: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT), cursor: Optional[str] = None, format: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
     q = {}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
     if date: q["date"] = date
-    elif year and month: q["date"] = {"$regex": f"^{year}-{month:02d}"}
-    return await db.sales_records.find(q, {"_id": 0}).sort("date", -1).to_list(10000)
+    elif year and month: q["date"] = dates.month_range(year, month)
+    sort = [("date", -1), ("id", -1)]
+    if format == "ndjson":
+        return streaming.ndjson(db.sales_records, q, sort)
+    if limit or cursor:
+        return ORJSONResponse(await pagination.paginate(db.sales_records, q, sort, limit, cursor))
+    return ORJSONResponse(await db.sales_records.find(q, {"_id": 0}).sort(sort).to_list(10000))
 
 @api_router.post("/sales-records")
 async def create_sales_record(r: SalesRecordCreate):
@@ -1600,11 +1746,12 @@ async def delete_sales_record(sid: str):
 
 @api_router.post("/sales-records/generate-from-orders")
 async def generate_sales_from_orders(year: int = Query(...), month: int = Query(...), shop_id: Optional[int] = None):
-    q = {"date": {"$regex": f"^{year}-{month:02d}"}}
+    q = {"date": dates.month_range(year, month)}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    orders = await db.orders.find(q, {"_id": 0}).to_list(10000)
+    orders, existing = await fanout(
+        db.orders.find(q, {"_id": 0}).to_list(10000),
+        db.sales_records.find({"order_id": {"$ne": None}, "date": dates.month_range(year, month)}, {"_id": 0, "order_id": 1}).to_list(10000))
     existing_order_ids = set()
-    existing = await db.sales_records.find({"order_id": {"$ne": None}, "date": {"$regex": f"^{year}-{month:02d}"}}, {"_id": 0, "order_id": 1}).to_list(10000)
     for e in existing:
         if e.get("order_id"): existing_order_ids.add(e["order_id"])
     generated = 0
@@ -1652,9 +1799,10 @@ async def sales_pdf_daily(date: str = Query(...), shop_id: Optional[int] = None)
     from fpdf import FPDF
     q = {"date": date}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    recs = await db.sales_records.find(q, {"_id": 0}).sort("date", 1).to_list(10000)
-    company = await db.company_settings.find_one({}, {"_id": 0}) or {}
-    sn = await get_shop_names()
+    recs, company, sn = await fanout(
+        db.sales_records.find(q, {"_id": 0}).sort("date", 1).to_list(10000),
+        db.company_settings.find_one({}, {"_id": 0}), get_shop_names())
+    company = company or {}
     pdf = FPDF()
     pdf.add_page("L")
     pdf.set_font("Helvetica", "B", 14)
@@ -1703,11 +1851,12 @@ async def sales_pdf_daily(date: str = Query(...), shop_id: Optional[int] = None)
 @api_router.get("/sales-records/pdf/monthly")
 async def sales_pdf_monthly(year: int = Query(...), month: int = Query(...), shop_id: Optional[int] = None):
     from fpdf import FPDF
-    q = {"date": {"$regex": f"^{year}-{month:02d}"}}
+    q = {"date": dates.month_range(year, month)}
     if shop_id and shop_id > 0: q["shop_id"] = shop_id
-    recs = await db.sales_records.find(q, {"_id": 0}).sort("date", 1).to_list(10000)
-    company = await db.company_settings.find_one({}, {"_id": 0}) or {}
-    sn = await get_shop_names()
+    recs, company, sn = await fanout(
+        db.sales_records.find(q, {"_id": 0}).sort("date", 1).to_list(10000),
+        db.company_settings.find_one({}, {"_id": 0}), get_shop_names())
+    company = company or {}
     pdf = FPDF()
     pdf.add_page("L")
     pdf.set_font("Helvetica", "B", 14)
@@ -1767,13 +1916,12 @@ async def get_weekly_stats():
     pm_str = (monday - timedelta(days=7)).strftime("%Y-%m-%d")
     ps_str = (monday - timedelta(days=1)).strftime("%Y-%m-%d")
     async def wk(start, end):
-        inc = await db.incomes.find({"date": {"$gte": start, "$lte": end}}, {"_id": 0}).to_list(10000)
-        exp = await db.expenses.find({"date": {"$gte": start, "$lte": end}}, {"_id": 0}).to_list(10000)
-        ti = sum(i["amount"] for i in inc); te = sum(e["amount"] for e in exp)
+        rows = await rollups.find(db, ["incomes", "expenses"], dates.day_range(start, end))
+        ti = sum(r["amount"] for r in rows if r["ledger"] == "incomes")
+        te = sum(r["amount"] for r in rows if r["ledger"] == "expenses")
         n = round(ti * 0.77, 2); p = round(n - te, 2)
         return {"income": round(ti, 2), "ads": round(te, 2), "profit": p, "profit_pp": round(p / 2, 2)}
-    cur = await wk(m_str, s_str)
-    prev = await wk(pm_str, ps_str)
+    cur, prev = await fanout(wk(m_str, s_str), wk(pm_str, ps_str))
     ic = round(((cur["income"] - prev["income"]) / prev["income"] * 100) if prev["income"] > 0 else 0, 1)
     pc = round(((cur["profit"] - prev["profit"]) / abs(prev["profit"]) * 100) if prev["profit"] != 0 else 0, 1)
     return {"current": {"start": m_str, "end": s_str, **cur}, "previous": {"start": pm_str, "end": ps_str, **prev}, "income_change": ic, "profit_change": pc}
@@ -1781,13 +1929,20 @@ async def get_weekly_stats():
 # ===== EXPORT EXCEL =====
 @api_router.get("/export/excel")
 async def export_excel(year: int = Query(...), month: int = Query(...), shop_id: Optional[int] = None):
+    shop_id = shop_id if shop_id and shop_id > 0 else None
+    # data stamps in the flight key, as for the stats: a download requested after a write never gets a file built before it
+    stamp = (stats_cache.stamp(shop_id, year, month), await _shared_stamp())
+    data = await inflight.do(("export/excel", year, month, shop_id, stamp), lambda: _export_excel(year, month, shop_id))
+    return StreamingResponse(io.BytesIO(data), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": f'attachment; filename="ecommify_{year}_{month:02d}.xlsx"'})
+
+async def _export_excel(year: int, month: int, shop_id: Optional[int]) -> bytes:
     from openpyxl import Workbook
-    prefix = f"{year}-{month:02d}"
-    iq = {"date": {"$regex": f"^{prefix}"}}; eq = {"date": {"$regex": f"^{prefix}"}}
-    if shop_id and shop_id > 0: iq["shop_id"] = shop_id; eq["shop_id"] = shop_id
-    incs = await db.incomes.find(iq, {"_id": 0}).sort("date", 1).to_list(10000)
-    exps = await db.expenses.find(eq, {"_id": 0}).sort("date", 1).to_list(10000)
-    sn = await get_shop_names()
+    iq = {"date": dates.month_range(year, month)}; eq = {"date": dates.month_range(year, month)}
+    if shop_id: iq["shop_id"] = shop_id; eq["shop_id"] = shop_id
+    incs, exps, sn = await fanout(
+        db.incomes.find(iq, {"_id": 0}).sort("date", 1).to_list(10000),
+        db.expenses.find(eq, {"_id": 0}).sort("date", 1).to_list(10000),
+        get_shop_names())
     wb = Workbook()
     ws1 = wb.active; ws1.title = "Przychody"
     ws1.append(["Data", "Sklep", "Kwota", "Opis"])
@@ -1795,8 +1950,8 @@ async def export_excel(year: int = Query(...), month: int = Query(...), shop_id:
     ws2 = wb.create_sheet("Koszty Ads")
     ws2.append(["Data", "Sklep", "Kwota", "Kampania"])
     for e in exps: ws2.append([e["date"], sn.get(e.get("shop_id", 0), ""), e["amount"], e.get("campaign_name", "")])
-    buf = io.BytesIO(); wb.save(buf); buf.seek(0)
-    return StreamingResponse(buf, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": f'attachment; filename="ecommify_{year}_{month:02d}.xlsx"'})
+    buf = io.BytesIO(); wb.save(buf)
+    return buf.getvalue()
 
 # ===== INCOME/EXPENSE DETAILS =====
 @api_router.get("/incomes/details")
@@ -1900,9 +2055,24 @@ async def delete_credential(cid: str):
     await db.credentials.delete_one({"id": cid})
     return {"status": "ok"}
 
+# ===== DAILY ROLLUPS =====
+@api_router.post("/rollups/rebuild")
+async def rebuild_rollups(from_month: Optional[str] = Query(None, alias="from"), to_month: Optional[str] = Query(None, alias="to"), dry_run: bool = False):
+    report = await rollups.rebuild(db, from_month, to_month, apply=not dry_run)
+    if report["applied"]:
+        stats_cache.touch_all()
+    return report
+
+# ===== METRICS =====
+@api_router.get("/metrics")
+async def get_metrics():
+    return {"stats_cache": stats_cache.metrics(), "ref_cache": ref_cache.metrics(), "singleflight": inflight.metrics(), "outbound": outbound.metrics(), "sync_jobs": sync_jobs.metrics()}
+
 # ===== SETUP =====
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+app.add_middleware(ETagMiddleware, versions=collection_versions)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1914,6 +2084,103 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# ===== STARTUP =====
+ID_COLLECTIONS = [
+    "shops", "incomes", "expenses", "costs", "custom_columns", "tasks", "ideas", "reminders",
+    "orders", "returns", "fulfillment", "fulfillment_notes", "sales_records", "products", "notes",
+    "shopify_configs", "tiktok_configs", "chat_history", "ai_assistant_history", "spreadsheets", "credentials",
+]
+
+# (collection, keys, options)
+INDEXES = [(c, [("id", ASCENDING)], {"unique": True}) for c in ID_COLLECTIONS] + [
+    ("incomes", [("shop_id", ASCENDING), ("date", ASCENDING)], {}),
+    ("incomes", [("date", ASCENDING)], {}),
+    ("incomes", [("shop_id", ASCENDING), ("date", ASCENDING), ("source", ASCENDING)], {"unique": True, "partialFilterExpression": {"source": {"$exists": True}}}),
+    ("expenses", [("shop_id", ASCENDING), ("date", ASCENDING)], {}),
+    ("expenses", [("date", ASCENDING)], {}),
+    ("expenses", [("shop_id", ASCENDING), ("date", ASCENDING), ("source", ASCENDING)], {"unique": True, "partialFilterExpression": {"source": {"$exists": True}}}),
+    ("costs", [("shop_id", ASCENDING), ("date", ASCENDING), ("id", ASCENDING)], {}),
+    ("costs", [("date", ASCENDING), ("id", ASCENDING)], {}),
+    ("costs", [("category", ASCENDING), ("date", ASCENDING), ("id", ASCENDING)], {}),
+    ("daily_rollups", [("shop_id", ASCENDING), ("date", ASCENDING), ("ledger", ASCENDING), ("category", ASCENDING)], {"unique": True}),
+    ("daily_rollups", [("date", ASCENDING), ("ledger", ASCENDING)], {}),
+    ("orders", [("shop_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("orders", [("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("orders", [("shop_id", ASCENDING), ("shopify_order_id", ASCENDING)], {"unique": True, "partialFilterExpression": {"shopify_order_id": {"$exists": True}}}),
+    ("returns", [("order_id", ASCENDING)], {}),
+    ("returns", [("shop_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("returns", [("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("fulfillment", [("order_id", ASCENDING)], {}),
+    ("fulfillment", [("source_month", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ("fulfillment", [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ("fulfillment", [("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ("fulfillment_notes", [("source_month", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("sales_records", [("order_id", ASCENDING)], {}),
+    ("sales_records", [("shop_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("sales_records", [("date", DESCENDING), ("id", DESCENDING)], {}),
+    ("products", [("name", ASCENDING), ("shop_id", ASCENDING)], {}),
+    ("products", [("name", ASCENDING), ("id", ASCENDING)], {}),
+    ("products", [("shop_id", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)], {}),
+    ("notes", [("date", ASCENDING)], {}),
+    ("migrations", [("name", ASCENDING)], {"unique": True}),
+    ("ideas", [("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ("custom_columns", [("name", ASCENDING)], {"unique": True}),
+    ("shopify_configs", [("shop_id", ASCENDING)], {"unique": True}),
+    ("shopify_order_totals", [("shop_id", ASCENDING), ("order_id", ASCENDING)], {"unique": True}),
+    ("shopify_order_totals", [("shop_id", ASCENDING), ("date", ASCENDING)], {}),
+    ("sync_jobs", [("id", ASCENDING)], {"unique": True}),
+    ("sync_jobs", [("next_run_at", ASCENDING)], {}),
+    ("sync_runs", [("id", ASCENDING)], {"unique": True}),
+    ("sync_runs", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("chat_history", [("shop_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    ("ai_assistant_history", [("created_at", ASCENDING)], {}),
+    ("app_settings", [("_key", ASCENDING)], {"unique": True}),
+]
+
+async def ensure_indexes():
+    existing = {}
+    for coll, keys, opts in INDEXES:
+        if coll not in existing:
+            existing[coll] = await db[coll].index_information()
+        name = "_".join(f"{field}_{direction}" for field, direction in keys)
+        if name not in existing[coll]:
+            logger.info("Building missing index %s.%s", coll, name)
+        try:
+            await db[coll].create_index(keys, name=name, **opts)
+        except OperationFailure as e:
+            # existing index with other options, or duplicates blocking a unique build
+            logger.warning("Index %s.%s not built: %s", coll, name, e)
+
+async def seed_defaults():
+    if not await db.shops.find_one({}, {"_id": 1}):
+        now = datetime.now(timezone.utc).isoformat()
+        for s in DEFAULT_SHOPS:
+            await db.shops.update_one({"id": s["id"]}, {"$setOnInsert": {**s, "is_active": True, "created_at": now}}, upsert=True)
+        await ref_cache.bump("shops")
+        logger.info("Seeded %d default shops", len(DEFAULT_SHOPS))
+    await get_app_settings()
+
+@app.on_event("startup")
+async def startup():
+    outbound.start()
+    await ensure_indexes()
+    await seed_defaults()
+    if not await migrations.is_done(db, "normalize_dates"):
+        report = await migrations.normalize_dates(db)
+        stats_cache.touch_all()
+        logger.info("Dates normalized: %s (%d unreadable)", report["fixed"], report["unreadable"])
+    # First start after the rollup collection was introduced: build it from the raw ledgers
+    if not await db.daily_rollups.find_one({}, {"_id": 1}):
+        report = await rollups.rebuild(db)
+        logger.info("daily_rollups bootstrapped: %d buckets", report["buckets"])
+    # data may have changed while no process was tracking writes (deploys, migrations, manual fixes)
+    await collection_versions.bump([ALL])
+    if os.environ.get("SYNC_SCHEDULER", "1") == "1":
+        sync_scheduler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await sync_scheduler.stop()
+    await sync_jobs.stop()
+    await outbound.close()
     client.close()
@@ -0,0 +1,64 @@
+"""Shopify Admin REST client for the order sync.
+
+Order lists are cursor-paginated: every response carries a ``Link`` header
+whose ``rel="next"`` URL (with a ``page_info`` cursor) fetches the next
+page, and the last page has none. Pages are consumed one at a time, so a
+sync holds at most one page of orders in memory, and only the fields the
+sync uses are requested.
+"""
+import re
+
+API_VERSION = "2024-10"
+PAGE_LIMIT = 250
+ORDER_FIELDS = "created_at,total_price"
+
+_LINK_NEXT = re.compile(r'<([^>]+)>\s*;\s*rel="?next"?')
+
+
+class ShopifyError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Shopify HTTP {status_code}")
+        self.status_code = status_code
+
+
+def base_url(store_url: str) -> str:
+    """store_url is normally "name.myshopify.com"; a full URL (e.g. a local stub) is used as is."""
+    if store_url.startswith(("http://", "https://")):
+        return store_url.rstrip("/")
+    return f"https://{store_url}"
+
+
+def next_page_url(link_header: str):
+    match = _LINK_NEXT.search(link_header or "")
+    return match.group(1) if match else None
+
+
+async def order_pages(http, store_url: str, api_token: str, params: dict, fields: str = ORDER_FIELDS, timeout: float = 30):
+    """Yield the orders of every page, following Link rel="next" until the last page."""
+    url = f"{base_url(store_url)}/admin/api/{API_VERSION}/orders.json"
+    # the next-page URL already carries page_info, limit and fields; Shopify rejects other filters alongside it
+    query = {**params, "limit": PAGE_LIMIT, "fields": fields}
+    headers = {"X-Shopify-Access-Token": api_token}
+    while url:
+        resp = await http.get(url, params=query, headers=headers, timeout=timeout)
+        if resp.status_code != 200:
+            raise ShopifyError(resp.status_code)
+        yield resp.json().get("orders", [])
+        url, query = next_page_url(resp.headers.get("link")), None
+
+
+async def daily_totals(http, store_url: str, api_token: str, params: dict, fields: str = ORDER_FIELDS, on_page=None) -> tuple:
+    """Sum total_price per created_at day over all pages -> ({"YYYY-MM-DD": total}, order count).
+
+    on_page(orders) is awaited for every page before it is dropped.
+    """
+    daily = {}
+    count = 0
+    async for orders in order_pages(http, store_url, api_token, params, fields):
+        if on_page:
+            await on_page(orders)
+        for o in orders:
+            d = o["created_at"][:10]
+            daily[d] = daily.get(d, 0) + float(o.get("total_price", 0))
+        count += len(orders)
+    return daily, count
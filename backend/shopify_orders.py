@@ -0,0 +1,207 @@
+"""Shopify orders -> orders, fulfillment and sales_records (ewidencja).
+
+This module imports a month of a store's orders as complete documents:
+- line items, customer, shipping address and method, payment gateway;
+- for each order, the fulfillment entry and sales records that
+  create_order makes for a manual one.
+
+Each page of orders from Shopify becomes one unordered bulk write per
+collection, instead of one insert per document.
+
+Re-importing is idempotent:
+- Orders are keyed on (shop_id, shopify_order_id).
+- Document ids are uuid5 of the Shopify ids, so every run addresses the
+  same fulfillment entry and sales records.
+- Fields Shopify owns (items, customer, total, ...) are refreshed on
+  every run. Fields the team works with (order status, the fulfillment
+  workflow, notes, extra payment) are set only when the document is
+  first created.
+
+Sales records mirror the order while it is paid. One row is made per
+line item (net of its share of every discount), plus one for paid
+shipping. Rows of items removed from the order, and all rows of an order
+that is no longer paid, are deleted. Cancelled orders get no fulfillment
+entry; an order cancelled after an earlier import loses its entry.
+
+A month is fetched with a time limit per page, not per month: a large
+month takes as long as it needs while each request still fails fast.
+"""
+import asyncio
+import calendar
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+
+import shopify
+
+SOURCE = "shopify"
+VAT_RATE = 23
+FIELDS = ("id,name,created_at,financial_status,cancelled_at,total_price,gateway,payment_gateway_names,"
+          "email,phone,customer,shipping_address,shipping_lines,line_items")
+
+_NAMESPACE = uuid.UUID("5b0c1a52-3f0e-4b8e-9d55-7e4a2c61b0d3")
+
+
+def doc_id(*parts) -> str:
+    return str(uuid.uuid5(_NAMESPACE, ":".join(str(p) for p in parts)))
+
+
+def _address(a: dict) -> str:
+    if not a:
+        return ""
+    street = " ".join(p for p in (a.get("address1"), a.get("address2")) if p)
+    city = " ".join(p for p in (a.get("zip"), a.get("city")) if p)
+    return ", ".join(p for p in (street, city, a.get("country")) if p)
+
+
+def _discount(li: dict) -> float:
+    """The line's share of all discounts (order-level codes included); total_discount only on old orders without allocations."""
+    allocations = li.get("discount_allocations")
+    if allocations is None:
+        return float(li.get("total_discount", 0))
+    return round(sum(float(a.get("amount", 0)) for a in allocations), 2)
+
+
+def order_fields(o: dict, shop_id: int) -> dict:
+    """The order document's fields as Shopify has them (everything but id / status / receipt_id / created_at)."""
+    customer = o.get("customer") or {}
+    ship = o.get("shipping_address") or {}
+    name = " ".join(p for p in (customer.get("first_name"), customer.get("last_name")) if p) or ship.get("name", "")
+    shipping_lines = o.get("shipping_lines") or []
+    gateways = o.get("payment_gateway_names") or []
+    return {
+        "shop_id": shop_id,
+        "shopify_order_id": o["id"],
+        "order_number": o.get("name", ""),
+        "customer_name": name,
+        "customer_email": o.get("email") or customer.get("email") or "",
+        "customer_phone": o.get("phone") or ship.get("phone") or customer.get("phone") or "",
+        "shipping_address": _address(ship),
+        "shipping_method": shipping_lines[0].get("title", "") if shipping_lines else "",
+        "shipping_price": round(sum(float(s.get("price", 0)) for s in shipping_lines), 2),
+        "payment_gateway": gateways[0] if gateways else o.get("gateway") or "",
+        "financial_status": o.get("financial_status", ""),
+        "cancelled": bool(o.get("cancelled_at")),
+        "items": [{
+            "shopify_line_id": li["id"], "name": li.get("title", ""), "variant": li.get("variant_title") or "",
+            "sku": li.get("sku") or "", "quantity": li.get("quantity", 1), "price": float(li.get("price", 0)),
+            "discount": _discount(li),
+        } for li in o.get("line_items", [])],
+        "total": round(float(o.get("total_price", 0)), 2),
+        "date": o["created_at"][:10],
+        "source": SOURCE,
+    }
+
+
+def _sales_row(order: dict, row_id: str, product_name: str, quantity: int, brutto: float) -> dict:
+    netto = round(brutto / (1 + VAT_RATE / 100), 2)
+    return {
+        "id": row_id, "date": order["date"], "order_number": order["order_number"],
+        "product_name": product_name, "quantity": quantity, "netto": netto, "vat_rate": VAT_RATE,
+        "vat_amount": round(brutto - netto, 2), "brutto": brutto, "payment_method": order["payment_gateway"],
+        "shop_id": order["shop_id"], "order_id": order["id"], "source": SOURCE,
+    }
+
+
+def sales_rows(order: dict) -> list:
+    """Sales records of a paid order: one per line item (after its discount) and one for paid shipping."""
+    if order["financial_status"] != "paid" or order["cancelled"]:
+        return []
+    sid, oid = order["shop_id"], order["shopify_order_id"]
+    rows = [
+        _sales_row(order, doc_id("sale", sid, oid, it["shopify_line_id"]),
+                   it["name"] + (f" - {it['variant']}" if it["variant"] else ""), it["quantity"],
+                   round(it["price"] * it["quantity"] - it["discount"], 2))
+        for it in order["items"]
+    ]
+    if order["shipping_price"] > 0:
+        rows.append(_sales_row(order, doc_id("sale", sid, oid, "shipping"), f"Wysylka: {order['shipping_method']}", 1, order["shipping_price"]))
+    return rows
+
+
+async def _extra_payments(db, shop_id: int, orders: list) -> dict:
+    """Order id -> extra payment due from the products catalogue, one query per page (the store's product wins)."""
+    names = {it["name"] for o in orders for it in o["items"]}
+    products = {}
+    for p in await db.products.find({"name": {"$in": list(names)}}, {"_id": 0, "name": 1, "shop_id": 1, "extra_payment": 1}).to_list(None):
+        if p["name"] not in products or p.get("shop_id") == shop_id:
+            products[p["name"]] = p
+    return {o["id"]: round(sum((products.get(it["name"], {}).get("extra_payment") or 0) * it["quantity"] for it in o["items"]), 2)
+            for o in orders}
+
+
+async def write_page(db, shop_id: int, page: list) -> dict:
+    """Upsert one page of Shopify orders with their fulfillment entries and sales records."""
+    now = datetime.now(timezone.utc).isoformat()
+    orders = []
+    for o in page:
+        order = order_fields(o, shop_id)
+        order["id"] = doc_id("order", shop_id, o["id"])
+        orders.append(order)
+    extra = await _extra_payments(db, shop_id, orders)
+
+    order_ops, fulfillment_ops, sales_ops = [], [], []
+    for order in orders:
+        oid = order["id"]
+        fields = {k: v for k, v in order.items() if k != "id"}
+        order_ops.append(UpdateOne(
+            {"shop_id": shop_id, "shopify_order_id": order["shopify_order_id"]},
+            {"$set": fields, "$setOnInsert": {"id": oid, "status": "new", "receipt_id": None, "created_at": now}}, upsert=True))
+        if order["cancelled"]:
+            fulfillment_ops.append(DeleteOne({"order_id": oid}))
+        else:
+            fulfillment_ops.append(UpdateOne({"order_id": oid}, {
+                "$set": {
+                    "order_number": order["order_number"], "customer_name": order["customer_name"],
+                    "customer_email": order["customer_email"], "customer_phone": order["customer_phone"],
+                    "shipping_address": order["shipping_address"], "items": order["items"], "total": order["total"],
+                    "source_month": order["date"][:7], "shop_id": shop_id,
+                },
+                "$setOnInsert": {
+                    "id": doc_id("fulfillment", shop_id, order["shopify_order_id"]), "extra_payment": extra[oid],
+                    "extra_payment_paid": False, "status": "waiting", "notes": "", "tracking_number": "",
+                    "reminder_sent_at": None, "payment_checked_at": None, "shipped_at": None, "created_at": now,
+                },
+            }, upsert=True))
+        rows = sales_rows(order)
+        for row in rows:
+            sales_ops.append(UpdateOne({"order_id": oid, "id": row["id"]}, {"$set": row, "$setOnInsert": {"created_at": now}}, upsert=True))
+        sales_ops.append(DeleteMany({"order_id": oid, "source": SOURCE, "id": {"$nin": [r["id"] for r in rows]}}))
+
+    counts = {"orders": len(orders), "new_orders": 0, "fulfillment": sum(1 for op in fulfillment_ops if isinstance(op, UpdateOne)), "sales_records": 0}
+    if order_ops:
+        counts["new_orders"] = (await db.orders.bulk_write(order_ops, ordered=False)).upserted_count
+    if fulfillment_ops:
+        await db.fulfillment.bulk_write(fulfillment_ops, ordered=False)
+    if sales_ops:
+        await db.sales_records.bulk_write(sales_ops, ordered=False)
+        counts["sales_records"] = sum(1 for op in sales_ops if isinstance(op, UpdateOne))
+    return counts
+
+
+async def import_month(db, http, config: dict, year: int, month: int, page_timeout: float, progress=None) -> dict:
+    """Import every order created in the month, page by page (progress: as in shopify_sync.full).
+    Fetching one page may take at most ``page_timeout`` seconds; pages written before a timeout stay."""
+    ym = f"{year}-{month:02d}"
+    days_in_month = calendar.monthrange(year, month)[1]
+    total = {"orders": 0, "new_orders": 0, "fulfillment": 0, "sales_records": 0}
+    pages = shopify.order_pages(
+        http, config["store_url"], config["api_token"],
+        {"status": "any", "created_at_min": f"{ym}-01T00:00:00Z", "created_at_max": f"{ym}-{days_in_month}T23:59:59Z"}, FIELDS)
+    try:
+        while True:
+            try:
+                page = await asyncio.wait_for(pages.__anext__(), page_timeout)
+            except StopAsyncIteration:
+                break
+            counts = await write_page(db, config["shop_id"], page)
+            for k, v in counts.items():
+                total[k] += v
+            if progress:
+                progress.page(len(page))
+    finally:
+        await pages.aclose()
+    if progress:
+        progress.rows(total["sales_records"])
+    return {"mode": "orders", **total, "months": [ym]}
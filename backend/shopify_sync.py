@@ -0,0 +1,151 @@
+"""Shopify orders -> daily "[Shopify]" income rows, full or incremental.
+
+A full reconcile fetches one month of paid orders (by created_at), which
+is what the sync always did, and replaces the month's Shopify income
+rows. It also records each order's contribution in
+``shopify_order_totals`` (shop_id, order_id, date, amount), and that
+record is what makes the incremental mode possible.
+
+An incremental run asks Shopify only for orders updated since the
+config's ``sync_watermark`` (``updated_at_min``). It compares each order
+with its recorded contribution and shifts the affected days by the
+difference. An order that is no longer paid contributes 0, and one seen
+for the first time contributes its total. Only months that have had a
+full reconcile (``synced_months``) are maintained this way; changes to
+other months are counted as skipped.
+
+The watermark trails the run start by OVERLAP, so orders updated while
+a run is in progress are fetched again by the next one. Fetching an
+order twice is harmless: its second delta against the record is zero.
+"""
+import asyncio
+import calendar
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import DeleteOne, UpdateOne
+
+import dates
+import shopify
+import sync_writer
+
+SOURCE = "shopify"
+DESCRIPTION = "[Shopify] Auto-sync"
+FIELDS = "id,created_at,total_price,financial_status"
+OVERLAP = timedelta(minutes=5)
+
+
+def contribution(order: dict) -> float:
+    """What an order adds to its day's income: its total while paid, nothing otherwise."""
+    return round(float(order.get("total_price", 0)), 2) if order.get("financial_status") == "paid" else 0
+
+
+def _watermark(started: datetime) -> str:
+    return (started - OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def full(db, http, config: dict, year: int, month: int, timeout: float, progress=None) -> dict:
+    """Refetch the month and replace its rows; the month then stays current through incremental runs.
+
+    progress (optional) gets page(n_orders) per fetched page and rows(n) once the rows are written.
+    """
+    sid = config["shop_id"]
+    run = str(uuid.uuid4())
+    started = datetime.now(timezone.utc)
+    ym = f"{year}-{month:02d}"
+    month_q = dates.month_range(year, month)
+    days_in_month = calendar.monthrange(year, month)[1]
+
+    records = []
+
+    async def record(orders):
+        # kept until the write: records and income rows must change together, or later deltas start from the wrong base
+        records.extend(UpdateOne({"shop_id": sid, "order_id": o["id"]},
+                                 {"$set": {"date": o["created_at"][:10], "amount": contribution(o), "run": run}}, upsert=True)
+                       for o in orders)
+        if progress:
+            progress.page(len(orders))
+
+    daily, n_orders = await asyncio.wait_for(shopify.daily_totals(
+        http, config["store_url"], config["api_token"],
+        {"status": "any", "created_at_min": f"{ym}-01T00:00:00Z", "created_at_max": f"{ym}-{days_in_month}T23:59:59Z", "financial_status": "paid"},
+        FIELDS, on_page=record), timeout)
+    rows = [{"shop_id": sid, "date": ds, "amount": round(total, 2), "description": DESCRIPTION} for ds, total in daily.items()]
+
+    async def write(session):
+        # without transactions a write that stops half way must not leave the month looking reconciled:
+        # it drops out of synced_months until the end, so the next run reconciles it in full again
+        await db.shopify_configs.update_one({"shop_id": sid}, {"$pull": {"synced_months": ym}}, session=session)
+        if records:
+            await db.shopify_order_totals.bulk_write(records, ordered=False, session=session)
+        # orders of the month this run did not see are no longer paid (or gone)
+        await db.shopify_order_totals.delete_many({"shop_id": sid, "date": month_q, "run": {"$ne": run}}, session=session)
+        await sync_writer.replace_rows(
+            db, "incomes", SOURCE, month_q, rows, shop_ids=[sid],
+            legacy={"shop_id": sid, "description": {"$regex": "\\[Shopify\\]"}}, session=session)
+        update = {"$addToSet": {"synced_months": ym}, "$set": {"last_sync": datetime.now(timezone.utc).isoformat()}}
+        if not config.get("sync_watermark"):
+            update["$set"]["sync_watermark"] = _watermark(started)
+        await db.shopify_configs.update_one({"shop_id": sid}, update, session=session)
+
+    await sync_writer.run_atomic(db, write)
+    if progress:
+        progress.rows(len(rows))
+    return {"mode": "full", "orders": n_orders, "days": len(daily), "months": [ym]}
+
+
+async def incremental(db, http, config: dict, timeout: float, progress=None) -> dict:
+    """Apply the orders changed since the watermark as day-level deltas (progress: as in full)."""
+    sid = config["shop_id"]
+    months = set(config.get("synced_months", []))
+    started = datetime.now(timezone.utc)
+    changed = {}  # order id -> (date, contribution)
+    fetched = skipped = 0
+
+    async def fetch():
+        nonlocal fetched, skipped
+        async for orders in shopify.order_pages(
+                http, config["store_url"], config["api_token"],
+                {"status": "any", "updated_at_min": config["sync_watermark"]}, FIELDS):
+            fetched += len(orders)
+            if progress:
+                progress.page(len(orders))
+            for o in orders:
+                ds = o["created_at"][:10]
+                if ds[:7] in months:
+                    changed[o["id"]] = (ds, contribution(o))
+                else:
+                    skipped += 1
+
+    await asyncio.wait_for(fetch(), timeout)
+
+    async def write(session):
+        recorded = await db.shopify_order_totals.find(
+            {"shop_id": sid, "order_id": {"$in": list(changed)}}, {"_id": 0, "order_id": 1, "date": 1, "amount": 1},
+            session=session).to_list(None)
+        before = {r["order_id"]: r for r in recorded}
+        deltas, ops = {}, []
+        for oid, (ds, amount) in changed.items():
+            prev = before.get(oid)
+            if prev:
+                deltas[prev["date"]] = deltas.get(prev["date"], 0) - prev["amount"]
+            deltas[ds] = deltas.get(ds, 0) + amount
+            if amount:
+                ops.append(UpdateOne({"shop_id": sid, "order_id": oid}, {"$set": {"date": ds, "amount": amount}}, upsert=True))
+            elif prev:
+                ops.append(DeleteOne({"shop_id": sid, "order_id": oid}))
+        if ops:
+            await db.shopify_order_totals.bulk_write(ops, ordered=False, session=session)
+        deltas = {ds: d for ds, d in deltas.items() if abs(d) >= 0.005}
+        await sync_writer.shift_days(db, "incomes", SOURCE, sid, deltas, {"description": DESCRIPTION}, session=session)
+        await db.shopify_configs.update_one(
+            {"shop_id": sid},
+            {"$set": {"sync_watermark": _watermark(started), "last_sync": datetime.now(timezone.utc).isoformat()}},
+            session=session)
+        return deltas
+
+    deltas = await sync_writer.run_atomic(db, write)
+    if progress:
+        progress.rows(len(deltas))
+    return {"mode": "incremental", "orders": fetched, "days": len(deltas), "skipped": skipped,
+            "months": sorted({ds[:7] for ds in deltas})}
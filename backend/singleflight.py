@@ -0,0 +1,47 @@
+"""Coalescing of identical concurrent calls (single flight).
+
+The first caller for a key starts the computation as a task; callers that
+arrive with the same key while it runs await that task instead of
+repeating the work, and every one of them gets its result (or its
+exception). The key is dropped once the task finishes, so nothing is
+cached: a call made after completion runs again.
+
+Keys are tuples whose first element names the endpoint; counters are kept
+per name. The task is shielded from its callers, so a client that
+disconnects does not cancel the work the others are waiting on.
+"""
+import asyncio
+from collections import defaultdict
+
+
+class SingleFlight:
+    def __init__(self):
+        self._tasks = {}
+        self.runs = defaultdict(int)       # name -> computations started
+        self.coalesced = defaultdict(int)  # name -> callers that joined one in flight
+
+    def _done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # consume the exception here too, in case every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: tuple, compute):
+        """compute() is awaited once per key at a time; concurrent callers share its result."""
+        task = self._tasks.get(key)
+        if task is None:
+            self.runs[key[0]] += 1
+            task = asyncio.ensure_future(compute())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced[key[0]] += 1
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": len(self._tasks),
+            "runs": sum(self.runs.values()), "coalesced": sum(self.coalesced.values()),
+            "by_name": {name: {"runs": self.runs[name], "coalesced": self.coalesced[name]} for name in self.runs},
+        }
@@ -0,0 +1,74 @@
+"""In-process LRU cache for the stats endpoints.
+
+Entries are keyed by (endpoint, shop_id, year, month[, variant]) and stamped
+with the version of the data they were computed from: a per-(shop, month)
+counter bumped by every ledger write for that month, plus a global epoch
+bumped by writes that reshape every month (app settings, custom columns,
+shops). A write invalidates exactly the months it changed. These versions
+live in this process only, so callers also pass ``shared``: the stats
+collections' counters from ``cache_versions``, which every process bumps.
+A write made by another process changes them, and the entry is
+recomputed.
+
+A hit runs no stats query. Its one Mongo read is the ``cache_versions``
+lookup that the ETag middleware makes for the request anyway; the cache
+reuses it (``etags.request_stamp``) and does not read it again. This one
+small read is the price of never serving a body older than its tag.
+"""
+import os
+from collections import OrderedDict, defaultdict
+
+
+class StatsCache:
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)  # (shop_id | None, "YYYY-MM") -> counter
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stamp(self, shop_id, year: int, month: int) -> tuple:
+        """Current data version for one shop's month (shop_id=None: all shops)."""
+        return (self._epoch, self._versions[(shop_id, f"{year}-{month:02d}")])
+
+    def touch(self, shop_id, date: str):
+        """Invalidate the month containing ``date`` (YYYY-MM or YYYY-MM-DD) for a shop and for all-shop views."""
+        ym = date[:7]
+        self._versions[(shop_id, ym)] += 1
+        self._versions[(None, ym)] += 1
+
+    def touch_all(self):
+        self._epoch += 1
+
+    async def get_or_compute(self, key: tuple, compute, shared: tuple = ()):
+        """key = (endpoint, shop_id, year, month, ...); compute() is awaited on a miss.
+        shared: cross-process data version, part of the stamp the entry must match."""
+        _, shop_id, year, month = key[:4]
+        stamp = (*self.stamp(shop_id, year, month), shared)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        # stamp taken before the reads: a write racing with compute() leaves this entry stale-stamped
+        value = await compute()
+        self._entries[key] = (stamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0,
+        }
+
+
+stats_cache = StatsCache(int(os.environ.get("STATS_CACHE_SIZE", "512")))
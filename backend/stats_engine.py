@@ -0,0 +1,217 @@
+"""Month-cube stats engine shared by /monthly-stats and /combined-monthly-stats.
+
+Ledger sums for one month are laid out as a NumPy array of
+days x shops x categories; every daily / per-shop / monthly figure
+(netto, ads, profit, profit_pp, ROI, streak, forecast) is derived from it
+with array operations instead of nested Python loops.
+"""
+import calendar
+
+import numpy as np
+
+NETTO_RATE = 0.77
+
+# fixed category slots; custom columns follow from index 5
+INCOME, TIKTOK, META, GOOGLE, ZWROTY = range(5)
+CUSTOM = 5
+COST_SLOTS = {"tiktok": TIKTOK, "meta": META, "google": GOOGLE, "zwroty": ZWROTY}
+
+
+def _round2(a: np.ndarray) -> np.ndarray:
+    """round(x, 2) element-wise with Python's exact semantics.
+
+    np.round scales by 100 first, so on near-ties like 426.965 it can land a
+    cent away from round(); only those few cells go through round() itself.
+    """
+    out = np.round(a, 2)
+    tie = np.abs(np.abs(a * 100) % 1 - 0.5) < 1e-6
+    if tie.any():
+        out[tie] = [round(v, 2) for v in a[tie].tolist()]
+    return out
+
+
+def _derive(x: np.ndarray, split: int, custom_expense: np.ndarray) -> dict:
+    """Per-row netto / ads_total / profit / profit_pp for an (..., categories) array."""
+    netto = _round2(x[..., INCOME] * NETTO_RATE)
+    ads_total = _round2(x[..., TIKTOK] + x[..., META] + x[..., GOOGLE])
+    costs = ads_total + x[..., ZWROTY] + (x[..., CUSTOM:] * custom_expense).sum(axis=-1)
+    profit = _round2(netto - costs)
+    return {"netto": netto, "ads_total": ads_total, "profit": profit, "profit_pp": _round2(profit / split)}
+
+
+def _slots(custom_names: list) -> dict:
+    """(ledger, category) -> category slot; unknown cost categories have no slot and are ignored."""
+    slots = {("costs", name): c for name, c in COST_SLOTS.items()}
+    for i, name in enumerate(custom_names):
+        slots.setdefault(("costs", name), CUSTOM + i)
+    slots[("incomes", "income")] = INCOME
+    return slots
+
+
+def _totals(total: np.ndarray, custom_names: list, custom_expense: np.ndarray, split: int) -> dict:
+    t = total.tolist()
+    total_netto = round(t[INCOME] * NETTO_RATE, 2)
+    total_ads = round(t[TIKTOK] + t[META] + t[GOOGLE], 2)
+    total_custom = {name: t[CUSTOM + i] for i, name in enumerate(custom_names)}
+    total_all_costs = total_ads + t[ZWROTY] + float((total[CUSTOM:] * custom_expense).sum())
+    total_profit = round(total_netto - total_all_costs, 2)
+    return {
+        "total_income": round(t[INCOME], 2),
+        "total_ads": total_ads,
+        "total_tiktok": round(t[TIKTOK], 2),
+        "total_meta": round(t[META], 2),
+        "total_google": round(t[GOOGLE], 2),
+        "total_zwroty": round(t[ZWROTY], 2),
+        "total_custom": total_custom,
+        "total_netto": total_netto,
+        "total_profit": total_profit,
+        "profit_per_person": round(total_profit / split, 2),
+        "roi": round((total_profit / total_all_costs * 100), 2) if total_all_costs > 0 else 0,
+    }
+
+
+def _custom_expense(custom_columns: list) -> np.ndarray:
+    return np.array([cc.get("column_type") == "expense" for cc in custom_columns], dtype=bool)
+
+
+class MonthCube:
+    """Ledger sums for one month: cube[day, shop, category].
+
+    ``rows`` are daily_rollups documents (incomes and costs ledgers). Rows of
+    shops missing from ``shop_ids`` land in an extra trailing shop slot, so
+    they count toward day totals without getting a per-shop breakdown.
+    """
+
+    def __init__(self, year: int, month: int, shop_ids: list, custom_columns: list, rows: list):
+        self.year, self.month = year, month
+        self.days_in_month = calendar.monthrange(year, month)[1]
+        self.dates = [f"{year}-{month:02d}-{d:02d}" for d in range(1, self.days_in_month + 1)]
+        self.shop_ids = list(shop_ids)
+        self.custom_names = [cc["name"] for cc in custom_columns]
+        self.custom_expense = _custom_expense(custom_columns)
+
+        day_index = {ds: i for i, ds in enumerate(self.dates)}
+        shop_index = {sid: i for i, sid in enumerate(self.shop_ids)}
+        other_shop = len(self.shop_ids)
+        slots = _slots(self.custom_names)
+
+        day_of, shop_of, slot_of = day_index.get, shop_index.get, slots.get
+        cells = [
+            (day_of(r["date"]), shop_of(r["shop_id"], other_shop), slot_of((r["ledger"], r["category"])), r["amount"])
+            for r in rows
+        ]
+        cells = [cell for cell in cells if cell[0] is not None and cell[2] is not None]
+
+        self.cube = np.zeros((self.days_in_month, len(self.shop_ids) + 1, CUSTOM + len(self.custom_names)))
+        if cells:
+            d_idx, s_idx, c_idx, amounts = zip(*cells)
+            np.add.at(self.cube, (np.array(d_idx), np.array(s_idx), np.array(c_idx)), np.array(amounts, dtype=float))
+        self.day = self.cube.sum(axis=1)
+        self.total = self.day.sum(axis=0)
+
+    @property
+    def total_income(self) -> float:
+        return float(self.total[INCOME])
+
+    def totals(self, split: int) -> dict:
+        return _totals(self.total, self.custom_names, self.custom_expense, split)
+
+    def _rows(self, x: np.ndarray, split: int) -> list:
+        """Row dicts (income, ads, zwroty, custom_costs, netto, profit, profit_pp) for an (n, categories) array."""
+        derived = {k: v.tolist() for k, v in _derive(x, split, self.custom_expense).items()}
+        vals = x.tolist()
+        out = []
+        for i, v in enumerate(vals):
+            out.append({
+                "income": v[INCOME], "netto": derived["netto"][i],
+                "profit": derived["profit"][i], "profit_pp": derived["profit_pp"][i],
+                "tiktok_ads": v[TIKTOK], "meta_ads": v[META], "google_ads": v[GOOGLE],
+                "ads_total": derived["ads_total"][i], "zwroty": v[ZWROTY],
+                "custom_costs": dict(zip(self.custom_names, v[CUSTOM:])),
+            })
+        return out
+
+    def _columns(self, x: np.ndarray, split: int) -> dict:
+        """Parallel metric arrays (same values as _rows) for a (days, categories) array."""
+        derived = {k: v.tolist() for k, v in _derive(x, split, self.custom_expense).items()}
+        return {
+            "income": x[:, INCOME].tolist(), "netto": derived["netto"],
+            "profit": derived["profit"], "profit_pp": derived["profit_pp"],
+            "tiktok_ads": x[:, TIKTOK].tolist(), "meta_ads": x[:, META].tolist(), "google_ads": x[:, GOOGLE].tolist(),
+            "ads_total": derived["ads_total"], "zwroty": x[:, ZWROTY].tolist(),
+            "custom_costs": {name: x[:, CUSTOM + i].tolist() for i, name in enumerate(self.custom_names)},
+        }
+
+    def day_columns(self, split: int, per_shop: bool = False) -> dict:
+        """Columnar twin of day_rows: {"dates": [...], metric: [...], "shops": {shop_id: {metric: [...]}}}."""
+        out = {"dates": list(self.dates), **self._columns(self.day, split)}
+        if per_shop:
+            out["shops"] = {str(sid): self._columns(self.cube[:, s, :], split) for s, sid in enumerate(self.shop_ids)}
+        return out
+
+    def day_rows(self, split: int, per_shop: bool = False) -> list:
+        days = self._rows(self.day, split)
+        for ds, day in zip(self.dates, days):
+            day["date"] = ds
+        if per_shop:
+            n_shops = len(self.shop_ids)
+            flat = self._rows(self.cube[:, :n_shops, :].reshape(-1, self.cube.shape[2]), split)
+            for d, day in enumerate(days):
+                shops = flat[d * n_shops:(d + 1) * n_shops]
+                for sid, s in zip(self.shop_ids, shops):
+                    s["shop_id"] = sid
+                day["shops"] = shops
+        return days
+
+    def kpis(self, split: int, now) -> dict:
+        """streak / best_day / forecast as seen at ``now`` (aware UTC datetime)."""
+        current = self.year == now.year and self.month == now.month
+        today_num = now.day if current else self.days_in_month
+        profit = _derive(self.day, split, self.custom_expense)["profit"]
+
+        # consecutive profitable days counting back from today
+        positive = profit[:today_num][::-1] > 0
+        streak = int(positive.size if positive.all() else positive.argmin())
+
+        income = self.day[:, INCOME]
+        best = None
+        if (income > 0).any():
+            best = self.dates[int(np.where(income > 0, profit, -np.inf).argmax())]
+
+        total_income = self.total_income
+        forecast = round((total_income / today_num) * self.days_in_month, 2) if total_income > 0 and today_num > 0 else 0
+        return {"streak": streak, "best_day": best, "forecast": forecast}
+
+
+def period_series(periods: list, custom_columns: list, rows: list, split: int) -> dict:
+    """Columnar series over arbitrary periods (days, ISO weeks, months).
+
+    ``rows`` are rollup sums already grouped per (period, ledger, category);
+    rows whose period is not in ``periods`` are ignored.
+    """
+    custom_names = [cc["name"] for cc in custom_columns]
+    custom_expense = _custom_expense(custom_columns)
+    period_of, slot_of = {p: i for i, p in enumerate(periods)}.get, _slots(custom_names).get
+    cells = [(period_of(r["period"]), slot_of((r["ledger"], r["category"])), r["amount"]) for r in rows]
+    cells = [cell for cell in cells if cell[0] is not None and cell[1] is not None]
+
+    x = np.zeros((len(periods), CUSTOM + len(custom_names)))
+    if cells:
+        p_idx, c_idx, amounts = zip(*cells)
+        np.add.at(x, (np.array(p_idx), np.array(c_idx)), np.array(amounts, dtype=float))
+
+    derived = _derive(x, split, custom_expense)
+    series = {
+        "periods": list(periods),
+        "income": _round2(x[:, INCOME]).tolist(),
+        "tiktok_ads": _round2(x[:, TIKTOK]).tolist(),
+        "meta_ads": _round2(x[:, META]).tolist(),
+        "google_ads": _round2(x[:, GOOGLE]).tolist(),
+        "ads_total": derived["ads_total"].tolist(),
+        "zwroty": _round2(x[:, ZWROTY]).tolist(),
+        "custom_costs": {name: _round2(x[:, CUSTOM + i]).tolist() for i, name in enumerate(custom_names)},
+        "netto": derived["netto"].tolist(),
+        "profit": derived["profit"].tolist(),
+        "profit_pp": derived["profit_pp"].tolist(),
+    }
+    return {"series": series, "totals": _totals(x.sum(axis=0), custom_names, custom_expense, split)}
@@ -0,0 +1,44 @@
+"""NDJSON streaming for the list endpoints (``?format=ndjson``).
+
+Documents are pulled from the Motor cursor one batch at a time and written
+out as one JSON object per line, so server memory stays at one batch no
+matter how many rows match.
+
+Lines are sent in chunks, not one write per row. As each document
+arrives, the chunk is flushed if it has reached FLUSH_BYTES or if
+FLUSH_INTERVAL has passed since the last flush, so a slow cursor sends
+what it has at least once per round trip. The first document is sent as
+soon as the cursor returns it: the client gets its first byte right away
+even from a slow query.
+"""
+import time
+
+from fastapi.responses import StreamingResponse
+
+import fastjson
+
+BATCH_SIZE = 500          # documents per cursor round trip
+FLUSH_BYTES = 64 * 1024   # chunk size sent to the client
+FLUSH_INTERVAL = 0.1      # seconds between flushes while documents keep coming
+
+
+async def _lines(cursor, transform=None):
+    buf, size, flushed_at = [], 0, None
+    async for doc in cursor:
+        if transform:
+            doc = transform(doc)
+        line = fastjson.dumps(doc)
+        buf.append(line)
+        size += len(line) + 1
+        now = time.monotonic()
+        if flushed_at is None or size >= FLUSH_BYTES or now - flushed_at >= FLUSH_INTERVAL:
+            yield b"\n".join(buf) + b"\n"
+            buf, size, flushed_at = [], 0, now
+    if buf:
+        yield b"\n".join(buf) + b"\n"
+
+
+def ndjson(collection, query: dict, sort: list, transform=None) -> StreamingResponse:
+    """Stream every document matching ``query`` in ``sort`` order; ``transform`` is applied per document."""
+    cursor = collection.find(query, {"_id": 0}).sort(sort).batch_size(BATCH_SIZE)
+    return StreamingResponse(_lines(cursor, transform), media_type="application/x-ndjson")
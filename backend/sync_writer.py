@@ -0,0 +1,112 @@
+"""Writes the result of one connector sync into a ledger (incomes / expenses).
+
+Synced rows carry a ``source`` ("shopify", "tiktok:<config id>") and are
+keyed by (shop_id, date, source). A run replaces the source's rows for
+the month with one ordered ``bulk_write``: upserts for the days it
+returned, deletes for days that disappeared. The rollup buckets are moved
+by the net difference in one more bulk write.
+
+Both run in a transaction, so readers see the month before or after the
+sync and never in between. On a standalone mongod, which has no
+transactions, the same writes run without one.
+
+``shift_days`` is the incremental counterpart: it moves single days by a
+delta (e.g. the orders that changed since the last run) instead of
+replacing the month.
+
+Rows written before ``source`` existed are matched by the caller's
+``legacy`` filter and removed in the same bulk write, so every month
+converts on its first sync.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+import rollups
+
+logger = logging.getLogger(__name__)
+
+ILLEGAL_OPERATION = 20  # "Transaction numbers are only allowed on a replica set member or mongos"
+
+_transactions = True  # cleared after the server first refuses one
+
+
+async def replace_month(db, ledger: str, source: str, month_q: dict, rows: list, shop_ids: list = None, legacy: dict = None) -> dict:
+    """rows: [{"shop_id", "date", "amount", ...display fields}] - the source's complete result for the month.
+
+    shop_ids limits the replaced rows to those shops (a source shared by several connectors).
+    """
+    return await run_atomic(db, lambda session: replace_rows(db, ledger, source, month_q, rows, shop_ids, legacy, session))
+
+
+async def replace_rows(db, ledger: str, source: str, month_q: dict, rows: list, shop_ids: list = None, legacy: dict = None, session=None) -> dict:
+    """replace_month() inside the caller's run_atomic()."""
+    scope = {"source": source, "date": month_q}
+    if shop_ids is not None:
+        scope["shop_id"] = {"$in": shop_ids}
+    old_q = {"$or": [scope, {**legacy, "date": month_q, "source": {"$exists": False}}]} if legacy else scope
+    old = await db[ledger].find(old_q, {"_id": 0, "shop_id": 1, "date": 1, "amount": 1, "source": 1}, session=session).to_list(None)
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    if legacy:
+        ops.append(DeleteMany({**legacy, "date": month_q, "source": {"$exists": False}}))
+    keep = {(r["shop_id"], r["date"]) for r in rows}
+    for o in old:
+        if o.get("source") == source and (o["shop_id"], o["date"]) not in keep:
+            ops.append(DeleteOne({"shop_id": o["shop_id"], "date": o["date"], "source": source}))
+    for r in rows:
+        ops.append(UpdateOne(
+            {"shop_id": r["shop_id"], "date": r["date"], "source": source},
+            {"$set": {**r, "updated_at": now}, "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}},
+            upsert=True))
+    result = await db[ledger].bulk_write(ops, ordered=True, session=session) if ops else None
+    await rollups.record_replace(db, ledger, old, rows, session=session)
+    if result is None:
+        return {"upserted": 0, "modified": 0, "deleted": 0}
+    return {"upserted": result.upserted_count, "modified": result.modified_count, "deleted": result.deleted_count}
+
+
+async def shift_days(db, ledger: str, source: str, shop_id: int, deltas: dict, fields: dict, session=None) -> dict:
+    """Move the source's day rows of one shop by {date: delta}; rows that fall to zero are removed.
+
+    Meant to run inside the caller's run_atomic() together with whatever produced the deltas.
+    """
+    if not deltas:
+        return {"upserted": 0, "modified": 0, "deleted": 0}
+    q = {"shop_id": shop_id, "source": source, "date": {"$in": sorted(deltas)}}
+    old = await db[ledger].find(q, {"_id": 0, "shop_id": 1, "date": 1, "amount": 1}, session=session).to_list(None)
+    current = {o["date"]: o["amount"] for o in old}
+    now = datetime.now(timezone.utc).isoformat()
+    ops, new = [], []
+    for ds, delta in sorted(deltas.items()):
+        amount = round(current.get(ds, 0) + delta, 2)
+        key = {"shop_id": shop_id, "date": ds, "source": source}
+        if abs(amount) >= 0.005:
+            new.append({"shop_id": shop_id, "date": ds, "amount": amount})
+            ops.append(UpdateOne(key, {"$set": {**fields, "amount": amount, "updated_at": now},
+                                       "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}}, upsert=True))
+        elif ds in current:
+            ops.append(DeleteOne(key))
+    result = await db[ledger].bulk_write(ops, ordered=True, session=session) if ops else None
+    await rollups.record_replace(db, ledger, old, new, session=session)
+    if result is None:
+        return {"upserted": 0, "modified": 0, "deleted": 0}
+    return {"upserted": result.upserted_count, "modified": result.modified_count, "deleted": result.deleted_count}
+
+
+async def run_atomic(db, write):
+    """Await write(session) in a transaction, or write(None) on a server without transactions."""
+    global _transactions
+    if _transactions:
+        try:
+            async with await db.client.start_session() as session:
+                return await session.with_transaction(write)
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+            _transactions = False
+            logger.warning("MongoDB without transactions (standalone), sync writes will not be atomic")
+    return await write(None)
@@ -0,0 +1,46 @@
+"""
+Database for the unit tests that need one
+TEST_MONGO_URL set: a throwaway database on that server, dropped afterwards; otherwise mongomock-motor if installed; otherwise the test is skipped
+mongomock has no sessions, so it answers like a standalone mongod and sync writes take the non-transactional path
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo.errors import OperationFailure
+
+
+def _open():
+    url = os.environ.get("TEST_MONGO_URL")
+    if url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(url)
+        name = f"test_{uuid.uuid4().hex[:12]}"
+
+        async def cleanup():
+            await client.drop_database(name)
+            client.close()
+        return client[name], cleanup
+
+    mongomock_motor = pytest.importorskip("mongomock_motor", reason="set TEST_MONGO_URL or pip install mongomock-motor")
+    client = mongomock_motor.AsyncMongoMockClient()
+
+    async def standalone(*args, **kwargs):
+        raise OperationFailure("Transaction numbers are only allowed on a replica set member or mongos", code=20)
+    client.start_session = standalone
+
+    async def cleanup():
+        pass
+    return client["test"], cleanup
+
+
+def with_db(test):
+    """Run ``await test(db)`` on a fresh database and return its result."""
+    async def main():
+        db, cleanup = _open()
+        try:
+            return await test(db)
+        finally:
+            await cleanup()
+    return asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Local stand-in for the Shopify Admin orders endpoint, serving paginated fixtures
+Pages follow the real API: Link rel="next" with a page_info cursor, no Link on the last page
+With bucket=(size, leak per second) it also enforces Shopify's leaky-bucket rate limit
+"""
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+ORDERS_PATH = "/admin/api/2024-10/orders.json"
+
+
+def make_orders(n, year=2025, month=1, price="10.00", first_id=1):
+    """n paid orders spread over the first 28 days of the month"""
+    orders = []
+    for i in range(n):
+        created = f"{year}-{month:02d}-{i % 28 + 1:02d}T12:00:00+01:00"
+        orders.append({"id": first_id + i, "created_at": created, "updated_at": created, "total_price": price, "financial_status": "paid"})
+    return orders
+
+
+def _ts(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+# query filter -> (order field, keeps the order when)
+FILTERS = {
+    "created_at_min": ("created_at", lambda field, bound: _ts(field) >= _ts(bound)),
+    "created_at_max": ("created_at", lambda field, bound: _ts(field) <= _ts(bound)),
+    "updated_at_min": ("updated_at", lambda field, bound: _ts(field) >= _ts(bound)),
+    "financial_status": ("financial_status", lambda field, bound: field == bound),
+}
+
+
+class ShopifyStub:
+    """with ShopifyStub(orders) as stub: ... stub.url is a store_url the sync accepts"""
+
+    def __init__(self, orders, token="test-token", fail_page=None, fail_status=500, fail_times=None,
+                 bucket=None, retry_after="2.0"):
+        self.orders = orders
+        self.token = token
+        self.fail_page = fail_page      # 0-based page answered with fail_status
+        self.fail_status = fail_status
+        self.fail_times = fail_times    # how many times fail_page fails before it succeeds (None: always)
+        self.bucket = bucket            # (size, leak per second) or None for no rate limit
+        self.retry_after = retry_after  # Retry-After sent with a 429
+        self.requests = []              # parsed query of every request, in order
+        self.throttled = 0              # requests refused with 429
+        self._level = 0.0
+        self._leaked_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._filters = {}              # filters of the first page, kept for the cursor pages like the real API
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handle(self, req):
+        parsed = urlparse(req.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        self.requests.append(query)
+        if parsed.path != ORDERS_PATH:
+            return self._send(req, 404, {"errors": "Not Found"})
+        if req.headers.get("X-Shopify-Access-Token") != self.token:
+            return self._send(req, 401, {"errors": "Invalid API key or access token"})
+        headers = {}
+        if self.bucket:
+            size, leak = self.bucket
+            with self._lock:
+                now = time.monotonic()
+                self._level = max(0.0, self._level - (now - self._leaked_at) * leak)
+                self._leaked_at = now
+                if self._level + 1 > size:
+                    self.throttled += 1
+                    return self._send(req, 429, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                                      {"Retry-After": self.retry_after, "X-Shopify-Shop-Api-Call-Limit": f"{size}/{size}"})
+                self._level += 1
+                headers["X-Shopify-Shop-Api-Call-Limit"] = f"{math.ceil(self._level)}/{size}"
+        limit = int(query.get("limit", 50))
+        page = int(query.get("page_info", "0"))
+        if page == self.fail_page and self.fail_times != 0:
+            if self.fail_times:
+                self.fail_times -= 1
+            return self._send(req, self.fail_status, {"errors": "boom"})
+        if "page_info" not in query:
+            self._filters = {k: v for k, v in query.items() if k in FILTERS}
+        orders = [o for o in self.orders if all(FILTERS[k][1](o[FILTERS[k][0]], v) for k, v in self._filters.items())]
+        fields = query.get("fields")
+        chunk = orders[page * limit:(page + 1) * limit]
+        if fields:
+            keep = fields.split(",")
+            chunk = [{k: o[k] for k in keep if k in o} for o in chunk]
+        if (page + 1) * limit < len(orders):
+            nxt = {"limit": limit, "page_info": page + 1, **({"fields": fields} if fields else {})}
+            headers["Link"] = f'<{self.url}{ORDERS_PATH}?{urlencode(nxt)}>; rel="next"'
+        self._send(req, 200, {"orders": chunk}, headers)
+
+    def _send(self, req, status, body, headers=None):
+        data = json.dumps(body).encode()
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            req.send_header(k, v)
+        req.end_headers()
+        req.wfile.write(data)
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
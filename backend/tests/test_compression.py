@@ -0,0 +1,123 @@
+"""
+Tests for negotiated response compression (compression.CompressionMiddleware)
+Tests: br / gzip / identity negotiation, small and excluded bodies untouched, streamed chunks decodable as they arrive
+"""
+import asyncio
+import gzip
+import zlib
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+brotli = pytest.importorskip("brotli")
+httpx = pytest.importorskip("httpx")
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from compression import CompressionMiddleware
+
+BIG = b'{"rows": [' + b",".join(b'{"id": %d, "name": "Kubek"}' % i for i in range(500)) + b"]}"
+LINES = [b'{"id": %d, "name": "Talerz"}\n' % i * 40 for i in range(5)]
+
+
+async def big(request):
+    return Response(BIG, media_type="application/json")
+
+
+async def small(request):
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+async def pdf(request):
+    return Response(BIG, media_type="application/pdf")
+
+
+async def ndjson(request):
+    async def rows():
+        for line in LINES:
+            yield line
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+app = CompressionMiddleware(Starlette(routes=[Route(f"/api/{f.__name__}", f) for f in (big, small, pdf, ndjson)]))
+
+
+def get(path, encoding):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(path, headers={"Accept-Encoding": encoding})
+            return response, await response.aread()
+    return asyncio.run(main())
+
+
+def raw_chunks(path, encoding):
+    """Body messages exactly as the middleware sends them"""
+    sent = []
+
+    requested = []
+
+    async def receive():
+        if requested:
+            await asyncio.Event().wait()  # no disconnect: the client stays until the response ends
+        requested.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+             "headers": [(b"accept-encoding", encoding.encode())], "scheme": "http", "server": ("test", 80), "http_version": "1.1"}
+    asyncio.run(app(scope, receive, send))
+    return sent[0], [m.get("body", b"") for m in sent[1:] if m["type"] == "http.response.body"]
+
+
+class TestNegotiation:
+    """Coding picked from Accept-Encoding"""
+
+    def test_brotli_preferred(self):
+        response, _ = get("/api/big", "gzip, br")
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < len(BIG)
+        start, chunks = raw_chunks("/api/big", "gzip, br")
+        assert brotli.decompress(b"".join(chunks)) == BIG
+        print("SUCCESS: br chosen and decodable")
+
+    def test_gzip(self):
+        _, chunks = raw_chunks("/api/big", "gzip")
+        assert gzip.decompress(b"".join(chunks)) == BIG
+        response, body = get("/api/big", "gzip;q=1, br;q=0")
+        assert response.headers["content-encoding"] == "gzip" and body == BIG
+        print("SUCCESS: gzip when br is refused")
+
+    def test_identity(self):
+        response, body = get("/api/big", "identity")
+        assert "content-encoding" not in response.headers and body == BIG
+        assert response.headers["vary"] == "Accept-Encoding"
+        print("SUCCESS: Plain body, still Vary")
+
+    def test_small_and_excluded_untouched(self):
+        for path in ("/api/small", "/api/pdf"):
+            response, _ = get(path, "br")
+            assert "content-encoding" not in response.headers
+        print("SUCCESS: Small and PDF bodies sent as is")
+
+
+class TestStreaming:
+    """Streamed responses are flushed chunk by chunk"""
+
+    def test_every_chunk_decodes_on_arrival(self):
+        for encoding, decoder in (("br", lambda: brotli.Decompressor()), ("gzip", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS))):
+            start, chunks = raw_chunks("/api/ndjson", encoding)
+            headers = dict(start["headers"])
+            assert headers[b"content-encoding"] == encoding.encode() and b"content-length" not in headers
+            d = decoder()
+            decoded = [d.process(c) if encoding == "br" else d.decompress(c) for c in chunks]
+            assert decoded[:len(LINES)] == LINES
+        print("SUCCESS: Each streamed chunk readable as soon as it is sent")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -181,7 +181,38 @@ class TestCostsAPI:
         costs = response.json()
         assert all(c["category"] == "google" for c in costs)
         print("PASS: GET /api/costs filters by category")
-    
+
+    def test_get_costs_paginated(self):
+        """GET /api/costs with limit/cursor walks the month page by page"""
+        for i in range(5):
+            payload = {
+                "date": f"2026-03-0{i % 2 + 1}",
+                "shop_id": self.test_shop_id,
+                "category": "inne",
+                "amount": 10 + i,
+                "description": "TEST_pagination"
+            }
+            self.created_ids.append(self.session.post(f"{BASE_URL}/api/costs", json=payload).json()["id"])
+
+        params = {"shop_id": self.test_shop_id, "year": 2026, "month": 3}
+        full = self.session.get(f"{BASE_URL}/api/costs", params=params).json()
+        paged, cursor = [], None
+        while True:
+            page_params = {**params, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.session.get(f"{BASE_URL}/api/costs", params=page_params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page["items"]) <= 2
+            paged += page["items"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert [c["id"] for c in paged] == [c["id"] for c in full]
+
+        response = self.session.get(f"{BASE_URL}/api/costs", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+        print("PASS: GET /api/costs keyset pagination matches the unpaged list")
+
     def test_update_cost(self):
         """PUT /api/costs/{id} updates cost"""
         # Create
@@ -314,6 +345,18 @@ class TestCustomColumnsAPI:
         assert resp2.status_code == 400
         print("PASS: Duplicate column name returns 400")
     
+    def test_rename_to_existing_name_fails(self):
+        """PUT /api/custom-columns/{id} renaming to another column's name returns 400"""
+        first = self.session.post(f"{BASE_URL}/api/custom-columns", json={"name": "TEST_RenameA", "column_type": "expense", "color": "#888888"}).json()
+        second = self.session.post(f"{BASE_URL}/api/custom-columns", json={"name": "TEST_RenameB", "column_type": "expense", "color": "#888888"}).json()
+        self.created_ids += [first["id"], second["id"]]
+        
+        response = self.session.put(f"{BASE_URL}/api/custom-columns/{second['id']}", json={"name": "TEST_RenameA"})
+        assert response.status_code == 400
+        columns = {c["id"]: c["name"] for c in self.session.get(f"{BASE_URL}/api/custom-columns").json()}
+        assert columns[second["id"]] == "TEST_RenameB"
+        print("PASS: Rename to an existing name returns 400")
+    
     def test_update_custom_column(self):
         """PUT /api/custom-columns/{id} updates column"""
         # Create
@@ -0,0 +1,55 @@
+"""
+Unit tests for the date range helpers and normalization (dates.py)
+Tests: month / multi-month ranges, canonical YYYY-MM-DD normalization
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from dates import month_range, months_range, day_range, normalize
+
+
+class TestRanges:
+    """Range predicates used instead of $regex month prefixes"""
+
+    def test_month_range(self):
+        assert month_range(2025, 3) == {"$gte": "2025-03", "$lt": "2025-04"}
+        assert month_range(2025, 12) == {"$gte": "2025-12", "$lt": "2026-01"}
+        q = month_range(2025, 3)
+        assert all(q["$gte"] <= ds < q["$lt"] for ds in ["2025-03-01", "2025-03-31"])
+        assert not q["$gte"] <= "2025-04-01" < q["$lt"]
+        print("SUCCESS: month_range covers exactly one month")
+
+    def test_months_range(self):
+        assert months_range("2025-01", "2025-12") == {"$gte": "2025-01", "$lt": "2026-01"}
+        assert months_range(None, "2025-06") == {"$lt": "2025-07"}
+        assert months_range() == {}
+        print("SUCCESS: months_range is inclusive and open-ended")
+
+    def test_day_range(self):
+        assert day_range("2025-01-01", "2025-01-07") == {"$gte": "2025-01-01", "$lte": "2025-01-07"}
+        print("SUCCESS: day_range is inclusive")
+
+
+class TestNormalize:
+    """Canonical YYYY-MM-DD for legacy stored values"""
+
+    def test_normalize(self):
+        assert normalize("2025-01-05") == "2025-01-05"
+        assert normalize("2025-1-5") == "2025-01-05"
+        assert normalize("2025-02-01T10:00:00Z") == "2025-02-01"
+        assert normalize("2025-02-01 10:00") == "2025-02-01"
+        assert normalize(datetime(2025, 1, 31, 23, 59)) == "2025-01-31"
+        assert normalize(date(2025, 1, 31)) == "2025-01-31"
+        print("SUCCESS: legacy formats normalized")
+
+    def test_unreadable(self):
+        for value in ["garbage", "2025-02-30", "", None, 20250101]:
+            assert normalize(value) is None
+        print("SUCCESS: unreadable dates rejected")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
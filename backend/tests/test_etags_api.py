@@ -0,0 +1,65 @@
+"""
+Backend API tests for conditional GET
+Tests: ETag on list / stats endpoints, 304 on If-None-Match, invalidation by writes
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+if not BASE_URL:
+    BASE_URL = "https://business-panel-2.preview.emergentagent.com"
+
+
+class TestConditionalGet:
+    """ETag / If-None-Match on read endpoints"""
+
+    def test_unchanged_list_returns_304(self):
+        """Second GET with the returned tag is answered with an empty 304"""
+        first = requests.get(f"{BASE_URL}/api/custom-columns")
+        assert first.status_code == 200
+        etag = first.headers.get("ETag")
+        assert etag and etag.startswith('"')
+
+        second = requests.get(f"{BASE_URL}/api/custom-columns", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers.get("ETag") == etag
+        print("SUCCESS: 304 for unchanged custom columns")
+
+    def test_write_to_same_collection_invalidates(self):
+        """Creating a reminder changes the /reminders tag; a product write does not"""
+        etag = requests.get(f"{BASE_URL}/api/reminders").headers["ETag"]
+
+        created = requests.post(f"{BASE_URL}/api/products", json={"name": "TEST_ETAG_product", "price": 1, "shop_id": 1})
+        assert created.status_code == 200
+        product = created.json()
+        assert requests.get(f"{BASE_URL}/api/reminders", headers={"If-None-Match": etag}).status_code == 304
+
+        reminder = requests.post(f"{BASE_URL}/api/reminders", json={"title": "TEST_ETAG_reminder", "date": "2026-01-15"}).json()
+        response = requests.get(f"{BASE_URL}/api/reminders", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+        requests.delete(f"{BASE_URL}/api/reminders/{reminder['id']}")
+        requests.delete(f"{BASE_URL}/api/products/{product['id']}")
+        print("SUCCESS: Tags follow per-collection writes")
+
+    def test_stats_tag_depends_on_params_and_ledgers(self):
+        """Stats tags differ per month and change after an income write"""
+        params = {"year": 2026, "month": 1}
+        etag = requests.get(f"{BASE_URL}/api/combined-monthly-stats", params=params).headers["ETag"]
+        other = requests.get(f"{BASE_URL}/api/combined-monthly-stats", params={"year": 2026, "month": 2}).headers["ETag"]
+        assert etag != other
+        assert requests.get(f"{BASE_URL}/api/combined-monthly-stats", params=params, headers={"If-None-Match": etag}).status_code == 304
+
+        income = requests.post(f"{BASE_URL}/api/incomes", json={"amount": 10, "date": "2026-01-15", "description": "TEST_ETAG_income", "shop_id": 1}).json()
+        response = requests.get(f"{BASE_URL}/api/combined-monthly-stats", params=params, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+        requests.delete(f"{BASE_URL}/api/incomes/{income['id']}")
+        print("SUCCESS: Stats tags invalidated by ledger writes")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
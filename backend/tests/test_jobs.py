@@ -0,0 +1,169 @@
+"""
+Tests for background sync jobs (jobs.JobTracker)
+Tests: progress persisted, dedupe, SSE events, failures and cancellation end as done, abandoned jobs reported failed
+"""
+import asyncio
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import jobs
+from jobs import JobTracker
+from mongo_db import with_db
+
+
+async def finish(tracker):
+    await asyncio.gather(*tracker._tasks)
+
+
+class TestJobTracker:
+    """Tests for job lifecycle and persistence"""
+
+    def test_progress_and_result_persisted(self):
+        async def test(db):
+            tracker = JobTracker(db, flush_interval=0)
+            job, created = await tracker.create("shopify", {"year": 2025, "month": 1}, ["shopify:1"])
+
+            async def sync(progress):
+                for _ in range(3):
+                    progress.page(250)
+                progress.rows(28)
+                return {"status": "ok", "orders": 750}
+
+            tracker.start(job, lambda job: tracker.run_connector(job, "shopify:1", sync))
+            await finish(tracker)
+            return created, await db.sync_runs.find_one({"id": job["id"]}, {"_id": 0}), await tracker.get(job["id"]), tracker
+
+        created, doc, got, tracker = with_db(test)
+        assert created and doc["status"] == "done" and doc["finished_at"]
+        assert doc["result"]["orders"] == 750 and doc["result"]["duration_ms"] >= 0
+        assert doc["connectors"][0] | {"duration_ms": 0} == {"key": "shopify:1", "state": "ok", "pages": 3, "orders": 750, "rows": 28, "duration_ms": 0, "detail": None}
+        assert doc["owner"] == tracker.owner and doc["heartbeat_at"]
+        assert "expires_at" not in got and got["status"] == "done"
+        assert tracker.metrics() == {"running": 0, "created": 1, "deduplicated": 0}
+        print("SUCCESS: Job progress and result stored")
+
+    def test_dedupe_while_running(self):
+        async def test(db):
+            tracker = JobTracker(db)
+            release = asyncio.Event()
+            first, _ = await tracker.create("all", {"year": 2025}, [], dedupe_key=("all", 2025))
+
+            async def work(job):
+                await release.wait()
+                return {}
+
+            tracker.start(first, work)
+            second, created = await tracker.create("all", {"year": 2025}, [], dedupe_key=("all", 2025))
+            release.set()
+            await finish(tracker)
+            third, created_after = await tracker.create("all", {"year": 2025}, [], dedupe_key=("all", 2025))
+            return first, second, created, third, created_after, tracker.metrics()
+
+        first, second, created, third, created_after, m = with_db(test)
+        assert second["id"] == first["id"] and not created
+        assert third["id"] != first["id"] and created_after
+        assert m["deduplicated"] == 1
+        print("SUCCESS: Repeated job joins the running one")
+
+    def test_events_until_done(self):
+        async def test(db):
+            tracker = JobTracker(db)
+            job, _ = await tracker.create("tiktok", {}, ["tiktok:a"])
+            step = asyncio.Event()
+
+            async def sync(progress):
+                await step.wait()
+                progress.page(10)
+                return {"status": "ok"}
+
+            tracker.start(job, lambda job: tracker.run_connector(job, "tiktok:a", sync))
+            seen = []
+            async for snap in tracker.events(job["id"]):
+                seen.append((snap["status"], snap["connectors"][0]["state"], snap["connectors"][0]["pages"]))
+                step.set()
+            return seen
+
+        seen = with_db(test)
+        assert seen[-1] == ("done", "ok", 1)
+        assert seen[0][0] in ("queued", "running") and len(seen) >= 2
+        print(f"SUCCESS: {len(seen)} events, last one done")
+
+    def test_failure_ends_as_done(self):
+        async def test(db):
+            tracker = JobTracker(db)
+            job, _ = await tracker.create("all", {}, [])
+
+            async def work(job):
+                raise RuntimeError("boom")
+
+            tracker.start(job, work)
+            await finish(tracker)
+            return await db.sync_runs.find_one({"id": job["id"]}, {"_id": 0})
+
+        doc = with_db(test)
+        assert doc["status"] == "done" and doc["result"] == {"status": "error", "detail": "boom"}
+        print("SUCCESS: Failed job recorded")
+
+    def test_cancelled_job_recorded(self):
+        async def test(db):
+            tracker = JobTracker(db)
+            job, _ = await tracker.create("shopify", {}, ["shopify:1", "shopify:2"])
+
+            async def sync(progress):
+                await asyncio.sleep(3600)
+
+            tracker.start(job, lambda job: tracker.run_connector(job, "shopify:1", sync))
+            await asyncio.sleep(0.05)
+            await tracker.stop()
+            return await db.sync_runs.find_one({"id": job["id"]}, {"_id": 0}), tracker.metrics()
+
+        doc, m = with_db(test)
+        assert doc["status"] == "done" and doc["result"]["detail"] == jobs.ABANDONED
+        assert [c["state"] for c in doc["connectors"]] == ["error", "error"]
+        assert m["running"] == 0
+        print("SUCCESS: Shutdown leaves no job running")
+
+    def test_abandoned_job_reported_failed(self):
+        async def test(db):
+            tracker = JobTracker(db)
+            old = (datetime.now(timezone.utc) - timedelta(seconds=jobs.STALE + 5)).isoformat()
+            fresh = datetime.now(timezone.utc).isoformat()
+            for jid, beat in (("dead", old), ("alive", fresh)):
+                await db.sync_runs.insert_one({
+                    "id": jid, "kind": "shopify", "status": "running", "owner": "gone:1", "heartbeat_at": beat, "created_at": old,
+                    "connectors": [{"key": "shopify:1", "state": "running", "pages": 2}], "result": None})
+            return await tracker.get("dead"), await tracker.get("alive"), await db.sync_runs.find_one({"id": "dead"}, {"_id": 0})
+
+        dead, alive, stored = with_db(test)
+        assert dead["status"] == "done" and dead["result"]["detail"] == jobs.ABANDONED
+        assert dead["connectors"][0]["state"] == "error"
+        assert stored["status"] == "done"
+        assert alive["status"] == "running"
+        print("SUCCESS: A job without heartbeat reads as failed")
+
+    def test_progress_saves_never_land_after_done(self):
+        async def test(db):
+            tracker = JobTracker(db, flush_interval=0)
+            job, _ = await tracker.create("shopify", {}, ["shopify:1"])
+
+            async def sync(progress):
+                for _ in range(50):
+                    progress.page(1)  # each schedules a save that may still be pending at the end
+                return {"status": "ok"}
+
+            tracker.start(job, lambda job: tracker.run_connector(job, "shopify:1", sync))
+            await finish(tracker)
+            await asyncio.sleep(0.05)
+            return await db.sync_runs.find_one({"id": job["id"]}, {"_id": 0})
+
+        doc = with_db(test)
+        assert doc["status"] == "done" and doc["connectors"][0]["pages"] == 50 and doc["connectors"][0]["state"] == "ok"
+        print("SUCCESS: Final state is the last write")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
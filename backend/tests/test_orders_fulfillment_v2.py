@@ -8,6 +8,7 @@ Tests new features:
 import pytest
 import requests
 import os
+import json
 from datetime import datetime
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
@@ -62,6 +63,26 @@ class TestOrderStatusUpdate:
         assert response.status_code == 404
 
 
+class TestOrdersNdjson:
+    """Test streaming orders export (?format=ndjson)"""
+
+    def test_orders_ndjson_matches_json_list(self):
+        """NDJSON stream holds the same orders, in the same order, as the JSON list"""
+        month = datetime.now().strftime("%Y-%m")
+        params = {"year": int(month[:4]), "month": int(month[5:])}
+        response = requests.get(f"{BASE_URL}/api/orders", params={**params, "format": "ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines() if line]
+        listed = requests.get(f"{BASE_URL}/api/orders", params=params).json()
+        assert [r["id"] for r in rows] == [o["id"] for o in listed]
+
+    def test_unknown_format_rejected(self):
+        """Only json and ndjson formats are accepted"""
+        response = requests.get(f"{BASE_URL}/api/orders", params={"format": "xml"})
+        assert response.status_code == 422
+
+
 class TestFulfillmentNotes:
     """Test fulfillment notes CRUD operations"""
     
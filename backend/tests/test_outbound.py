@@ -0,0 +1,71 @@
+"""
+Tests for the shared outbound HTTP client (outbound.OutboundClient) against the local Shopify stub
+Tests: keep-alive reuse across requests, per-host metrics, close/reopen
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import shopify
+from outbound import OutboundClient
+from shopify_stub import ShopifyStub, make_orders
+
+PARAMS = {"status": "any", "financial_status": "paid"}
+
+
+class TestOutboundClient:
+    """Tests for connection pooling"""
+
+    def test_connection_reused_across_syncs(self):
+        async def run(stub):
+            out = OutboundClient()
+            out.start()
+            for _ in range(3):
+                daily, count = await shopify.daily_totals(out, stub.url, "test-token", PARAMS)
+                assert count == 617
+            m = out.metrics()
+            await out.close()
+            return m
+
+        with ShopifyStub(make_orders(617)) as stub:
+            m = asyncio.run(run(stub))
+        assert m["requests"] == 9
+        assert m["connections_opened"] == 1
+        assert m["reuse_rate"] == round(1 - 1 / 9, 4)
+        host = stub.url.split("://")[1]
+        assert m["by_host"][host] == {"requests": 9, "connections": 1, "in_flight": 0, "retried": 0, "throttled": 0}
+        print("SUCCESS: 9 requests over 1 connection")
+
+    def test_close_and_lazy_reopen(self):
+        async def run(stub):
+            out = OutboundClient(per_host=2)
+            await out.get(stub.url + "/admin/api/2024-10/orders.json", headers={"X-Shopify-Access-Token": "test-token"})
+            opened = out.metrics()["open"]
+            await out.close()
+            closed = out.metrics()["open"]
+            resp = await out.get(stub.url + "/admin/api/2024-10/orders.json", headers={"X-Shopify-Access-Token": "test-token"})
+            await out.close()
+            return opened, closed, resp.status_code, out.metrics()
+
+        with ShopifyStub(make_orders(3)) as stub:
+            opened, closed, status, m = asyncio.run(run(stub))
+        assert opened and not closed and status == 200
+        assert m["per_host"] == 2 and m["connections_opened"] == 2
+        print("SUCCESS: Client closes and reopens")
+
+    def test_http2_needs_h2(self):
+        try:
+            import h2  # noqa: F401
+            has_h2 = True
+        except ImportError:
+            has_h2 = False
+        assert OutboundClient(http2=True).http2 == has_h2
+        assert OutboundClient().http2 is False
+        print("SUCCESS: HTTP/2 only with h2 installed")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,94 @@
+"""
+Backend API tests for arbitrary-range stats
+Tests: /api/range-stats (group_by day / week / month, shop filter, validation)
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+if not BASE_URL:
+    BASE_URL = "https://business-panel-2.preview.emergentagent.com"
+
+TEST_PREFIX = "TEST_RANGE_"
+
+
+@pytest.fixture
+def ledger_rows():
+    """Two incomes in different months plus one tiktok cost"""
+    created = []
+    for date, amount in [("2025-01-15", 400), ("2025-03-02", 600)]:
+        resp = requests.post(f"{BASE_URL}/api/incomes", json={
+            "amount": amount, "date": date, "description": f"{TEST_PREFIX}income", "shop_id": 4
+        })
+        created.append(("incomes", resp.json()["id"]))
+    resp = requests.post(f"{BASE_URL}/api/costs", json={
+        "date": "2025-03-02", "shop_id": 4, "category": "tiktok", "amount": 50, "description": f"{TEST_PREFIX}cost"
+    })
+    created.append(("costs", resp.json()["id"]))
+    yield
+    for kind, item_id in created:
+        requests.delete(f"{BASE_URL}/api/{kind}/{item_id}")
+
+
+class TestRangeStatsAPI:
+    """Tests for /api/range-stats"""
+
+    def test_monthly_series(self, ledger_rows):
+        """Test group_by=month returns one slot per month in range"""
+        response = requests.get(f"{BASE_URL}/api/range-stats", params={
+            "from": "2025-01-01", "to": "2025-03-31", "group_by": "month", "shop_id": 4
+        })
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+
+        data = response.json()
+        series = data["series"]
+        assert series["periods"] == ["2025-01", "2025-02", "2025-03"]
+        assert series["income"][0] >= 400
+        assert series["income"][2] >= 600
+        assert series["tiktok_ads"][2] >= 50
+        for key in ["netto", "profit", "profit_pp", "ads_total", "zwroty", "custom_costs"]:
+            assert key in series
+        assert data["totals"]["total_income"] >= 1000
+        print("SUCCESS: Monthly range series")
+
+    def test_daily_and_weekly_series_lengths(self, ledger_rows):
+        """Test day/week grouping covers the whole range"""
+        days = requests.get(f"{BASE_URL}/api/range-stats", params={
+            "from": "2025-01-01", "to": "2025-01-31", "group_by": "day"
+        }).json()
+        assert len(days["series"]["periods"]) == 31
+        assert days["series"]["periods"][14] == "2025-01-15"
+
+        weeks = requests.get(f"{BASE_URL}/api/range-stats", params={
+            "from": "2025-01-01", "to": "2025-01-31", "group_by": "week"
+        }).json()
+        assert weeks["series"]["periods"][0] == "2025-W01"
+        assert weeks["series"]["periods"][-1] == "2025-W05"
+        print("SUCCESS: Daily / weekly series lengths")
+
+    def test_invalid_params(self):
+        """Test validation of group_by and dates"""
+        resp = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "2025-01-01", "to": "2025-01-31", "group_by": "year"})
+        assert resp.status_code == 400
+        resp = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "2025-02-01", "to": "2025-01-01"})
+        assert resp.status_code == 400
+        resp = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "styczen", "to": "2025-01-01"})
+        assert resp.status_code == 400
+        resp = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "1900-01-01", "to": "2025-01-01", "group_by": "day"})
+        assert resp.status_code == 400
+        print("SUCCESS: Invalid params rejected")
+
+    def test_unpadded_dates(self, ledger_rows):
+        """Dates without leading zeros are read as the same days"""
+        padded = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "2025-01-01", "to": "2025-03-31", "shop_id": 4}).json()
+        loose = requests.get(f"{BASE_URL}/api/range-stats", params={"from": "2025-1-1", "to": "2025-3-31", "shop_id": 4})
+        assert loose.status_code == 200
+        data = loose.json()
+        assert data["from"] == "2025-01-01" and data["to"] == "2025-03-31"
+        assert data["series"] == padded["series"]
+        print("SUCCESS: Unpadded dates normalized")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,135 @@
+"""
+Tests for the rate-limit-aware outbound client (ratelimit.py, OutboundClient retries) against the local Shopify stub
+Tests: token bucket pacing, call-limit / Retry-After parsing, jittered backoff, 429 / 5xx retries, concurrent syncs under a leaky bucket
+"""
+import asyncio
+import time
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import ratelimit
+import shopify
+from outbound import OutboundClient
+from shopify_stub import ShopifyStub, make_orders
+
+PARAMS = {"status": "any", "financial_status": "paid"}
+
+
+class TestTokenBucket:
+    """Tests for the per-host bucket"""
+
+    def test_paces_after_burst(self):
+        async def run():
+            bucket = ratelimit.TokenBucket(capacity=3, rate=20)
+            t0 = time.monotonic()
+            for _ in range(7):
+                await bucket.acquire()
+            return time.monotonic() - t0
+
+        elapsed = asyncio.run(run())
+        # 3 immediately, then 4 more at 20/s
+        assert 0.18 <= elapsed < 0.5
+        print(f"SUCCESS: 7 tokens in {elapsed:.2f}s")
+
+    def test_server_count_wins(self):
+        bucket = ratelimit.TokenBucket(capacity=40, rate=2)
+        bucket.observe(38, 40)
+        assert bucket.tokens <= 2.1
+        bucket.observe(0, 80, pending=79)
+        assert bucket.capacity == 80 and bucket.tokens <= 1.1
+        print("SUCCESS: Bucket never holds more than the server reports left")
+
+    def test_pause_holds_waiters(self):
+        async def run():
+            bucket = ratelimit.TokenBucket(capacity=10, rate=100)
+            bucket.pause(0.2)
+            t0 = time.monotonic()
+            await bucket.acquire()
+            return time.monotonic() - t0
+
+        assert asyncio.run(run()) >= 0.19
+        print("SUCCESS: Retry-After pauses the bucket")
+
+
+class TestHeaders:
+    """Tests for header parsing and backoff"""
+
+    def test_call_limit(self):
+        assert ratelimit.call_limit({"x-shopify-shop-api-call-limit": "32/40"}) == (32, 40)
+        assert ratelimit.call_limit({}) is None
+        assert ratelimit.call_limit({"x-shopify-shop-api-call-limit": "junk"}) is None
+        print("SUCCESS: Call-limit header")
+
+    def test_retry_after(self):
+        assert ratelimit.retry_after({"retry-after": "2.0"}) == 2.0
+        assert ratelimit.retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+        assert ratelimit.retry_after({"retry-after": "soon"}) is None
+        assert ratelimit.retry_after({}) is None
+        print("SUCCESS: Retry-After seconds and dates")
+
+    def test_backoff_jittered_and_capped(self):
+        delays = [ratelimit.backoff(6, 0.5, 8) for _ in range(200)]
+        assert all(0 <= d <= 8 for d in delays)
+        assert len(set(delays)) > 100
+        assert all(ratelimit.backoff(0, 0.5, 8) <= 0.5 for _ in range(50))
+        print("SUCCESS: Full-jitter backoff within the cap")
+
+
+class TestRetries:
+    """Tests for OutboundClient retrying against the stub"""
+
+    def fetch(self, stub, out, stores=1):
+        async def run():
+            results = await asyncio.gather(*[shopify.daily_totals(out, stub.url, "test-token", PARAMS) for _ in range(stores)])
+            await out.close()
+            return results
+        return asyncio.run(run())
+
+    def test_transient_5xx_retried(self):
+        out = OutboundClient(backoff_base=0.01)
+        with ShopifyStub(make_orders(600), fail_page=1, fail_status=503, fail_times=2) as stub:
+            [(daily, count)] = self.fetch(stub, out)
+        assert count == 600
+        assert out.metrics()["retried"] == 2
+        print("SUCCESS: 503 retried until the page loads")
+
+    def test_gives_up_after_retries(self):
+        out = OutboundClient(retries=2, backoff_base=0.01)
+        with ShopifyStub(make_orders(600), fail_page=1, fail_status=503) as stub:
+            with pytest.raises(shopify.ShopifyError) as exc:
+                self.fetch(stub, out)
+        assert exc.value.status_code == 503
+        assert len(stub.requests) == 4  # page 0, then page 1 three times
+        print("SUCCESS: Last error surfaced once retries run out")
+
+    def test_retry_after_honoured(self):
+        # the client assumes a much faster leak than the store's 5/s, so its second page is refused and told to wait
+        out = OutboundClient(backoff_base=0.01, leak_rate=100)
+        with ShopifyStub(make_orders(300), bucket=(1, 5), retry_after="0.3") as stub:
+            t0 = time.monotonic()
+            [(daily, count)] = self.fetch(stub, out)
+            elapsed = time.monotonic() - t0
+        assert count == 300
+        assert stub.throttled == 1 and out.metrics()["throttled"] == 1
+        assert elapsed >= 0.3
+        print(f"SUCCESS: Waited {elapsed:.2f}s after a 429")
+
+    def test_concurrent_syncs_stay_under_limit(self):
+        out = OutboundClient(leak_rate=40)
+        orders = make_orders(1500)
+        # 4 syncs of 6 pages each against one store with room for 4 calls, leaking 40/s
+        with ShopifyStub(orders, bucket=(4, 40), retry_after="0.5") as stub:
+            results = self.fetch(stub, out, stores=4)
+        assert [count for _, count in results] == [1500] * 4
+        host = stub.url.split("://")[1]
+        m = out.metrics()["by_host"][host]
+        assert m["bucket"] == "4@40/s"
+        assert stub.throttled == 0 and m["throttled"] == 0
+        print(f"SUCCESS: 24 pages, 0 throttled, waited {m['waited_s']}s")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,76 @@
+"""
+Tests for the reference data cache (refdata.RefCache)
+Tests: a change made through another worker is served as soon as a request's ETag stamp shows it
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from etags import CollectionVersions, request_stamp
+from refdata import RefCache
+from mongo_db import with_db
+
+
+def worker(db):
+    cache = RefCache(db, check_interval=3600, current_stamp=request_stamp.get)
+    cache.register("shops", lambda: db.shops.find({}, {"_id": 0}).sort("id", 1).to_list(100))
+    return cache
+
+
+async def names(cache):
+    return [s["name"] for s in await cache.get("shops")]
+
+
+class TestTwoWorkers:
+    """Two RefCache instances on one database, as two server processes"""
+
+    def test_request_stamp_forces_refresh(self):
+        async def test(db):
+            versions = CollectionVersions(db)
+            a, b = worker(db), worker(db)
+            await db.shops.insert_one({"id": 1, "name": "Sklep 1"})
+            token = request_stamp.set(await versions.read())
+            before = await names(b)
+            request_stamp.reset(token)
+
+            # worker A handles POST /shops: endpoint bumps refdata, middleware bumps the collection counter
+            await db.shops.insert_one({"id": 2, "name": "Sklep 2"})
+            await a.bump("shops")
+            await versions.bump(["shops"])
+
+            outside_request = await names(b)  # no stamp: waits for check_interval
+            token = request_stamp.set(await versions.read())
+            in_request = await names(b)
+            again = await names(b)
+            request_stamp.reset(token)
+            return before, outside_request, in_request, again, b.metrics()
+
+        before, outside_request, in_request, again, m = with_db(test)
+        assert before == ["Sklep 1"]
+        assert outside_request == ["Sklep 1"]
+        assert in_request == ["Sklep 1", "Sklep 2"] and again == in_request
+        assert m["stamp_reads"] == 2 and m["loads"] == 2
+        print("SUCCESS: Body follows the tag's counters in the other worker")
+
+    def test_unrelated_write_no_extra_read(self):
+        async def test(db):
+            versions = CollectionVersions(db)
+            b = worker(db)
+            token = request_stamp.set(await versions.read())
+            await names(b)
+            request_stamp.reset(token)
+            await versions.bump(["incomes"])
+            token = request_stamp.set(await versions.read())
+            await names(b)
+            request_stamp.reset(token)
+            return b.metrics()
+
+        m = with_db(test)
+        assert m["stamp_reads"] == 1 and m["hits"] == 1
+        print("SUCCESS: Writes to other collections do not refresh reference data")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
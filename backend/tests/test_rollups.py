@@ -0,0 +1,58 @@
+"""
+Tests for the daily rollups (rollups.py)
+Tests: incremental writes and rebuild bucket rows without a category or shop the same way, so verify finds no drift
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import rollups
+from mongo_db import with_db
+
+COSTS = [
+    {"id": "c1", "shop_id": 2, "date": "2025-01-05", "amount": 10, "category": ""},
+    {"id": "c2", "shop_id": 2, "date": "2025-01-05", "amount": 20, "category": None},
+    {"id": "c3", "shop_id": 2, "date": "2025-01-05", "amount": 30},
+    {"id": "c4", "shop_id": 2, "date": "2025-01-05", "amount": 40, "category": "inne"},
+    {"id": "c5", "shop_id": 2, "date": "2025-01-05", "amount": 5, "category": "meta"},
+    {"id": "c6", "shop_id": None, "date": "2025-01-06", "amount": 7, "category": "meta"},
+]
+
+
+class TestCategoryRule:
+    """Same bucket from record_insert and from rebuild"""
+
+    def test_no_drift_for_empty_category(self):
+        async def test(db):
+            for doc in COSTS:
+                await db.costs.insert_one(dict(doc))
+                await rollups.record_insert(db, "costs", doc)
+            verified = await rollups.rebuild(db, "2025-01", "2025-01", apply=False)
+            buckets = await db.daily_rollups.find({}, {"_id": 0}).to_list(None)
+            return verified, buckets
+
+        verified, buckets = with_db(test)
+        assert verified["drift"] == []
+        by_key = {(b["shop_id"], b["category"]): (b["amount"], b["count"]) for b in buckets}
+        assert by_key == {(2, "inne"): (100, 4), (2, "meta"): (5, 1), (1, "meta"): (7, 1)}
+        print("SUCCESS: Empty, null and missing categories all land in inne")
+
+    def test_rebuild_keeps_buckets(self):
+        async def test(db):
+            for doc in COSTS:
+                await db.costs.insert_one(dict(doc))
+                await rollups.record_insert(db, "costs", doc)
+            before = await db.daily_rollups.find({}, {"_id": 0}).sort([("shop_id", 1), ("category", 1)]).to_list(None)
+            await rollups.rebuild(db, "2025-01", "2025-01")
+            after = await db.daily_rollups.find({}, {"_id": 0}).sort([("shop_id", 1), ("category", 1)]).to_list(None)
+            return before, after
+
+        before, after = with_db(test)
+        assert before == after
+        print("SUCCESS: Rebuild leaves incrementally kept buckets as they are")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
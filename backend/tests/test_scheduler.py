@@ -0,0 +1,202 @@
+"""
+Tests for the sync scheduler (scheduler.SyncScheduler)
+Tests: job documents follow the configs, lease exclusion and expiry, run bookkeeping, lease released on stop,
+a manual sync takes the lease of a scheduled connector and hands it back
+"""
+import asyncio
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from scheduler import SyncScheduler
+from mongo_db import with_db
+
+
+def iso(dt):
+    return dt.isoformat()
+
+
+async def no_jobs():
+    return []
+
+
+async def no_run(kind, ref):
+    return {"status": "ok"}
+
+
+def specs(*jobs):
+    async def list_jobs():
+        return [{"id": f"{kind}:{ref}", "kind": kind, "ref": ref, "interval_minutes": minutes} for kind, ref, minutes in jobs]
+    return list_jobs
+
+
+class TestRefreshJobs:
+    """Job documents created, retimed and dropped with the configs"""
+
+    def test_create_retime_and_remove(self):
+        async def test(db):
+            now = datetime.now(timezone.utc)
+            configs = [("shopify", 1, 60), ("tiktok", "a", 30), ("shopify", 2, 0)]
+            sched = SyncScheduler(db, lambda: specs(*configs)(), no_run)
+            await sched.refresh_jobs(now)
+            created = {j["id"]: j for j in await db.sync_jobs.find({}, {"_id": 0}).to_list(None)}
+
+            last = now - timedelta(minutes=10)
+            await db.sync_jobs.update_one({"id": "shopify:1"}, {"$set": {"last_run_at": iso(last), "runs": 5}})
+            configs[:] = [("shopify", 1, 15)]
+            await sched.refresh_jobs(now)
+            after = {j["id"]: j for j in await db.sync_jobs.find({}, {"_id": 0}).to_list(None)}
+            return now, last, created, after
+
+        now, last, created, after = with_db(test)
+        assert set(created) == {"shopify:1", "tiktok:a"}  # interval 0: manual only, never scheduled
+        assert created["shopify:1"]["next_run_at"] == iso(now) and created["shopify:1"]["locked_until"] is None
+        assert created["tiktok:a"] | {"next_run_at": None} == {
+            "id": "tiktok:a", "kind": "tiktok", "ref": "a", "interval_minutes": 30, "next_run_at": None,
+            "locked_until": None, "runs": 0, "failures": 0, "history": []}
+        assert set(after) == {"shopify:1"}
+        assert after["shopify:1"]["interval_minutes"] == 15 and after["shopify:1"]["runs"] == 5
+        assert after["shopify:1"]["next_run_at"] == iso(last + timedelta(minutes=15))
+        print("SUCCESS: Jobs follow configs; retimed from the last run")
+
+
+class TestClaim:
+    """Lease taken by one claim at a time"""
+
+    def test_exclusion_due_and_expiry(self):
+        async def test(db):
+            now = datetime.now(timezone.utc)
+            a = SyncScheduler(db, no_jobs, no_run, lease=60)
+            b = SyncScheduler(db, no_jobs, no_run, lease=60)
+            b.owner = "other:1"
+            await db.sync_jobs.insert_many([
+                {"id": "shopify:1", "next_run_at": iso(now), "locked_until": None},
+                {"id": "shopify:2", "next_run_at": iso(now + timedelta(minutes=5)), "locked_until": None},
+            ])
+            first = await a._claim("shopify:1", now)
+            second = await b._claim("shopify:1", now)
+            not_due = await a._claim("shopify:2", now)
+            after_expiry = await b._claim("shopify:1", now + timedelta(seconds=61))
+            return first, second, not_due, after_expiry, await db.sync_jobs.find_one({"id": "shopify:1"}, {"_id": 0})
+
+        first, second, not_due, after_expiry, doc = with_db(test)
+        assert first is not None and second is None and not_due is None
+        assert after_expiry is not None and doc["owner"] == "other:1"
+        print("SUCCESS: One claim per lease; expired lease taken over")
+
+
+class TestRun:
+    """run_due starts claimed jobs and records their runs"""
+
+    def test_bookkeeping(self):
+        async def test(db):
+            results = {"shopify": {"status": "ok", "orders": 3}, "tiktok": {"status": "error", "detail": "TikTok HTTP 500"}}
+            calls = []
+
+            async def run_job(kind, ref):
+                calls.append((kind, ref))
+                return results[kind]
+
+            sched = SyncScheduler(db, specs(("shopify", 1, 60), ("tiktok", "a", 30)), run_job)
+            await asyncio.gather(*await sched.run_due())
+            again = await sched.run_due()  # nothing due until the interval passes
+            jobs = {j["id"]: j for j in await db.sync_jobs.find({}, {"_id": 0}).to_list(None)}
+            return calls, again, jobs
+
+        calls, again, jobs = with_db(test)
+        assert sorted(calls) == [("shopify", 1), ("tiktok", "a")] and again == []
+        ok, failed = jobs["shopify:1"], jobs["tiktok:a"]
+        assert ok["runs"] == 1 and ok["failures"] == 0 and ok["last_status"] == "ok" and ok["last_result"]["orders"] == 3
+        assert ok["locked_until"] is None
+        assert datetime.fromisoformat(ok["next_run_at"]) - datetime.fromisoformat(ok["last_run_at"]) >= timedelta(minutes=60)
+        assert failed["runs"] == 1 and failed["failures"] == 1 and failed["history"][0]["detail"] == "TikTok HTTP 500"
+        assert len(failed["history"]) == 1 and failed["history"][0]["duration_ms"] >= 0
+        print("SUCCESS: Runs, failures, history and next run recorded")
+
+    def test_exception_recorded_as_error(self):
+        async def test(db):
+            async def run_job(kind, ref):
+                raise RuntimeError("boom")
+
+            sched = SyncScheduler(db, specs(("shopify", 1, 60)), run_job)
+            await asyncio.gather(*await sched.run_due())
+            return await db.sync_jobs.find_one({"id": "shopify:1"}, {"_id": 0})
+
+        job = with_db(test)
+        assert job["last_status"] == "error" and job["last_result"]["detail"] == "boom" and job["locked_until"] is None
+        print("SUCCESS: Exception becomes a failed run")
+
+    def test_stop_releases_lease(self):
+        async def test(db):
+            started = asyncio.Event()
+
+            async def run_job(kind, ref):
+                started.set()
+                await asyncio.sleep(3600)
+
+            sched = SyncScheduler(db, specs(("shopify", 1, 60)), run_job)
+            await sched.run_due()
+            await started.wait()
+            held = await db.sync_jobs.find_one({"id": "shopify:1"}, {"_id": 0})
+            await sched.stop()
+            return held, await db.sync_jobs.find_one({"id": "shopify:1"}, {"_id": 0})
+
+        held, after = with_db(test)
+        assert held["locked_until"] is not None
+        assert after["locked_until"] is None and after["runs"] == 0
+        print("SUCCESS: Stopped run hands its lease back")
+
+
+class TestManualLease:
+    """acquire / release outside the schedule"""
+
+    def test_acquire_free_held_and_unscheduled(self):
+        async def test(db):
+            sched = SyncScheduler(db, no_jobs, no_run)
+            later = iso(datetime.now(timezone.utc) + timedelta(hours=1))
+            await db.sync_jobs.insert_one({"id": "shopify:1", "next_run_at": later, "locked_until": None})
+            first = await sched.acquire("shopify:1", "manual-a")
+            second = await sched.acquire("shopify:1", "manual-b")
+            unscheduled = await sched.acquire("tiktok:x", "manual-a")
+            return first, second, unscheduled, await db.sync_jobs.find_one({"id": "shopify:1"}, {"_id": 0})
+
+        first, second, unscheduled, doc = with_db(test)
+        assert first is True and second is False and unscheduled is None
+        assert doc["owner"] == "manual-a" and doc["locked_until"]
+        assert doc["next_run_at"] > iso(datetime.now(timezone.utc))  # taken although not due
+        print("SUCCESS: Manual lease taken once, regardless of next_run_at")
+
+    def test_release_only_own_lease(self):
+        async def test(db):
+            sched = SyncScheduler(db, no_jobs, no_run)
+            await db.sync_jobs.insert_one({"id": "tiktok:a", "next_run_at": iso(datetime.now(timezone.utc)), "locked_until": None})
+            await sched.acquire("tiktok:a", "manual-a")
+            await sched.release("tiktok:a", "someone-else")
+            kept = await db.sync_jobs.find_one({"id": "tiktok:a"}, {"_id": 0})
+            await sched.release("tiktok:a", "manual-a")
+            freed = await db.sync_jobs.find_one({"id": "tiktok:a"}, {"_id": 0})
+            claimed = await sched._claim("tiktok:a", datetime.now(timezone.utc))
+            return kept, freed, claimed
+
+        kept, freed, claimed = with_db(test)
+        assert kept["locked_until"] is not None
+        assert freed["locked_until"] is None
+        assert claimed is not None
+        print("SUCCESS: Released lease lets the scheduler claim the job")
+
+    def test_expired_lease_can_be_taken(self):
+        async def test(db):
+            sched = SyncScheduler(db, no_jobs, no_run)
+            past = iso(datetime.now(timezone.utc) - timedelta(minutes=1))
+            await db.sync_jobs.insert_one({"id": "shopify:2", "next_run_at": past, "locked_until": past, "owner": "dead"})
+            return await sched.acquire("shopify:2", "manual-a")
+
+        assert with_db(test) is True
+        print("SUCCESS: Expired lease taken over")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,177 @@
+"""
+Tests for mapping Shopify orders into the orders pipeline (shopify_orders.py)
+Tests: order fields, discounts, stable document ids, sales records per line item / shipping, unpaid and cancelled orders,
+re-importing a page into the database
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import shopify_orders
+from mongo_db import with_db
+
+
+def shopify_order(**overrides):
+    order = {
+        "id": 5001, "name": "#1001", "created_at": "2025-01-31T23:30:00+01:00", "financial_status": "paid", "cancelled_at": None,
+        "total_price": "129.00", "gateway": "manual", "payment_gateway_names": ["przelewy24"],
+        "email": "jan@example.com", "phone": None,
+        "customer": {"first_name": "Jan", "last_name": "Kowalski", "phone": "+48 600"},
+        "shipping_address": {"name": "J. Kowalski", "address1": "Prosta 1", "address2": "m. 4", "zip": "00-001", "city": "Warszawa", "country": "Poland"},
+        "shipping_lines": [{"title": "InPost Paczkomat", "price": "9.00"}],
+        "line_items": [
+            {"id": 11, "title": "Kubek", "variant_title": "Czerwony", "sku": "K1", "quantity": 2, "price": "50.00", "total_discount": "0.00"},
+            {"id": 12, "title": "Talerz", "variant_title": None, "sku": None, "quantity": 1, "price": "25.00", "total_discount": "5.00"},
+        ],
+    }
+    order.update(overrides)
+    return order
+
+
+def mapped(**overrides):
+    order = shopify_orders.order_fields(shopify_order(**overrides), shop_id=2)
+    order["id"] = shopify_orders.doc_id("order", 2, order["shopify_order_id"])
+    return order
+
+
+class TestOrderFields:
+    """Tests for the order document built from a Shopify order"""
+
+    def test_fields(self):
+        o = mapped()
+        assert o["shopify_order_id"] == 5001 and o["order_number"] == "#1001" and o["shop_id"] == 2
+        assert o["date"] == "2025-01-31"  # the store's local day, like the income sync
+        assert o["customer_name"] == "Jan Kowalski"
+        assert o["customer_email"] == "jan@example.com" and o["customer_phone"] == "+48 600"
+        assert o["shipping_address"] == "Prosta 1 m. 4, 00-001 Warszawa, Poland"
+        assert o["shipping_method"] == "InPost Paczkomat" and o["shipping_price"] == 9.0
+        assert o["payment_gateway"] == "przelewy24"
+        assert o["total"] == 129.0 and o["source"] == "shopify"
+        assert o["items"][0] == {"shopify_line_id": 11, "name": "Kubek", "variant": "Czerwony", "sku": "K1", "quantity": 2, "price": 50.0, "discount": 0.0}
+        print("SUCCESS: Order fields mapped")
+
+    def test_sparse_order(self):
+        o = mapped(customer=None, shipping_address=None, shipping_lines=[], payment_gateway_names=[], email=None)
+        assert o["customer_name"] == "" and o["shipping_address"] == "" and o["shipping_method"] == ""
+        assert o["payment_gateway"] == "manual" and o["customer_email"] == ""
+        print("SUCCESS: Missing customer / shipping tolerated")
+
+    def test_discount_allocations(self):
+        """An order-level code is allocated to the lines; total_discount does not include it"""
+        o = mapped(line_items=[
+            {"id": 11, "title": "Kubek", "quantity": 2, "price": "50.00", "total_discount": "0.00",
+             "discount_allocations": [{"amount": "10.00", "discount_application_index": 0}]},
+            {"id": 12, "title": "Talerz", "quantity": 1, "price": "25.00", "total_discount": "2.50",
+             "discount_allocations": [{"amount": "2.50"}, {"amount": "2.50"}]},
+            {"id": 13, "title": "Miska", "quantity": 1, "price": "15.00", "total_discount": "1.00"},
+        ])
+        assert [it["discount"] for it in o["items"]] == [10.0, 5.0, 1.0]
+        assert [r["brutto"] for r in shopify_orders.sales_rows(o)][:3] == [90.0, 20.0, 14.0]
+        print("SUCCESS: Line discounts summed from discount_allocations")
+
+    def test_ids_stable(self):
+        assert shopify_orders.doc_id("order", 2, 5001) == shopify_orders.doc_id("order", 2, 5001)
+        assert shopify_orders.doc_id("order", 2, 5001) != shopify_orders.doc_id("order", 3, 5001)
+        print("SUCCESS: Same Shopify order, same document id")
+
+
+class TestSalesRows:
+    """Tests for the sales records (ewidencja) of an imported order"""
+
+    def test_rows_per_item_and_shipping(self):
+        order = mapped()
+        rows = shopify_orders.sales_rows(order)
+        assert [r["product_name"] for r in rows] == ["Kubek - Czerwony", "Talerz", "Wysylka: InPost Paczkomat"]
+        assert [r["brutto"] for r in rows] == [100.0, 20.0, 9.0]
+        assert round(sum(r["brutto"] for r in rows), 2) == order["total"]
+        assert rows[0]["netto"] == 81.3 and rows[0]["vat_amount"] == 18.7 and rows[0]["vat_rate"] == 23
+        assert all(r["order_id"] == order["id"] and r["source"] == "shopify" and r["payment_method"] == "przelewy24" for r in rows)
+        assert shopify_orders.sales_rows(mapped())[0]["id"] == rows[0]["id"]
+        print("SUCCESS: One row per item plus shipping, totals match")
+
+    def test_unpaid_and_cancelled(self):
+        assert shopify_orders.sales_rows(mapped(financial_status="pending")) == []
+        assert shopify_orders.sales_rows(mapped(cancelled_at="2025-01-02T10:00:00Z")) == []
+        print("SUCCESS: No sales records while unpaid or cancelled")
+
+    def test_free_shipping(self):
+        rows = shopify_orders.sales_rows(mapped(shipping_lines=[{"title": "Odbior osobisty", "price": "0.00"}]))
+        assert len(rows) == 2
+        print("SUCCESS: No shipping row for free shipping")
+
+
+async def stored(db):
+    return {
+        "orders": await db.orders.find({}, {"_id": 0}).to_list(None),
+        "fulfillment": await db.fulfillment.find({}, {"_id": 0}).to_list(None),
+        "sales": sorted(await db.sales_records.find({}, {"_id": 0}).to_list(None), key=lambda r: r["product_name"]),
+    }
+
+
+class TestWritePage:
+    """Tests for upserting a page of orders with fulfillment entries and sales records"""
+
+    def test_reimport_is_idempotent_and_keeps_team_fields(self):
+        async def test(db):
+            await db.products.insert_one({"name": "Kubek", "extra_payment": 4.5})
+            first = await shopify_orders.write_page(db, 2, [shopify_order()])
+            before = await stored(db)
+            await db.orders.update_one({}, {"$set": {"status": "shipped"}})
+            await db.fulfillment.update_one({}, {"$set": {"status": "to_ship", "notes": "pilne"}})
+            second = await shopify_orders.write_page(db, 2, [shopify_order(total_price="130.00")])
+            return first, second, before, await stored(db)
+
+        first, second, before, after = with_db(test)
+        assert first == {"orders": 1, "new_orders": 1, "fulfillment": 1, "sales_records": 3}
+        assert second["new_orders"] == 0
+        assert len(after["orders"]) == 1 and len(after["fulfillment"]) == 1 and len(after["sales"]) == 3
+        assert [r["id"] for r in after["sales"]] == [r["id"] for r in before["sales"]]
+        order, entry = after["orders"][0], after["fulfillment"][0]
+        assert order["id"] == before["orders"][0]["id"] and order["total"] == 130.0 and order["status"] == "shipped"
+        assert entry["status"] == "to_ship" and entry["notes"] == "pilne" and entry["total"] == 130.0
+        assert entry["extra_payment"] == 9.0 and entry["order_id"] == order["id"]
+        print("SUCCESS: Re-import refreshes Shopify fields only")
+
+    def test_removed_item_loses_its_row(self):
+        async def test(db):
+            await shopify_orders.write_page(db, 2, [shopify_order()])
+            order = shopify_order()
+            order["line_items"] = order["line_items"][:1]
+            await shopify_orders.write_page(db, 2, [order])
+            return await stored(db)
+
+        after = with_db(test)
+        assert [r["product_name"] for r in after["sales"]] == ["Kubek - Czerwony", "Wysylka: InPost Paczkomat"]
+        assert [it["shopify_line_id"] for it in after["fulfillment"][0]["items"]] == [11]
+        print("SUCCESS: Rows of removed items deleted")
+
+    def test_paid_to_unpaid_drops_sales_records(self):
+        async def test(db):
+            await shopify_orders.write_page(db, 2, [shopify_order(), shopify_order(id=5002, name="#1002")])
+            await shopify_orders.write_page(db, 2, [shopify_order(financial_status="refunded")])
+            return await stored(db)
+
+        after = with_db(test)
+        assert {r["order_number"] for r in after["sales"]} == {"#1002"}
+        assert len(after["fulfillment"]) == 2
+        assert next(o for o in after["orders"] if o["shopify_order_id"] == 5001)["financial_status"] == "refunded"
+        print("SUCCESS: No sales records once the order is no longer paid")
+
+    def test_cancelled_after_import_removes_fulfillment(self):
+        async def test(db):
+            await shopify_orders.write_page(db, 2, [shopify_order(), shopify_order(id=5002, name="#1002")])
+            counts = await shopify_orders.write_page(db, 2, [shopify_order(cancelled_at="2025-02-01T10:00:00Z")])
+            return counts, await stored(db)
+
+        counts, after = with_db(test)
+        assert counts["fulfillment"] == 0
+        assert [f["order_number"] for f in after["fulfillment"]] == ["#1002"]
+        assert {r["order_number"] for r in after["sales"]} == {"#1002"}
+        assert next(o for o in after["orders"] if o["shopify_order_id"] == 5001)["cancelled"] is True
+        print("SUCCESS: Cancelled order leaves fulfillment and sales records")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
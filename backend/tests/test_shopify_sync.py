@@ -0,0 +1,214 @@
+"""
+Tests for the paginated Shopify order fetch (shopify.py) against a local stub server
+Tests: Link rel="next" parsing, all pages aggregated, fields/limit sent, errors surfaced, incremental fetch,
+full / incremental sync runs against a database (incomes, daily_rollups, shopify_order_totals, watermark)
+"""
+import asyncio
+from datetime import datetime, timezone
+import httpx
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+import shopify
+import shopify_sync
+from mongo_db import with_db
+from shopify_stub import ShopifyStub, make_orders
+
+PARAMS = {"status": "any", "created_at_min": "2025-01-01T00:00:00Z", "created_at_max": "2025-01-31T23:59:59Z", "financial_status": "paid"}
+
+
+def fetch(stub, token="test-token"):
+    async def run():
+        async with httpx.AsyncClient() as http:
+            return await shopify.daily_totals(http, stub.url, token, PARAMS)
+    return asyncio.run(run())
+
+
+class TestLinkHeader:
+    """Tests for next-page cursor parsing"""
+
+    def test_next_after_previous(self):
+        link = ('<https://s.myshopify.com/admin/api/2024-10/orders.json?limit=250&page_info=abc>; rel="previous", '
+                '<https://s.myshopify.com/admin/api/2024-10/orders.json?limit=250&page_info=def>; rel="next"')
+        assert shopify.next_page_url(link).endswith("page_info=def")
+        print("SUCCESS: next link picked over previous")
+
+    def test_last_page(self):
+        assert shopify.next_page_url('<https://s.myshopify.com/x?page_info=abc>; rel="previous"') is None
+        assert shopify.next_page_url(None) is None
+        print("SUCCESS: No next link on the last page")
+
+    def test_base_url(self):
+        assert shopify.base_url("shop.myshopify.com") == "https://shop.myshopify.com"
+        assert shopify.base_url("http://127.0.0.1:8080/") == "http://127.0.0.1:8080"
+        print("SUCCESS: Store URL forms")
+
+
+class TestPagination:
+    """Tests for walking all pages of orders"""
+
+    def test_all_pages_aggregated(self):
+        orders = make_orders(617)
+        with ShopifyStub(orders) as stub:
+            daily, count = fetch(stub)
+        assert count == 617
+        assert len(stub.requests) == 3
+        assert round(sum(daily.values()), 2) == 6170.0
+        assert daily["2025-01-01"] == 10.0 * len([o for o in orders if o["created_at"].startswith("2025-01-01")])
+        print(f"SUCCESS: {count} orders over {len(stub.requests)} pages")
+
+    def test_query_parameters(self):
+        with ShopifyStub(make_orders(300)) as stub:
+            fetch(stub)
+        first, second = stub.requests
+        assert first["limit"] == str(shopify.PAGE_LIMIT)
+        assert first["fields"] == "created_at,total_price"
+        assert first["financial_status"] == "paid" and "page_info" not in first
+        # cursor requests carry only page_info, limit and fields
+        assert second["page_info"] == "1" and "created_at_min" not in second and "financial_status" not in second
+        assert second["fields"] == "created_at,total_price"
+        print("SUCCESS: fields/limit on every page, filters only on the first")
+
+    def test_single_page(self):
+        with ShopifyStub(make_orders(5)) as stub:
+            daily, count = fetch(stub)
+        assert count == 5 and len(stub.requests) == 1
+        print("SUCCESS: Single page")
+
+    def test_failed_page_raises(self):
+        with ShopifyStub(make_orders(600), fail_page=1, fail_status=503) as stub:
+            with pytest.raises(shopify.ShopifyError) as exc:
+                fetch(stub)
+        assert exc.value.status_code == 503
+        assert str(exc.value) == "Shopify HTTP 503"
+        print("SUCCESS: Failed page surfaces as ShopifyError")
+
+    def test_bad_token(self):
+        with ShopifyStub(make_orders(5)) as stub:
+            with pytest.raises(shopify.ShopifyError) as exc:
+                fetch(stub, token="wrong")
+        assert exc.value.status_code == 401
+        print("SUCCESS: Auth error surfaced")
+
+
+class TestIncrementalFetch:
+    """Tests for the updated_at_min watermark fetch"""
+
+    def test_only_changed_orders_fetched(self):
+        orders = make_orders(600)
+        orders[0].update(updated_at="2025-03-01T10:00:00Z", financial_status="refunded")
+        orders[1].update(updated_at="2025-03-01T11:00:00Z")
+
+        async def run(stub):
+            async with httpx.AsyncClient() as http:
+                return [o async for page in shopify.order_pages(
+                    http, stub.url, "test-token", {"status": "any", "updated_at_min": "2025-03-01T00:00:00Z"}, shopify_sync.FIELDS)
+                    for o in page]
+
+        with ShopifyStub(orders) as stub:
+            changed = asyncio.run(run(stub))
+        assert [o["id"] for o in changed] == [1, 2]
+        assert len(stub.requests) == 1
+        assert stub.requests[0]["fields"] == "id,created_at,total_price,financial_status"
+        assert [shopify_sync.contribution(o) for o in changed] == [0, 10.0]
+        print("SUCCESS: Only orders updated after the watermark")
+
+
+async def ledger_state(db):
+    incomes = {r["date"]: r["amount"] for r in await db.incomes.find({"shop_id": 1, "source": "shopify"}).to_list(None)}
+    rollups = {}
+    for r in await db.daily_rollups.find({"ledger": "incomes", "shop_id": 1}).to_list(None):
+        rollups[r["date"]] = round(rollups.get(r["date"], 0) + r["amount"], 2)
+    records = {r["order_id"]: (r["date"], r["amount"]) for r in await db.shopify_order_totals.find({"shop_id": 1}).to_list(None)}
+    return incomes, rollups, records
+
+
+class TestSyncRuns:
+    """Tests for shopify_sync.full / incremental writing to the database"""
+
+    def run_sync(self, stub, changes=None):
+        """full(), then apply changes(stub.orders) and run incremental(); returns both results and the state after each."""
+        async def test(db):
+            await db.shopify_configs.insert_one({"shop_id": 1, "store_url": stub.url, "api_token": "test-token", "is_active": True})
+            async with httpx.AsyncClient() as http:
+                config = await db.shopify_configs.find_one({"shop_id": 1})
+                full = await shopify_sync.full(db, http, config, 2025, 1, 30)
+                after_full = await ledger_state(db)
+                config = await db.shopify_configs.find_one({"shop_id": 1})
+                if changes:
+                    changes(stub.orders)
+                inc = await shopify_sync.incremental(db, http, config, 30)
+                after_inc = await ledger_state(db)
+                config_after = await db.shopify_configs.find_one({"shop_id": 1})
+            return full, after_full, config, inc, after_inc, config_after
+        return with_db(test)
+
+    def test_full_reconcile(self):
+        with ShopifyStub(make_orders(617)) as stub:
+            full, (incomes, rollups, records), config, *_ = self.run_sync(stub)
+        assert full == {"mode": "full", "orders": 617, "days": 28, "months": ["2025-01"]}
+        assert round(sum(incomes.values()), 2) == 6170.0 and len(incomes) == 28
+        assert rollups == incomes
+        assert len(records) == 617 and records[1] == ("2025-01-01", 10.0)
+        assert config["synced_months"] == ["2025-01"] and config["sync_watermark"]
+        print("SUCCESS: Full run writes rows, rollups and order records")
+
+    def test_incremental_deltas(self):
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        def changes(orders):
+            orders[0].update(financial_status="refunded", updated_at=now)           # 2025-01-01: -10
+            orders[1].update(total_price="50.00", updated_at=now)                  # 2025-01-02: +40
+            orders[2].update(created_at="2025-01-20T12:00:00+01:00", updated_at=now)  # 03 -> 20
+            orders.append({"id": 9001, "created_at": "2025-01-05T10:00:00+01:00", "updated_at": now,
+                           "total_price": "25.00", "financial_status": "paid"})      # 2025-01-05: +25
+            orders.append({"id": 9002, "created_at": "2025-02-05T10:00:00+01:00", "updated_at": now,
+                           "total_price": "99.00", "financial_status": "paid"})      # month never reconciled
+
+        with ShopifyStub(make_orders(617)) as stub:
+            _, (before, _, _), config, inc, (incomes, rollups, records), config_after = self.run_sync(stub, changes)
+        assert inc["mode"] == "incremental" and inc["orders"] == 5 and inc["skipped"] == 1 and inc["months"] == ["2025-01"]
+        assert incomes["2025-01-01"] == before["2025-01-01"] - 10
+        assert incomes["2025-01-02"] == before["2025-01-02"] + 40
+        assert incomes["2025-01-03"] == before["2025-01-03"] - 10
+        assert incomes["2025-01-20"] == before["2025-01-20"] + 10
+        assert incomes["2025-01-05"] == before["2025-01-05"] + 25
+        assert round(sum(incomes.values()), 2) == 6170.0 - 10 + 40 + 25
+        assert rollups == incomes
+        assert 1 not in records and records[2] == ("2025-01-02", 50.0) and records[3] == ("2025-01-20", 10.0)
+        assert records[9001] == ("2025-01-05", 25.0) and 9002 not in records
+        assert config_after["sync_watermark"] > config["sync_watermark"]
+        print("SUCCESS: Refund, price change, moved and new orders applied as deltas")
+
+    def test_incremental_without_changes(self):
+        with ShopifyStub(make_orders(617)) as stub:
+            _, (before, _, before_records), _, inc, (incomes, rollups, records), _ = self.run_sync(stub)
+        assert inc["orders"] == 0 and inc["days"] == 0
+        assert incomes == before and records == before_records
+        print("SUCCESS: Nothing changed, nothing written")
+
+    def test_failed_full_run_keeps_records(self):
+        async def test(db):
+            with ShopifyStub(make_orders(617)) as stub:
+                await db.shopify_configs.insert_one({"shop_id": 1, "store_url": stub.url, "api_token": "test-token"})
+                async with httpx.AsyncClient() as http:
+                    config = await db.shopify_configs.find_one({"shop_id": 1})
+                    await shopify_sync.full(db, http, config, 2025, 1, 30)
+                    stub.orders[0]["total_price"] = "99.00"
+                    stub.fail_page = 2
+                    with pytest.raises(shopify.ShopifyError):
+                        await shopify_sync.full(db, http, config, 2025, 1, 30)
+            return await ledger_state(db)
+
+        incomes, _, records = with_db(test)
+        # the failed run changed nothing: records still match the income rows they were summed into
+        assert records[1] == ("2025-01-01", 10.0)
+        assert round(sum(incomes.values()), 2) == round(sum(a for _, a in records.values()), 2) == 6170.0
+        print("SUCCESS: A failed full run leaves records and rows consistent")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
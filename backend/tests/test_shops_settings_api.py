@@ -193,6 +193,26 @@ class TestAppSettings:
         
         print(f"Updated app settings: target={new_target}, split=3")
 
+    def test_settings_change_visible_to_cached_readers(self):
+        """Login and combined stats see a settings change right away (reference-data cache invalidated)"""
+        current = requests.get(f"{BASE_URL}/api/app-settings").json()
+        original_target = current.get("target_revenue", 250000)
+        # warm the caches
+        requests.post(f"{BASE_URL}/api/auth/login", json={"pin": "2409"})
+        requests.get(f"{BASE_URL}/api/combined-monthly-stats", params={"year": 2026, "month": 1})
+
+        requests.put(f"{BASE_URL}/api/app-settings", json={"target_revenue": 123456})
+        login = requests.post(f"{BASE_URL}/api/auth/login", json={"pin": "2409"}).json()
+        assert login["settings"]["target_revenue"] == 123456
+        stats = requests.get(f"{BASE_URL}/api/combined-monthly-stats", params={"year": 2026, "month": 1}).json()
+        assert stats["target"] == 123456
+
+        metrics = requests.get(f"{BASE_URL}/api/metrics").json()
+        assert "ref_cache" in metrics
+
+        requests.put(f"{BASE_URL}/api/app-settings", json={"target_revenue": original_target})
+        print("Settings change visible through login and combined stats")
+
 
 # ===== ORDERS WITH DYNAMIC SHOPS =====
 class TestOrdersWithShops:
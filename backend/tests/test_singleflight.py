@@ -0,0 +1,87 @@
+"""
+Unit tests for request coalescing (singleflight.SingleFlight)
+Tests: shared result, shared exception, no caching after completion, caller cancellation
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Tests for concurrent callers of one key"""
+
+    def test_concurrent_callers_share_one_run(self):
+        async def scenario():
+            sf = SingleFlight()
+            calls = []
+
+            async def compute():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return {"total": 42}
+
+            results = await asyncio.gather(*[sf.do(("combined", 2025, 1), compute) for _ in range(5)])
+            other = await sf.do(("combined", 2025, 2), compute)
+            return sf, calls, results, other
+
+        sf, calls, results, other = asyncio.run(scenario())
+        assert len(calls) == 2
+        assert results == [{"total": 42}] * 5 and other == {"total": 42}
+        m = sf.metrics()
+        assert m["runs"] == 2 and m["coalesced"] == 4 and m["in_flight"] == 0
+        assert m["by_name"]["combined"] == {"runs": 2, "coalesced": 4}
+        print("SUCCESS: One computation per key")
+
+    def test_exception_reaches_every_caller(self):
+        async def scenario():
+            sf = SingleFlight()
+
+            async def compute():
+                await asyncio.sleep(0.01)
+                raise ValueError("boom")
+
+            return await asyncio.gather(*[sf.do(("sync/all", 2025, 1), compute) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, ValueError) for r in results)
+        print("SUCCESS: Exception shared")
+
+    def test_finished_key_runs_again(self):
+        async def scenario():
+            sf = SingleFlight()
+            calls = []
+
+            async def compute():
+                calls.append(1)
+                return len(calls)
+
+            return [await sf.do(("export/excel", 2025, 1, None), compute) for _ in range(3)]
+
+        assert asyncio.run(scenario()) == [1, 2, 3]
+        print("SUCCESS: Nothing cached after completion")
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def scenario():
+            sf = SingleFlight()
+
+            async def compute():
+                await asyncio.sleep(0.02)
+                return "done"
+
+            first = asyncio.ensure_future(sf.do(("sync/all", 2025, 1), compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(sf.do(("sync/all", 2025, 1), compute))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == "done"
+        print("SUCCESS: Disconnect of the first caller is harmless")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
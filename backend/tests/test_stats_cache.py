@@ -0,0 +1,53 @@
+"""
+Tests for the stats cache (stats_cache.StatsCache)
+Tests: hits, per-month invalidation, recompute when another process bumped the shared counters
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from stats_cache import StatsCache
+
+
+def counting():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"n": len(calls)}
+    return compute, calls
+
+
+class TestStatsCache:
+    """get_or_compute stamps"""
+
+    def test_hit_until_month_touched(self):
+        cache = StatsCache()
+        compute, calls = counting()
+        key = ("monthly", 1, 2025, 1, "rows")
+        asyncio.run(cache.get_or_compute(key, compute))
+        asyncio.run(cache.get_or_compute(key, compute))
+        cache.touch(1, "2025-02-03")
+        asyncio.run(cache.get_or_compute(key, compute))
+        assert len(calls) == 1
+        cache.touch(1, "2025-01-15")
+        assert asyncio.run(cache.get_or_compute(key, compute)) == {"n": 2}
+        print("SUCCESS: Only a write to the month invalidates it")
+
+    def test_shared_stamp_change_recomputes(self):
+        """A write made by another process moves only the shared counters"""
+        cache = StatsCache()
+        compute, calls = counting()
+        key = ("combined", None, 2025, 1, None, "rows")
+        asyncio.run(cache.get_or_compute(key, compute, (0, 3, 1)))
+        asyncio.run(cache.get_or_compute(key, compute, (0, 3, 1)))
+        value = asyncio.run(cache.get_or_compute(key, compute, (0, 4, 1)))
+        assert len(calls) == 2 and value == {"n": 2}
+        assert cache.metrics()["hits"] == 1
+        print("SUCCESS: Shared counters are part of the stamp")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,155 @@
+"""
+Unit tests for the month-cube stats engine (stats_engine.MonthCube)
+Tests: totals, per-day / per-shop rows, streak, best_day, forecast
+"""
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from stats_engine import MonthCube, period_series
+
+CUSTOM_COLUMNS = [
+    {"name": "Pakowanie", "column_type": "expense"},
+    {"name": "Dotacja", "column_type": "income"},
+]
+
+
+def inc(shop_id, date, amount):
+    return {"ledger": "incomes", "shop_id": shop_id, "date": date, "category": "income", "amount": amount}
+
+
+def cost(shop_id, date, category, amount):
+    return {"ledger": "costs", "shop_id": shop_id, "date": date, "category": category, "amount": amount}
+
+
+ROWS = [
+    inc(1, "2025-02-01", 1000), inc(2, "2025-02-01", 500),
+    cost(1, "2025-02-01", "tiktok", 100), cost(2, "2025-02-01", "meta", 50),
+    cost(1, "2025-02-02", "Pakowanie", 20), cost(1, "2025-02-02", "Dotacja", 999),
+    inc(1, "2025-02-03", 300), cost(1, "2025-02-03", "zwroty", 10),
+    inc(9, "2025-02-03", 200),  # shop no longer in the shop list
+    cost(1, "2025-02-03", "inne", 77),  # no such custom column - ignored
+]
+
+
+class TestMonthCubeTotals:
+    """Tests for monthly totals"""
+
+    def test_totals(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        t = cube.totals(2)
+        assert t["total_income"] == 2000
+        assert t["total_tiktok"] == 100 and t["total_meta"] == 50 and t["total_google"] == 0
+        assert t["total_ads"] == 150
+        assert t["total_zwroty"] == 10
+        assert t["total_custom"] == {"Pakowanie": 20, "Dotacja": 999}
+        assert t["total_netto"] == 1540
+        # only expense-type custom columns reduce profit
+        assert t["total_profit"] == round(1540 - 150 - 10 - 20, 2)
+        assert t["profit_per_person"] == round(t["total_profit"] / 2, 2)
+        assert t["roi"] == round(t["total_profit"] / 180 * 100, 2)
+        print("SUCCESS: Month totals computed from cube")
+
+    def test_rounding_matches_python_round(self):
+        """netto uses round(x, 2) semantics, not np.round"""
+        cube = MonthCube(2025, 2, [1], [], [inc(1, "2025-02-05", 554.5)])
+        day = cube.day_rows(2)[4]
+        assert day["netto"] == round(554.5 * 0.77, 2)
+        print("SUCCESS: Rounding matches round()")
+
+
+class TestMonthCubeDays:
+    """Tests for day rows"""
+
+    def test_day_rows_cover_month(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        days = cube.day_rows(2)
+        assert [d["date"] for d in days] == [f"2025-02-{d:02d}" for d in range(1, 29)]
+        assert "shops" not in days[0]
+        print("SUCCESS: One row per day of month")
+
+    def test_unknown_shop_counts_in_day_totals_only(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        day3 = cube.day_rows(2, per_shop=True)[2]
+        assert day3["income"] == 500
+        assert [s["shop_id"] for s in day3["shops"]] == [1, 2]
+        assert day3["shops"][0]["income"] == 300
+        assert day3["shops"][1]["income"] == 0
+        print("SUCCESS: Unlisted shop only in day totals")
+
+    def test_per_shop_profit(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        shop1 = cube.day_rows(2, per_shop=True)[0]["shops"][0]
+        assert shop1["netto"] == 770
+        assert shop1["ads_total"] == 100
+        assert shop1["profit"] == 670
+        assert shop1["profit_pp"] == 335
+        print("SUCCESS: Per-shop profit")
+
+    def test_day_columns_match_day_rows(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        rows = cube.day_rows(2, per_shop=True)
+        cols = cube.day_columns(2, per_shop=True)
+        assert cols["dates"] == [d["date"] for d in rows]
+        for metric in ["income", "netto", "profit", "profit_pp", "tiktok_ads", "meta_ads", "google_ads", "ads_total", "zwroty"]:
+            assert cols[metric] == [d[metric] for d in rows]
+            for i, sid in enumerate([1, 2]):
+                assert cols["shops"][str(sid)][metric] == [d["shops"][i][metric] for d in rows]
+        assert cols["custom_costs"]["Pakowanie"] == [d["custom_costs"]["Pakowanie"] for d in rows]
+        assert "shops" not in cube.day_columns(2)
+        print("SUCCESS: Columnar days match row days")
+
+
+class TestMonthCubeKpis:
+    """Tests for streak / best_day / forecast"""
+
+    def test_kpis_past_month(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        k = cube.kpis(2, datetime(2025, 6, 1, tzinfo=timezone.utc))
+        # the month is closed, so the streak counts back from the 28th (no activity)
+        assert k["streak"] == 0
+        assert k["best_day"] == "2025-02-01"
+        assert k["forecast"] == 2000
+        print("SUCCESS: KPIs for a closed month")
+
+    def test_kpis_current_month(self):
+        cube = MonthCube(2025, 2, [1, 2], CUSTOM_COLUMNS, ROWS)
+        k = cube.kpis(2, datetime(2025, 2, 3, 12, tzinfo=timezone.utc))
+        # day 3 and day 1 profitable, day 2 a loss
+        assert k["streak"] == 1
+        assert k["forecast"] == round(2000 / 3 * 28, 2)
+        print("SUCCESS: KPIs for the running month")
+
+    def test_empty_month(self):
+        cube = MonthCube(2025, 2, [1], [], [])
+        assert cube.totals(2)["total_income"] == 0
+        assert cube.kpis(2, datetime(2025, 6, 1, tzinfo=timezone.utc)) == {"streak": 0, "best_day": None, "forecast": 0}
+        print("SUCCESS: Empty month")
+
+
+
+class TestPeriodSeries:
+    """Tests for columnar period series"""
+
+    def test_series_per_month(self):
+        rows = [
+            {"period": "2025-01", "ledger": "incomes", "category": "income", "amount": 1000},
+            {"period": "2025-03", "ledger": "costs", "category": "meta", "amount": 100},
+            {"period": "2025-03", "ledger": "costs", "category": "Pakowanie", "amount": 40},
+            {"period": "2024-12", "ledger": "incomes", "category": "income", "amount": 5},  # outside range
+        ]
+        out = period_series(["2025-01", "2025-02", "2025-03"], CUSTOM_COLUMNS, rows, 2)
+        series = out["series"]
+        assert series["income"] == [1000, 0, 0]
+        assert series["netto"] == [770, 0, 0]
+        assert series["meta_ads"] == [0, 0, 100]
+        assert series["custom_costs"]["Pakowanie"] == [0, 0, 40]
+        assert series["profit"] == [770, 0, -140]
+        assert out["totals"]["total_income"] == 1000
+        print("SUCCESS: Period series")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
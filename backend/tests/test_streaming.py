@@ -0,0 +1,66 @@
+"""
+Tests for NDJSON streaming (streaming._lines)
+Tests: first document sent at once, chunks flushed by size and by time, every line delivered
+"""
+import asyncio
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import streaming
+
+
+class SlowCursor:
+    """Yields docs in batches, sleeping before each batch like a getMore round trip"""
+
+    def __init__(self, n, batch, delay=0.0):
+        self.n, self.batch, self.delay = n, batch, delay
+
+    async def __aiter__(self):
+        for i in range(self.n):
+            if i % self.batch == 0 and self.delay:
+                await asyncio.sleep(self.delay)
+            yield {"id": i, "name": "Kubek"}
+
+
+async def collect(cursor):
+    chunks = []
+    async for chunk in streaming._lines(cursor):
+        chunks.append((asyncio.get_running_loop().time(), chunk))
+    return chunks
+
+
+class TestLines:
+    """Chunking of the NDJSON body"""
+
+    def test_first_document_not_held_back(self):
+        async def main():
+            t0 = asyncio.get_running_loop().time()
+            chunks = await collect(SlowCursor(30, batch=10, delay=0.3))
+            return t0, chunks
+
+        t0, chunks = asyncio.run(main())
+        first_at, first = chunks[0]
+        assert json.loads(first) == {"id": 0, "name": "Kubek"}
+        assert first_at - t0 < 0.5  # before the second batch arrives
+        print("SUCCESS: First row sent as soon as the cursor returns it")
+
+    def test_every_line_delivered_once(self):
+        chunks = asyncio.run(collect(SlowCursor(5000, batch=500)))
+        lines = b"".join(c for _, c in chunks).splitlines()
+        assert [json.loads(l)["id"] for l in lines] == list(range(5000))
+        assert all(len(c) <= streaming.FLUSH_BYTES + 100 for _, c in chunks)
+        assert len(chunks) > 1
+        print(f"SUCCESS: 5000 rows in {len(chunks)} chunks")
+
+    def test_slow_cursor_flushes_by_time(self):
+        """A batch waiting on the next round trip is not held for it"""
+        chunks = asyncio.run(collect(SlowCursor(30, batch=10, delay=streaming.FLUSH_INTERVAL * 2)))
+        assert len(chunks) >= 3
+        print(f"SUCCESS: {len(chunks)} chunks for 3 slow batches")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
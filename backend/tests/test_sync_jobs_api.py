@@ -0,0 +1,85 @@
+"""
+Backend API tests for manual syncs run as background jobs
+Tests: 202 with a job, 404 for unknown connectors and jobs, repeated request joins the running job, SSE until done
+"""
+import pytest
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+if not BASE_URL:
+    BASE_URL = "https://business-panel-2.preview.emergentagent.com"
+
+
+@pytest.fixture
+def tiktok_config():
+    """A manual-only TikTok connector with a fake token: its sync ends quickly with an error"""
+    requests.post(f"{BASE_URL}/api/tiktok-configs", json={
+        "name": "TEST_JOBS", "advertiser_id": "0", "access_token": "TEST_invalid", "sync_interval_minutes": 0})
+    config = next(c for c in requests.get(f"{BASE_URL}/api/tiktok-configs").json() if c["name"] == "TEST_JOBS")
+    yield config
+    requests.delete(f"{BASE_URL}/api/tiktok-configs/{config['id']}")
+
+
+def wait_done(job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BASE_URL}/api/sync/jobs/{job_id}").json()
+        if job["status"] == "done":
+            return job
+        time.sleep(0.5)
+    raise AssertionError(f"job {job_id} not done after {timeout}s")
+
+
+class TestSyncJobs:
+    """POST /sync/... -> 202 job, GET /sync/jobs/{id}, SSE"""
+
+    def test_unknown_connector_404(self):
+        assert requests.post(f"{BASE_URL}/api/sync/tiktok/TEST_missing?year=2025&month=1").status_code == 404
+        assert requests.post(f"{BASE_URL}/api/sync/shopify/999999?year=2025&month=1").status_code == 404
+        assert requests.post(f"{BASE_URL}/api/sync/shopify/999999/orders?year=2025&month=1").status_code == 404
+        assert requests.get(f"{BASE_URL}/api/sync/jobs/TEST_missing").status_code == 404
+        assert requests.get(f"{BASE_URL}/api/sync/jobs/TEST_missing/events").status_code == 404
+        print("SUCCESS: 404 for unknown connectors and jobs")
+
+    def test_accepted_and_polled_to_done(self, tiktok_config):
+        response = requests.post(f"{BASE_URL}/api/sync/tiktok/{tiktok_config['id']}?year=2025&month=1")
+        assert response.status_code == 202
+        job = response.json()
+        assert job["kind"] == "tiktok" and job["status"] in ("queued", "running")
+        assert [c["key"] for c in job["connectors"]] == [f"tiktok:{tiktok_config['id']}"]
+
+        done = wait_done(job["id"])
+        assert done["finished_at"] and done["result"]["status"] == "error"
+        assert done["connectors"][0]["state"] == "error" and done["connectors"][0]["duration_ms"] is not None
+        print(f"SUCCESS: Job {job['id']} ended with {done['result']['detail']}")
+
+    def test_repeated_request_joins_running_job(self, tiktok_config):
+        url = f"{BASE_URL}/api/sync/tiktok/{tiktok_config['id']}?year=2025&month=1"
+        first = requests.post(url).json()
+        second = requests.post(url)
+        assert second.status_code == 202
+        if second.json()["id"] != first["id"]:
+            # the first job finished in between; only then does a new one start
+            assert requests.get(f"{BASE_URL}/api/sync/jobs/{first['id']}").json()["status"] == "done"
+        wait_done(second.json()["id"])
+        print("SUCCESS: Repeated request did not start a second sync")
+
+    def test_events_stream_until_done(self, tiktok_config):
+        job = requests.post(f"{BASE_URL}/api/sync/tiktok/{tiktok_config['id']}?year=2025&month=1").json()
+        events = []
+        with requests.get(f"{BASE_URL}/api/sync/jobs/{job['id']}/events", stream=True, timeout=60) as response:
+            assert response.status_code == 200
+            assert response.headers["Content-Type"].startswith("text/event-stream")
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    events.append(line[len("event: "):])
+                    if events[-1] == "done":
+                        break
+        assert events[-1] == "done" and set(events) <= {"progress", "done"}
+        print(f"SUCCESS: {len(events)} events, last one done")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
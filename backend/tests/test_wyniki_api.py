@@ -333,6 +333,75 @@ class TestWynikiKPIs:
         requests.delete(f"{BASE_URL}/api/costs/{cost_id}")
 
 
+class TestWynikiRollups:
+    """Tests for daily_rollups maintenance"""
+    
+    def test_rollups_follow_ledger_writes(self):
+        """Test that income/cost writes keep daily_rollups in sync with raw data"""
+        inc_resp = requests.post(f"{BASE_URL}/api/incomes", json={
+            "amount": 321.5,
+            "date": "2026-03-07",
+            "description": f"{TEST_PREFIX}rollup income",
+            "shop_id": 3
+        })
+        income_id = inc_resp.json()["id"]
+        cost_resp = requests.post(f"{BASE_URL}/api/costs", json={
+            "date": "2026-03-07",
+            "shop_id": 3,
+            "category": "meta",
+            "amount": 40,
+            "description": f"{TEST_PREFIX}rollup cost"
+        })
+        cost_id = cost_resp.json()["id"]
+        requests.put(f"{BASE_URL}/api/costs/{cost_id}", json={"amount": 55})
+        
+        stats = requests.get(f"{BASE_URL}/api/monthly-stats", params={"shop_id": 3, "year": 2026, "month": 3}).json()
+        day_7 = next(d for d in stats["days"] if d["date"] == "2026-03-07")
+        assert day_7["income"] >= 321.5
+        assert day_7["meta_ads"] >= 55
+        
+        response = requests.post(f"{BASE_URL}/api/rollups/rebuild", params={"from": "2026-03", "to": "2026-03", "dry_run": True})
+        assert response.status_code == 200
+        report = response.json()
+        assert report["applied"] is False
+        assert report["drift"] == [], f"Unexpected rollup drift: {report['drift']}"
+        
+        print("SUCCESS: daily_rollups match raw ledger")
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/api/incomes/{income_id}")
+        requests.delete(f"{BASE_URL}/api/costs/{cost_id}")
+
+
+class TestWynikiStatsCache:
+    """Tests for the stats response cache"""
+    
+    def test_cached_stats_invalidated_by_write(self):
+        """Test that a repeated stats call is served from cache and a write refreshes it"""
+        params = {"shop_id": 3, "year": 2026, "month": 4}
+        before = requests.get(f"{BASE_URL}/api/monthly-stats", params=params).json()
+        requests.get(f"{BASE_URL}/api/monthly-stats", params=params)
+        
+        metrics = requests.get(f"{BASE_URL}/api/metrics").json()["stats_cache"]
+        assert metrics["hits"] >= 1
+        assert "misses" in metrics and "size" in metrics
+        
+        inc_resp = requests.post(f"{BASE_URL}/api/incomes", json={
+            "amount": 99,
+            "date": "2026-04-11",
+            "description": f"{TEST_PREFIX}cache",
+            "shop_id": 3
+        })
+        income_id = inc_resp.json()["id"]
+        after = requests.get(f"{BASE_URL}/api/monthly-stats", params=params).json()
+        assert round(after["total_income"] - before["total_income"], 2) == 99, "Cached stats not invalidated"
+        
+        print("SUCCESS: Stats cache hit and invalidation")
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/api/incomes/{income_id}")
+
+
 class TestWynikiAuth:
     """Test authentication for Wyniki page"""
     
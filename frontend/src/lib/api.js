@@ -11,6 +11,19 @@ const downloadBlob = async (url, filename) => {
   link.click();
 };
 
+// Sync endpoints answer 202 with a job; resolve once the job is done, with its result as `data`
+// (rejects when polling fails or the job is still running after timeoutMs)
+const waitForJob = async (resp, timeoutMs = 15 * 60 * 1000) => {
+  let job = resp.data;
+  const deadline = Date.now() + timeoutMs;
+  while (job.status !== "done") {
+    if (Date.now() > deadline) throw new Error(`Synchronizacja ${job.id} nie zakonczyla sie w czasie`);
+    await new Promise((r) => setTimeout(r, 1000));
+    job = (await axios.get(`${API}/sync/jobs/${job.id}`)).data;
+  }
+  return { ...resp, data: job.result, job };
+};
+
 export const api = {
   login: (pin) => axios.post(`${API}/auth/login`, { pin }),
 
@@ -27,6 +40,7 @@ export const api = {
   getMonthlyStats: (params) => axios.get(`${API}/monthly-stats`, { params }),
   getCombinedStats: (params) => axios.get(`${API}/combined-monthly-stats`, { params }),
   getWeeklyStats: () => axios.get(`${API}/weekly-stats`),
+  getRangeStats: (params) => axios.get(`${API}/range-stats`, { params }),
 
   getTasks: () => axios.get(`${API}/tasks`),
   createTask: (data) => axios.post(`${API}/tasks`, data),
@@ -96,9 +110,11 @@ export const api = {
   updateTikTokConfig: (id, data) => axios.put(`${API}/tiktok-configs/${id}`, data),
   deleteTikTokConfig: (id) => axios.delete(`${API}/tiktok-configs/${id}`),
 
-  syncShopify: (shopId, year, month) => axios.post(`${API}/sync/shopify/${shopId}?year=${year}&month=${month}`),
-  syncTikTok: (configId, year, month) => axios.post(`${API}/sync/tiktok/${configId}?year=${year}&month=${month}`),
-  syncAll: (year, month) => axios.post(`${API}/sync/all?year=${year}&month=${month}`),
+  syncShopify: (shopId, year, month) => axios.post(`${API}/sync/shopify/${shopId}?year=${year}&month=${month}`).then(waitForJob),
+  importShopifyOrders: (shopId, year, month) => axios.post(`${API}/sync/shopify/${shopId}/orders?year=${year}&month=${month}`).then(waitForJob),
+  syncTikTok: (configId, year, month) => axios.post(`${API}/sync/tiktok/${configId}?year=${year}&month=${month}`).then(waitForJob),
+  syncAll: (year, month) => axios.post(`${API}/sync/all?year=${year}&month=${month}`).then(waitForJob),
+  getSyncJob: (id) => axios.get(`${API}/sync/jobs/${id}`),
 
   sendChat: (data) => axios.post(`${API}/chat`, data),
   getChatHistory: (params) => axios.get(`${API}/chat-history`, { params }),